@@ -6,11 +6,20 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # Imported inside functions on the GUI's scrape path: main by the GUI,
+    # batch and session_pool, the rest by main, comment_writer and sinks
+    hiddenimports=[
+        'main', 'http_cache', 'rate_controller', 'export', 'instaloader', 'openpyxl',
+    ],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # pandas (and numpy with it) is only needed by main.save_to_excel, which the
+    # GUI does not use; the rest are never imported at runtime.
+    excludes=[
+        'pandas', 'numpy', 'matplotlib', 'scipy', 'IPython', 'PIL',
+        'pytest', 'tkinter.test', 'lib2to3',
+    ],
     noarchive=False,
     optimize=0,
 )
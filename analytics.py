@@ -0,0 +1,339 @@
+"""Indexed store of scraped comments for giveaway queries.
+
+    python analytics.py load "data/*.xlsx"
+    python analytics.py posts
+    python analytics.py participants --mentionable
+    python analytics.py top -n 20 -p ABC123 -p DEF456
+    python analytics.py all-posts
+    python analytics.py draw -n 3 --mentionable --all-posts --seed 42
+
+Comments are kept in SQLite (`data/analytics.db`) keyed by shortcode and
+comment id, so loading a file twice adds nothing. Rollup tables are kept
+up to date as rows come in: `participants` has one row per (post, user),
+`users` has one row per user across every post, and `posts` has one row
+per post. The aggregations read these small tables instead of millions of
+comments. With `analytics = True`
+in `config.py`, every batch a scrape saves is loaded as it is written.
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+import custom_utils
+from comment_record import COLUMN_ATTRS
+
+FIELDS = tuple(COLUMN_ATTRS.values())
+# SQLite caps the number of parameters per statement
+IN_CHUNK = 500
+
+
+def default_path():
+    return custom_utils.get_data_folder("analytics.db")
+
+
+class AnalyticsStore:
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA cache_size=-65536")
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS comments (
+                shortcode TEXT NOT NULL, {', '.join(FIELDS)},
+                PRIMARY KEY (shortcode, comment_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS comments_username ON comments (username);
+            CREATE TABLE IF NOT EXISTS participants (
+                shortcode TEXT NOT NULL, username TEXT NOT NULL,
+                comments INTEGER NOT NULL, mentionable INTEGER NOT NULL,
+                PRIMARY KEY (shortcode, username)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS participants_username ON participants (username, shortcode);
+            CREATE INDEX IF NOT EXISTS participants_mentionable ON participants (mentionable, username);
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY, comments INTEGER NOT NULL,
+                posts INTEGER NOT NULL, mentionable INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS users_comments ON users (comments DESC, username);
+            CREATE INDEX IF NOT EXISTS users_posts ON users (posts, username);
+            CREATE INDEX IF NOT EXISTS users_mentionable ON users (mentionable, username);
+            CREATE TABLE IF NOT EXISTS posts (
+                shortcode TEXT PRIMARY KEY, comments INTEGER NOT NULL, participants INTEGER NOT NULL) WITHOUT ROWID;
+        """)
+        self._insert_sql = (f"INSERT INTO comments (shortcode, {', '.join(FIELDS)}) "
+                            f"VALUES ({', '.join('?' for _ in range(len(FIELDS) + 1))})")
+        self._lock = threading.Lock()
+
+    def _existing(self, sql, shortcode, keys):
+        """The `keys` of `shortcode` that `sql` (ending in an IN list) finds."""
+        found = set()
+        for start in range(0, len(keys), IN_CHUNK):
+            chunk = keys[start:start + IN_CHUNK]
+            found.update(key for (key,) in self._conn.execute(
+                f"{sql} ({', '.join('?' for _ in chunk)})", [shortcode] + chunk))
+        return found
+
+    def add_rows(self, shortcode, columns, rows):
+        """Add sink rows (ordered like `columns`) of one post. Returns how many were new.
+
+        The participants and users rollups are updated in the same
+        transaction, from the rows that were not in the store yet.
+        """
+        positions = [columns.index(column) if column in columns else None for column in COLUMN_ATTRS]
+        id_at, username_at, mentionable_at = (FIELDS.index(field) for field in
+                                              ("comment_id", "username", "is_mentionable"))
+        if positions[id_at] is None or positions[username_at] is None:
+            raise ValueError("rows need a Comment ID and a Username column")
+        records = [tuple(row[position] if position is not None else None for position in positions)
+                   for row in rows]
+        if not records:
+            return 0
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                known = self._existing("SELECT comment_id FROM comments WHERE shortcode = ? AND comment_id IN",
+                                       shortcode, [record[id_at] for record in records])
+                new, per_user = [], {}
+                for record in records:
+                    comment_id = record[id_at]
+                    if comment_id in known:
+                        continue
+                    known.add(comment_id)
+                    new.append((shortcode,) + record)
+                    username = record[username_at]
+                    if username is not None:
+                        comments, mentionable = per_user.get(username, (0, 0))
+                        per_user[username] = (comments + 1, mentionable or int(bool(record[mentionable_at])))
+
+                seen_on_post = self._existing(
+                    "SELECT username FROM participants WHERE shortcode = ? AND username IN",
+                    shortcode, list(per_user))
+                self._conn.executemany(self._insert_sql, new)
+                self._conn.executemany(
+                    "INSERT INTO participants (shortcode, username, comments, mentionable) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (shortcode, username) DO UPDATE SET "
+                    "comments = comments + excluded.comments, mentionable = MAX(mentionable, excluded.mentionable)",
+                    [(shortcode, username, comments, mentionable)
+                     for username, (comments, mentionable) in per_user.items()])
+                self._conn.executemany(
+                    "INSERT INTO users (username, comments, posts, mentionable) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (username) DO UPDATE SET comments = comments + excluded.comments, "
+                    "posts = posts + excluded.posts, mentionable = MAX(mentionable, excluded.mentionable)",
+                    [(username, comments, int(username not in seen_on_post), mentionable)
+                     for username, (comments, mentionable) in per_user.items()])
+                self._conn.execute(
+                    "INSERT INTO posts (shortcode, comments, participants) VALUES (?, ?, ?) "
+                    "ON CONFLICT (shortcode) DO UPDATE SET comments = comments + excluded.comments, "
+                    "participants = participants + excluded.participants",
+                    (shortcode, len(new), len(per_user) - len(seen_on_post)))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return len(new)
+
+    def load_file(self, path, shortcode=None, chunk_rows=50_000):
+        """Load a scraped output file; the shortcode defaults to its file name. Returns new rows."""
+        import export
+
+        shortcode = shortcode or export.shortcode_of(path)
+        added = 0
+        with export.open_rows(path) as (columns, rows):
+            columns = list(columns)
+            convert_values = export.converters(columns)
+            chunk = []
+            for row in rows:
+                chunk.append([to_type(value) for to_type, value in zip(convert_values, row)])
+                if len(chunk) >= chunk_rows:
+                    added += self.add_rows(shortcode, columns, chunk)
+                    chunk = []
+            added += self.add_rows(shortcode, columns, chunk)
+        return added
+
+    def remove(self, shortcode):
+        """Forget every comment of a post. Returns how many there were."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                participants = self._conn.execute(
+                    "SELECT username, comments FROM participants WHERE shortcode = ?", (shortcode,)).fetchall()
+                removed = self._conn.execute("DELETE FROM comments WHERE shortcode = ?", (shortcode,)).rowcount
+                self._conn.execute("DELETE FROM participants WHERE shortcode = ?", (shortcode,))
+                self._conn.executemany(
+                    "UPDATE users SET comments = comments - ?, posts = posts - 1, mentionable = "
+                    "(SELECT COALESCE(MAX(mentionable), 0) FROM participants WHERE username = users.username) "
+                    "WHERE username = ?", [(comments, username) for username, comments in participants])
+                self._conn.execute("DELETE FROM users WHERE posts <= 0")
+                self._conn.execute("DELETE FROM posts WHERE shortcode = ?", (shortcode,))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return removed
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def posts(self):
+        """`(shortcode, comments, participants)` for every loaded post."""
+        return self._query("SELECT shortcode, comments, participants FROM posts ORDER BY shortcode")
+
+    def _users_sql(self, shortcodes=None, mentionable_only=False, min_comments=1, on_all_posts=False):
+        """SQL selecting `(username, total, posts)` per user, and its parameters.
+
+        Across every post this reads the users rollup; for some posts it
+        sums their participant rows.
+        """
+        if not shortcodes:
+            where, params = ["comments >= ?"], [min_comments]
+            if mentionable_only:
+                where.append("mentionable = 1")
+            if on_all_posts:
+                where.append("posts = (SELECT COUNT(*) FROM posts)")
+            return ("SELECT username, comments AS total, posts FROM users WHERE " + " AND ".join(where)), params
+
+        params = list(shortcodes)
+        having = ["SUM(comments) >= ?"]
+        params.append(min_comments)
+        if mentionable_only:
+            having.append("MAX(mentionable) = 1")
+        if on_all_posts:
+            having.append("COUNT(*) = ?")
+            params.append(len(set(shortcodes)))
+        sql = ("SELECT username, SUM(comments) AS total, COUNT(*) FROM participants "
+               f"WHERE shortcode IN ({', '.join('?' for _ in shortcodes)}) "
+               "GROUP BY username HAVING " + " AND ".join(having))
+        return sql, params
+
+    def participants(self, shortcodes=None, mentionable_only=False, min_comments=1, on_all_posts=False):
+        """Number of unique users who commented."""
+        sql, params = self._users_sql(shortcodes, mentionable_only, min_comments, on_all_posts)
+        return self._query(f"SELECT COUNT(*) FROM ({sql})", params)[0][0]
+
+    def user_counts(self, shortcodes=None, limit=20, mentionable_only=False, min_comments=1):
+        """`(username, comments, posts)` of the users with the most comments."""
+        sql, params = self._users_sql(shortcodes, mentionable_only, min_comments)
+        return self._query(f"{sql} ORDER BY total DESC, username LIMIT ?", params + [limit])
+
+    def users_on_all_posts(self, shortcodes=None, mentionable_only=False):
+        """Users who commented on every post in `shortcodes` (default: every loaded post)."""
+        sql, params = self._users_sql(shortcodes, mentionable_only, on_all_posts=True)
+        return [username for username, _, _ in self._query(f"{sql} ORDER BY username", params)]
+
+    def draw(self, count=1, shortcodes=None, mentionable_only=False, min_comments=1, on_all_posts=False,
+             weighted=False, seed=None):
+        """Pick `count` distinct winners among the eligible users.
+
+        Every user has the same chance unless `weighted`, where each comment
+        counts as an entry. A `seed` makes the draw reproducible; without one
+        the system's random source is used.
+        """
+        sql, params = self._users_sql(shortcodes, mentionable_only, min_comments, on_all_posts)
+        candidates = self._query(f"{sql} ORDER BY username", params)
+        rng = random.Random(seed) if seed is not None else random.SystemRandom()
+        if not weighted:
+            return [username for username, _, _ in rng.sample(candidates, min(count, len(candidates)))]
+        winners = []
+        candidates = list(candidates)
+        while candidates and len(winners) < count:
+            pick = rng.choices(range(len(candidates)), weights=[total for _, total, _ in candidates])[0]
+            winners.append(candidates.pop(pick)[0])
+        return winners
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def from_config():
+    """The store scrapes load into when `config.analytics` is on, or None."""
+    import config
+
+    if not getattr(config, "analytics", False):
+        return None
+    path = getattr(config, "analytics_path", None) or default_path()
+    with _shared_lock:
+        store = _shared.get(path)
+        if store is None:
+            store = _shared[path] = AnalyticsStore(path)
+        return store
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="instagram-comment-analytics", description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="Store file (default: data/analytics.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("load", help="Load scraped files (shortcode taken from the file name)")
+    load.add_argument("files", nargs="+")
+    remove = commands.add_parser("remove", help="Forget the comments of posts")
+    remove.add_argument("shortcodes", nargs="+")
+    commands.add_parser("posts", help="Loaded posts with their comment and participant counts")
+
+    def add_filters(command, min_comments=True):
+        command.add_argument("-p", "--post", dest="shortcodes", action="append",
+                             help="Only this post; repeat for several (default: every loaded post)")
+        command.add_argument("--mentionable", action="store_true", help="Only mentionable users")
+        if min_comments:
+            command.add_argument("--min-comments", type=int, default=1)
+        return command
+
+    add_filters(commands.add_parser("participants", help="Count unique commenters"))
+    top = add_filters(commands.add_parser("top", help="Comments per user, most active first"))
+    top.add_argument("-n", "--limit", type=int, default=20)
+    add_filters(commands.add_parser("all-posts", help="Users who commented on every post"), min_comments=False)
+    draw = add_filters(commands.add_parser("draw", help="Draw random winners"))
+    draw.add_argument("-n", "--count", type=int, default=1)
+    draw.add_argument("--all-posts", action="store_true", help="Only users who commented on every post")
+    draw.add_argument("--weighted", action="store_true", help="One entry per comment instead of per user")
+    draw.add_argument("--seed", type=int, help="Make the draw reproducible")
+    return parser
+
+
+def main(argv=None):
+    import export
+
+    args = build_parser().parse_args(argv)
+    store = AnalyticsStore(args.db)
+    started = time.perf_counter()
+    try:
+        if args.command == "load":
+            for path in export.expand_inputs(args.files):
+                print(f"{store.load_file(path)}\t{path}")
+        elif args.command == "remove":
+            for shortcode in args.shortcodes:
+                print(f"{store.remove(shortcode)}\t{shortcode}")
+        elif args.command == "posts":
+            for shortcode, comments, participants in store.posts():
+                print(f"{shortcode}\t{comments}\t{participants}")
+        elif args.command == "participants":
+            print(store.participants(args.shortcodes, args.mentionable, args.min_comments))
+        elif args.command == "top":
+            for username, comments, posts in store.user_counts(
+                    args.shortcodes, args.limit, args.mentionable, args.min_comments):
+                print(f"{username}\t{comments}\t{posts}")
+        elif args.command == "all-posts":
+            for username in store.users_on_all_posts(args.shortcodes, args.mentionable):
+                print(username)
+        elif args.command == "draw":
+            for username in store.draw(args.count, args.shortcodes, args.mentionable, args.min_comments,
+                                       args.all_posts, args.weighted, args.seed):
+                print(username)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    print(f"{(time.perf_counter() - started) * 1000:.0f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""Asyncio pagination engine for the iPhone comments endpoint.
+
+Instead of instaloader's one-blocking-request-at-a-time iterator, comment
+pages are fetched with aiohttp over a pooled keep-alive connection with
+gzip/deflate compression. Each post paginates in its own task and prefetches
+up to `prefetch` pages ahead of the writer, all inside one adaptive rate
+budget. Rows go through the same `CommentWriter` as the synchronous path, so
+output files and checkpoints are interchangeable.
+
+    jobs = async_engine.run_batch(urls, config.session_data, concurrency=4)
+"""
+import asyncio
+
+import config
+import iphone_api
+import log_utils
+import metrics
+from batch import DONE, FAILED, PARTIAL, SCRAPING, STOPPED, QUEUED, make_jobs
+from comment_writer import CommentWriter
+from rate_limit import AdaptiveBucket
+from scrape_job import ScrapeJob
+
+IPHONE_BASE_URL = "https://i.instagram.com"
+COOKIE_FIELDS = ("csrftoken", "sessionid", "ds_user_id", "mid", "ig_did")
+
+
+class RequestFailed(Exception):
+    pass
+
+
+def iphone_headers(session_data):
+    """Headers of an iPad app request, as instaloader sends them."""
+    try:
+        from instaloader.instaloadercontext import default_iphone_headers
+        headers = default_iphone_headers()
+    except ImportError:
+        headers = {
+            "User-Agent": "Instagram 361.0.0.35.82 (iPad13,8; iOS 18_0; en_US; en-US; "
+                          "scale=2.00; 2048x2732; 674117118) AppleWebKit/420+",
+            "x-ig-app-id": "124024574287414",
+        }
+    headers["Accept-Encoding"] = "gzip, deflate"
+    if session_data:
+        headers.update({
+            "ig-intended-user-id": session_data.get("ds_user_id", ""),
+            "ig-u-ds-user-id": session_data.get("ds_user_id", ""),
+            "x-mid": session_data.get("mid", ""),
+            "x-ig-device-id": session_data.get("ig_did", ""),
+            "x-ig-family-device-id": session_data.get("ig_did", ""),
+            "x-csrftoken": session_data.get("csrftoken", ""),
+        })
+    return headers
+
+
+async def sleep_unless_stopped(secs, stop_event=None):
+    """asyncio.sleep that wakes up early on `stop_event`. Returns False if stopped."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + secs
+    while True:
+        if stop_event is not None and stop_event.is_set():
+            return False
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return True
+        await asyncio.sleep(min(remaining, 0.5))
+
+
+class AsyncCommentClient:
+    """Pooled aiohttp client for the iPhone endpoints of one session."""
+
+    def __init__(self, session_data=None, base_url=IPHONE_BASE_URL, connections=8,
+                 requests_per_minute=None, timeout=30, stop_event=None, log_target=None):
+        self.session_data = session_data or {}
+        self.base_url = base_url.rstrip("/")
+        self.connections = connections
+        self.timeout = timeout
+        self.stop_event = stop_event
+        self.log_target = log_target
+        self.bucket = AdaptiveBucket(
+            per_minute=requests_per_minute or getattr(config, "requests_per_minute", 60),
+            min_per_minute=getattr(config, "min_requests_per_minute", 2),
+            max_per_minute=getattr(config, "max_requests_per_minute", 180),
+            backoff_base=getattr(config, "rate_limit_backoff", 30),
+        )
+        self.requests = 0
+        self._session = None
+
+    async def __aenter__(self):
+        try:
+            import aiohttp
+        except ImportError:
+            raise RuntimeError("The async engine needs aiohttp: pip install aiohttp")
+
+        connector = aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=60, ttl_dns_cache=300)
+        cookies = {field: self.session_data[field] for field in COOKIE_FIELDS if self.session_data.get(field)}
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=iphone_headers(self.session_data),
+            cookies=cookies,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            auto_decompress=True,
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+
+    async def get_json(self, path, params, stop_event=None, budget=None):
+        """GET an iPhone endpoint, pacing and backing off on 429. None if stopped."""
+        stop_event = stop_event or self.stop_event
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        while True:
+            wait = (budget.reserve() if budget is not None else 0.0) + self.bucket.reserve()
+            metrics.RATE_LIMIT_SLEEP.inc(wait)
+            if not await sleep_unless_stopped(wait, stop_event):
+                return None
+
+            self.requests += 1
+            async with self._session.get(url, params=params) as response:
+                if response.status == 429:
+                    metrics.RATE_LIMITED.inc()
+                    backoff = self.bucket.on_rate_limited()
+                    metrics.RATE_LIMIT_SLEEP.inc(backoff)
+                    log_utils.log_message(
+                        f"[RATE LIMIT] 429 Too Many Requests. Slowing to {self.bucket.per_minute:.1f} "
+                        f"requests/min and retrying in {round(backoff)}s.", self.log_target, "yellow")
+                    if not await sleep_unless_stopped(backoff, stop_event):
+                        return None
+                    continue
+                if response.status >= 400:
+                    raise RequestFailed(f"{response.status} {response.reason} for {path}")
+                data = await response.json(content_type=None)
+            self.bucket.on_success()
+            return data
+
+    async def comment_pages(self, media_id, min_id=None, prefetch=2, stop_event=None, budget=None):
+        """Async stream of `(cursor, comment_nodes)` pages, fetched ahead of the consumer.
+
+        A consumer that stops early should `aclose()` the stream, which stops
+        the fetching task there and then.
+        """
+        queue = asyncio.Queue(maxsize=max(1, prefetch))
+        done = object()
+
+        async def produce():
+            cursor = min_id
+            try:
+                while True:
+                    with metrics.PAGE_FETCH_SECONDS.time():
+                        page = await self.get_json(
+                            iphone_api.COMMENTS_PATH.format(media_id=media_id),
+                            iphone_api.comment_page_params(cursor), stop_event, budget)
+                    if page is None:
+                        break
+                    await queue.put((cursor, page.get("comments", [])))
+                    metrics.QUEUE_DEPTH.inc()
+                    cursor = page.get("next_min_id")
+                    if not cursor:
+                        break
+                await queue.put(done)
+            except Exception as e:
+                await queue.put(e)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                metrics.QUEUE_DEPTH.dec()
+                yield item
+        finally:
+            producer.cancel()
+            # Returns the producer's CancelledError instead of raising it; ours still propagates
+            await asyncio.gather(producer, return_exceptions=True)
+            while not queue.empty():
+                if isinstance(queue.get_nowait(), tuple):
+                    metrics.QUEUE_DEPTH.dec()
+
+
+async def fetch_comments_async(job, client, prefetch=2):
+    """Async counterpart of `main.fetch_comments` for one `ScrapeJob`."""
+    job.log(f"[INFO] Fetching comments for {job.shortcode}...", "blue")
+
+    writer = CommentWriter(job)
+    # Opening replays the checkpoint and output file, closing saves them; both block
+    if not await asyncio.to_thread(writer.open):
+        return 0
+
+    finished = False
+    try:
+        media_id = iphone_api.shortcode_to_mediaid(job.shortcode)
+        pages = client.comment_pages(media_id, writer.cursor, prefetch, job.stop_event, job.budget)
+        try:
+            async for cursor, nodes in pages:
+                # Written on a worker thread so the event loop keeps fetching meanwhile
+                if not await asyncio.to_thread(writer.add_page, cursor, nodes):
+                    break
+        finally:
+            await pages.aclose()
+
+        if job.stopped():
+            job.log(
+                f"[INFO] Scraping stopped by user. Fetched {writer.count} comments before stopping.", "orange")
+        else:
+            finished = True
+            job.log(f"[SUCCESS] Total comments fetched: {writer.count}", "green")
+
+    except Exception as e:
+        job.log(f"[ERROR] Error fetching comments: {e}", "red")
+
+    finally:
+        await asyncio.to_thread(writer.close, finished)
+
+    return writer.rows_written
+
+
+async def scrape_jobs(batch_jobs, client, concurrency=4, prefetch=2, **job_options):
+    """Scrape every queued `batch.BatchJob`, at most `concurrency` posts at a time."""
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def scrape(batch_job):
+        async with limit:
+            job = batch_job.scrape = ScrapeJob(batch_job.shortcode, url=batch_job.url, **job_options)
+            batch_job.output_path = job.output_path
+            batch_job.status = SCRAPING
+            try:
+                await fetch_comments_async(job, client, prefetch)
+            except Exception as e:
+                batch_job.status, batch_job.error = FAILED, str(e)
+                return
+            batch_job.comments = job.comments
+            if job.finished:
+                batch_job.status = DONE
+            elif job.stopped():
+                batch_job.status = STOPPED
+            else:
+                batch_job.status, batch_job.error = PARTIAL, "Interrupted, run again to resume"
+
+    await asyncio.gather(*(scrape(job) for job in batch_jobs if job.status == QUEUED))
+    return batch_jobs
+
+
+def run_batch(urls, session_data=None, concurrency=None, output_format=None, stop_event=None,
+              base_url=IPHONE_BASE_URL, prefetch=2, requests_per_minute=None, log_target=None):
+    """Scrape `urls` with the asyncio engine and return their `batch.BatchJob`s."""
+    jobs = make_jobs(urls)
+    concurrency = concurrency or getattr(config, "concurrency", 2)
+    job_options = {
+        "output_format": output_format or getattr(config, "output_format", "xlsx"),
+        "stop_event": stop_event or getattr(config, "stop_event", None),
+        "log_target": log_target,
+        "incremental": getattr(config, "incremental", False),
+        "enrich_text": getattr(config, "enrich_text", False),
+    }
+
+    async def run():
+        async with AsyncCommentClient(
+                session_data, base_url, connections=concurrency * prefetch,
+                requests_per_minute=requests_per_minute, stop_event=job_options["stop_event"],
+                log_target=log_target) as client:
+            await scrape_jobs(jobs, client, concurrency, prefetch, **job_options)
+            log_utils.log_message(
+                f"[RATE] {client.requests} requests, final rate {client.bucket.per_minute:.0f}/min.",
+                log_target, "blue")
+
+    asyncio.run(run())
+    return jobs
@@ -0,0 +1,234 @@
+"""Batch mode: scrape many posts/reels with a pool of concurrent workers.
+
+Post metadata is resolved on its own small pool so the next posts are ready
+by the time a comment worker frees up, while all requests of the batch draw
+from one shared `RateBudget`.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import custom_utils
+import log_utils
+import metrics
+from rate_limit import RateBudget
+from scrape_job import ScrapeJob
+
+QUEUED = "queued"
+RESOLVING = "resolving"
+READY = "ready"
+SCRAPING = "scraping"
+DONE = "done"
+PARTIAL = "partial"
+FAILED = "failed"
+STOPPED = "stopped"
+INVALID = "invalid"
+
+FINAL_STATUSES = (DONE, PARTIAL, FAILED, STOPPED, INVALID)
+
+
+class BatchJob:
+    """One post of a batch and its progress; `scrape` is its ScrapeJob once started."""
+
+    def __init__(self, url):
+        self.url = url
+        self.shortcode = custom_utils.extract_id(url)
+        self.status = QUEUED if self.shortcode else INVALID
+        self.comments = 0
+        self.error = None if self.shortcode else "Could not extract shortcode"
+        self.output_path = None
+        self.scrape = None
+
+    def __repr__(self):
+        return f"BatchJob({self.shortcode or self.url!r}, {self.status}, comments={self.comments})"
+
+
+def load_urls(source):
+    """Return post URLs from a file path or an iterable of strings.
+
+    Lines may hold several URLs separated by whitespace or commas; blank
+    lines and lines starting with '#' are skipped.
+    """
+    if isinstance(source, str) and os.path.isfile(source):
+        with open(source, "r", encoding="utf-8") as file:
+            lines = file.read().splitlines()
+    elif isinstance(source, str):
+        lines = [source]
+    else:
+        lines = list(source)
+
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        urls.extend(part for part in line.replace(",", " ").split() if part)
+    return urls
+
+
+def make_jobs(urls):
+    """Build one job per distinct shortcode, keeping the input order."""
+    jobs, seen = [], set()
+    for url in urls:
+        job = BatchJob(url)
+        if job.shortcode in seen:
+            continue
+        if job.shortcode:
+            seen.add(job.shortcode)
+        jobs.append(job)
+    return jobs
+
+
+class BatchScheduler:
+    """Runs a list of jobs through metadata and comment worker pools."""
+
+    def __init__(self, L, urls, concurrency=2, output_format=None, requests_per_minute=None,
+                 stop_event=None, post_loader=None, on_update=None, log_target=None,
+                 expand_replies=None, reply_workers=None, incremental=None, budget=None,
+                 enrich_text=None, enrich_profiles=None):
+        import main
+
+        self.L = L
+        self.jobs = make_jobs(urls)
+        self.concurrency = max(1, int(concurrency))
+        self.output_format = output_format or getattr(config, "output_format", "xlsx")
+        self.budget = budget or RateBudget(
+            requests_per_minute or getattr(config, "requests_per_minute", 60))
+        self.stop_event = stop_event or getattr(config, "stop_event", None) or threading.Event()
+        self.post_loader = post_loader or main.get_post
+        self.fetch_comments = main.fetch_comments
+        self.on_update = on_update
+        self.expand_replies = (expand_replies if expand_replies is not None
+                               else getattr(config, "expand_replies", False))
+        self.reply_workers = reply_workers or getattr(config, "reply_workers", 4)
+        self.incremental = incremental if incremental is not None else getattr(config, "incremental", False)
+        self.enrich_text = enrich_text if enrich_text is not None else getattr(config, "enrich_text", False)
+        self.enrich_profiles = (enrich_profiles if enrich_profiles is not None
+                                else getattr(config, "enrich_profiles", False))
+        self.log_target = log_target if log_target is not None else config.log_text
+        # Posts that are resolved or being scraped; bounds how far metadata runs ahead
+        self._ahead = threading.BoundedSemaphore(self.concurrency * 2)
+        self._lock = threading.Lock()
+
+    def _set_status(self, job, status, error=None):
+        with self._lock:
+            job.status = status
+            if error:
+                job.error = error
+        log_utils.log_message(
+            f"[BATCH] {job.shortcode}: {status}" + (f" ({error})" if error else ""),
+            self.log_target, "red" if status == FAILED else "blue")
+        if self.on_update:
+            self.on_update(job)
+
+    def _resolve(self, job):
+        self._set_status(job, RESOLVING)
+        job.scrape = ScrapeJob(
+            job.shortcode, loader=self.L, output_format=self.output_format,
+            stop_event=self.stop_event, log_target=self.log_target, budget=self.budget, url=job.url,
+            expand_replies=self.expand_replies, reply_workers=self.reply_workers,
+            incremental=self.incremental, enrich_text=self.enrich_text,
+            enrich_profiles=self.enrich_profiles)
+        job.output_path = job.scrape.output_path
+        with job.scrape.activate():
+            post = self.post_loader(job.scrape)
+        if post is None:
+            self._set_status(job, STOPPED if self.stop_event.is_set() else FAILED,
+                             None if self.stop_event.is_set() else "Post not found")
+            self._ahead.release()
+            return None
+        self._set_status(job, READY)
+        return post
+
+    def _scrape(self, job, post):
+        try:
+            self._set_status(job, SCRAPING)
+            with job.scrape.activate():
+                self.fetch_comments(job.scrape, post)
+            job.comments = job.scrape.comments
+            if job.scrape.finished:
+                self._set_status(job, DONE)
+            elif self.stop_event.is_set():
+                self._set_status(job, STOPPED)
+            else:
+                self._set_status(job, PARTIAL, "Interrupted, run again to resume")
+        except Exception as e:
+            self._set_status(job, FAILED, str(e))
+        finally:
+            self._ahead.release()
+
+    def _dispatch(self, resolved, comments_pool, job):
+        try:
+            post = resolved.result()
+        except Exception as e:
+            self._set_status(job, FAILED, str(e))
+            self._ahead.release()
+            return
+        if post is not None:
+            comments_pool.submit(self._scrape, job, post)
+
+    def _wait_for_slot(self):
+        while not self.stop_event.is_set():
+            if self._ahead.acquire(timeout=0.5):
+                return True
+        return False
+
+    def run(self):
+        """Process every job and return the list of jobs with their final status."""
+        pending = [job for job in self.jobs if job.status == QUEUED]
+        log_utils.log_message(
+            f"[BATCH] Starting {len(pending)} posts with {self.concurrency} workers.",
+            self.log_target, "blue")
+
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="comments") as comments_pool:
+            with ThreadPoolExecutor(self.concurrency, thread_name_prefix="metadata") as metadata_pool:
+                for job in pending:
+                    if not self._wait_for_slot():
+                        self._set_status(job, STOPPED)
+                        continue
+                    resolved = metadata_pool.submit(self._resolve, job)
+                    resolved.add_done_callback(
+                        lambda future, job=job: self._dispatch(future, comments_pool, job))
+
+        log_utils.log_message(f"[BATCH] Finished: {self.summary()}", self.log_target, "green")
+        return self.jobs
+
+    def summary(self):
+        counts = {}
+        for job in self.jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        total = sum(job.comments for job in self.jobs)
+        return ", ".join(f"{count} {status}" for status, count in counts.items()) + f"; {total} comments"
+
+
+def run_batch(L, source, **options):
+    """Scrape every post listed in `source` (a URL file or list of URLs)."""
+    return BatchScheduler(L, load_urls(source), **options).run()
+
+
+def main(source=None):
+    """Log in with `config.session_data` and scrape every post in `source`."""
+    import main as single
+
+    source = source if source is not None else getattr(config, "post_urls", [])
+    stop_event = getattr(config, 'stop_event', None)
+
+    metrics.start_from_config()
+    L = single.connect()
+    if stop_event and stop_event.is_set():
+        return []
+    if not (L and L.context.is_logged_in):
+        log_utils.log_message(
+            "[ERROR] Login required. Exiting.", config.log_text, "red")
+        return []
+
+    jobs = run_batch(
+        L, source,
+        concurrency=getattr(config, "concurrency", 2),
+        requests_per_minute=getattr(config, "requests_per_minute", 60),
+        stop_event=stop_event,
+    )
+    single.report_rate(L)
+    metrics.flush()
+    return jobs
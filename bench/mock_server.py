@@ -0,0 +1,262 @@
+"""Local stand-in for the Instagram endpoints the scraper talks to.
+
+Serves synthetic, deterministic comment pages in the shape of the iPhone
+comments endpoint so batch runs can be exercised without an account:
+
+    python -m bench.mock_server --port 8765 --comments 500
+
+`MockLoader` and `get_post` plug the server into `batch.BatchScheduler` (or a
+`ScrapeJob` run by `main.fetch_comments`) in place of a logged-in Instaloader.
+"""
+import argparse
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import iphone_api
+
+
+HOST_ID = 1_000_000
+
+
+def media_id_for(shortcode):
+    return iphone_api.shortcode_to_mediaid(shortcode)
+
+
+class MockInstagram:
+    """Synthetic comment data shared by every request of a server."""
+
+    def __init__(self, comments=500, page_size=20, latency=0.0, replies=0, rate_limit_every=0):
+        self.comments = comments
+        self.page_size = page_size
+        self.latency = latency
+        # Every 10th comment gets this many replies, two of them previewed inline
+        self.replies = replies
+        # Answer every Nth comment page request with a 429
+        self.rate_limit_every = rate_limit_every
+        self.page_requests = 0
+        self.rate_limited = 0
+        self.profile_lookups = 0
+        self._lock = threading.Lock()
+
+    def should_rate_limit(self):
+        if not self.rate_limit_every:
+            return False
+        with self._lock:
+            self.page_requests += 1
+            if self.page_requests % self.rate_limit_every:
+                return False
+            self.rate_limited += 1
+            return True
+
+    def post_info(self, shortcode):
+        return {"shortcode": shortcode, "mediaid": media_id_for(shortcode),
+                "comment_count": self.comments, "owner_id": str(HOST_ID)}
+
+    def user_info(self, user_id):
+        self.profile_lookups += 1
+        return {"user": {"pk": user_id, "username": f"user_{user_id}", "is_private": int(user_id) % 4 == 0,
+                         "follower_count": int(user_id) * 10, "following_count": int(user_id) % 50},
+                "status": "ok"}
+
+    def followers_page(self, user_id, max_id=None, page_size=200):
+        # Every even user of the 997 commenters follows the host
+        followers = [str(pk) for pk in range(0, 997, 2)] if int(user_id) == HOST_ID else []
+        start = int(max_id or 0)
+        end = min(start + page_size, len(followers))
+        return {"users": [{"pk": pk, "username": f"user_{pk}"} for pk in followers[start:end]],
+                "next_max_id": str(end) if end < len(followers) else None, "status": "ok"}
+
+    @staticmethod
+    def comment(pk, index, text):
+        return {
+            "pk": str(pk),
+            "text": f"Comment {index} {text}",
+            "created_at": 1_700_000_000 + index,
+            "comment_like_count": index % 5,
+            "child_comment_count": 0,
+            "preview_child_comments": [],
+            "user": {
+                "pk": str(index % 997),
+                "username": f"user_{index % 997}",
+                "is_verified": index % 101 == 0,
+                "is_mentionable": index % 3 != 0,
+            },
+        }
+
+    def reply_page(self, parent_id, max_id=None, page_size=None):
+        start = int(max_id or 0)
+        end = min(start + (page_size or self.page_size), self.replies)
+        return {
+            "child_comments": [
+                self.comment(f"{parent_id}r{index}", index, f"replying to {parent_id}")
+                for index in range(start, end)
+            ],
+            "has_more_tail_child_comments": end < self.replies,
+            "next_max_child_cursor": str(end) if end < self.replies else None,
+            "status": "ok",
+        }
+
+    def comment_page(self, media_id, min_id=None):
+        # Newest first, like Instagram; the cursor is the index of the last comment sent
+        start = int(min_id) - 1 if min_id else self.comments - 1
+        end = max(start - self.page_size, -1)
+        comments = []
+        for index in range(start, end, -1):
+            comment = self.comment(media_id * 1_000_000 + index, index, f"on {media_id} @friend_{index % 7}")
+            if self.replies and index % 10 == 0:
+                comment["child_comment_count"] = self.replies
+                comment["preview_child_comments"] = self.reply_page(comment["pk"], 0, 2)["child_comments"]
+            comments.append(comment)
+        return {
+            "comments": comments,
+            "comment_count": self.comments,
+            "next_min_id": str(end + 1) if end >= 0 else None,
+            "status": "ok",
+        }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        data = self.server.data
+        if data.latency:
+            time.sleep(data.latency)
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        # /api/v1/media/shortcode/<shortcode>/
+        if parts[:4] == ["api", "v1", "media", "shortcode"] and len(parts) == 5:
+            return self._send_json(data.post_info(parts[4]))
+        # /api/v1/media/<media_id>/comments/
+        if parts[:3] == ["api", "v1", "media"] and len(parts) == 5 and parts[4] == "comments":
+            if data.should_rate_limit():
+                return self._send_json(
+                    {"message": "Please wait a few minutes before you try again.", "status": "fail"}, status=429)
+            return self._send_json(data.comment_page(int(parts[3]), query.get("min_id")))
+        # /api/v1/media/<media_id>/comments/<comment_id>/child_comments/
+        if parts[:3] == ["api", "v1", "media"] and len(parts) == 7 and parts[6] == "child_comments":
+            return self._send_json(data.reply_page(parts[5], query.get("max_id")))
+        # /api/v1/users/<user_id>/info/
+        if parts[:3] == ["api", "v1", "users"] and len(parts) == 5 and parts[4] == "info":
+            return self._send_json(data.user_info(parts[3]))
+        # /api/v1/friendships/<user_id>/followers/
+        if parts[:3] == ["api", "v1", "friendships"] and len(parts) == 5 and parts[4] == "followers":
+            return self._send_json(data.followers_page(parts[3], query.get("max_id")))
+        self._send_json({"status": "fail", "message": "Not found"}, status=404)
+
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """Start a mock server on a background thread and return it.
+
+    The bound address is available as `server.base_url`; call
+    `server.shutdown()` to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.data = MockInstagram(**options)
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class MockContext:
+    """Minimal stand-in for `instaloader.InstaloaderContext`.
+
+    `rate_controller` is a factory taking the context, as for
+    `instaloader.Instaloader`; requests are then paced by it and a 429 is
+    handled and retried the way instaloader does.
+    """
+
+    is_logged_in = True
+
+    def __init__(self, base_url, rate_controller=None):
+        self.base_url = base_url.rstrip("/")
+        self._rate_controller = rate_controller(self) if rate_controller else None
+
+    def _get(self, url):
+        with urlopen(url) as response:
+            return response.read()
+
+    def get_iphone_json(self, path, params):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        if params:
+            url += "?" + urlencode(params)
+        while True:
+            if self._rate_controller is not None:
+                self._rate_controller.wait_before_query("iphone")
+            try:
+                body = self._get(url)
+            except HTTPError as e:
+                if e.code != 429 or self._rate_controller is None:
+                    raise
+                self._rate_controller.handle_429("iphone")
+                continue
+            return json.loads(body)
+
+
+class MockLoader:
+    """Minimal stand-in for `instaloader.Instaloader`."""
+
+    def __init__(self, base_url, rate_controller=None):
+        self.context = MockContext(base_url, rate_controller)
+
+
+class MockPost:
+    def __init__(self, context, shortcode, mediaid, owner_id=None):
+        self._context = context
+        self.shortcode = shortcode
+        self.mediaid = mediaid
+        self.owner_id = owner_id
+
+
+def get_post(job):
+    """Drop-in replacement for `main.get_post` that resolves against the mock."""
+    if not job.wait_for_request():
+        return None
+    context = job.loader.context
+    info = context.get_iphone_json(f"api/v1/media/shortcode/{job.shortcode}/", {})
+    return MockPost(context, job.shortcode, info["mediaid"], info.get("owner_id"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic Instagram comment pages.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--comments", type=int, default=500, help="Comments per post")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--replies", type=int, default=0, help="Replies on every 10th comment")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every Nth comment page request with a 429")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), MockHandler)
+    server.data = MockInstagram(args.comments, args.page_size, args.latency, args.replies,
+                                args.rate_limit_every)
+    print(f"Mock Instagram listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,279 @@
+"""End-to-end throughput benchmark against the local mock Instagram server.
+
+    python -m bench.pipeline --comments 1000 10000 100000 --format csv xlsx
+    python -m bench.pipeline --comments 50000 --latency 0.02 --rate-limit-every 100
+    python -m bench.pipeline --comments 100000 --enrich
+    python -m bench.pipeline --writers --comments 1000 100000 1000000
+    python -m bench.pipeline --comments 10000 100000 --save baseline.json
+    python -m bench.pipeline --comments 10000 100000 --compare baseline.json
+
+Every case runs in a fresh process with its own mock server and data folder,
+so the peak RSS reported is that of the case alone. Scrape cases run
+`main.fetch_comments` through an `AdaptiveRateController`, and split the wall
+time into network (HTTP round trips), parsing (JSON decoding, building
+records and `--enrich` text columns), I/O (sink writes, index and
+checkpoint) and rate limit waits.
+`--writers` skips the network and times each sink, plus the pandas
+`main.save_to_excel` path, on synthetic records.
+
+`--compare` exits with status 1 when a case got slower than the saved
+baseline by more than `--tolerance`.
+"""
+import argparse
+import collections
+import functools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ("network", "parse", "io", "wait")
+
+
+class Timings:
+    """Exclusive wall time per phase; nested timed calls are not counted twice."""
+
+    def __init__(self):
+        self.totals = collections.Counter()
+        self._stack = []
+
+    def wrap(self, phase, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            self._stack.append(0.0)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                self.totals[phase] += elapsed - self._stack.pop()
+                if self._stack:
+                    self._stack[-1] += elapsed
+        return timed
+
+    def patch(self, owner, name, phase):
+        setattr(owner, name, self.wrap(phase, getattr(owner, name)))
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 2 ** 20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def run_scrape(case):
+    """Scrape one synthetic post from a fresh mock server."""
+    import config
+    import main
+    import text_analysis
+    from comment_writer import CommentWriter
+    from rate_controller import AdaptiveRateController
+    from scrape_job import ScrapeJob
+    from bench import mock_server
+
+    config.requests_per_minute = config.max_requests_per_minute = case["rpm"]
+    config.rate_limit_backoff = case["backoff"]
+
+    timings = Timings()
+    timings.patch(mock_server.MockContext, "_get", "network")
+    timings.patch(mock_server.MockContext, "get_iphone_json", "parse")
+    timings.patch(CommentWriter, "add_page", "parse")
+    timings.patch(text_analysis, "enrich", "parse")
+    timings.patch(CommentWriter, "save_batch", "io")
+    timings.patch(CommentWriter, "close", "io")
+    timings.patch(AdaptiveRateController, "sleep", "wait")
+
+    server = mock_server.start_server(
+        comments=case["comments"], page_size=case["page_size"], latency=case["latency"],
+        rate_limit_every=case["rate_limit_every"])
+    loader = mock_server.MockLoader(server.base_url, lambda ctx: AdaptiveRateController(ctx))
+    job = ScrapeJob("BENCH", loader, output_format=case["format"], enrich_text=case.get("enrich", False))
+
+    started = time.perf_counter()
+    post = mock_server.get_post(job)
+    with job.activate():
+        main.fetch_comments(job, post)
+    seconds = time.perf_counter() - started
+    server.shutdown()
+    return {
+        "comments": job.comments,
+        "seconds": seconds,
+        "phases": {phase: timings.totals[phase] for phase in PHASES},
+        "rate_limited": server.data.rate_limited,
+    }
+
+
+def run_writer(case):
+    """Write synthetic records through one sink, or `main.save_to_excel` for "pandas"."""
+    import custom_utils
+    import sinks
+    from comment_record import CommentBuffer, CommentRecord
+    from comment_writer import CommentWriter
+    from bench import mock_server
+
+    # Pages are generated lazily so the sinks' memory use is not hidden by
+    # the input; generating them is left out of the timing.
+    data = mock_server.MockInstagram(comments=case["comments"], page_size=1000)
+    timings = Timings()
+    timings.patch(data, "comment_page", "generate")
+
+    def pages():
+        cursor = None
+        while True:
+            page = data.comment_page(1, cursor)
+            yield page["comments"]
+            cursor = page["next_min_id"]
+            if not cursor:
+                return
+
+    started = time.perf_counter()
+    if case["format"] == "pandas":
+        import main
+        rows = [[node["user"]["username"], node["text"], node["user"]["is_mentionable"]]
+                for nodes in pages() for node in nodes]
+        main.save_to_excel(rows, custom_utils.get_data_folder("bench.xlsx"), showMessage=False)
+        written = len(rows)
+    else:
+        buffer = CommentBuffer(sinks.COLUMNS)
+        path = sinks.output_path("BENCH", case["format"])
+        with sinks.open_sink(path, case["format"]) as sink:
+            for nodes in pages():
+                for node in nodes:
+                    buffer.append(CommentRecord.from_node(node))
+                    if len(buffer) == CommentWriter.BATCH_SIZE:
+                        sink.write_batch(buffer)
+                        sink.flush()
+                        buffer.clear()
+            sink.write_batch(buffer)
+            written = sink.rows_written
+    seconds = time.perf_counter() - started - timings.totals["generate"]
+    return {"comments": written, "seconds": seconds}
+
+
+def run_case(case):
+    import log_utils
+
+    # stdout carries the result
+    log_utils.console_stream = sys.stderr
+    result = run_writer(case) if case["kind"] == "writer" else run_scrape(case)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def spawn(case):
+    """Run `case` in a fresh interpreter inside a scratch data folder."""
+    with tempfile.TemporaryDirectory(prefix="scraper-bench-") as workdir:
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+        output = subprocess.run(
+            [sys.executable, "-m", "bench.pipeline", "--run-case", json.dumps(case)],
+            cwd=workdir, env=env, capture_output=True, text=True, check=False)
+    if output.returncode != 0:
+        return {"error": (output.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def case_name(case):
+    return f"{case['kind']}:{case['format']}:{case['comments']}"
+
+
+def build_cases(args):
+    for comments in args.comments:
+        for output_format in args.format:
+            case = {"kind": "writer" if args.writers else "scrape", "format": output_format,
+                    "comments": comments}
+            if not args.writers:
+                case.update(page_size=args.page_size, latency=args.latency, rpm=args.rpm,
+                            rate_limit_every=args.rate_limit_every, backoff=args.backoff, enrich=args.enrich)
+            yield case
+
+
+def print_result(name, result):
+    if "error" in result:
+        print(f"{name:<28} error: {result['error']}")
+        return
+    rate = result["comments"] / result["seconds"] if result["seconds"] else 0
+    rss = f"{result['peak_rss_mb']:.0f}MB" if result.get("peak_rss_mb") is not None else "n/a"
+    line = f"{name:<28}{result['comments']:>10}{result['seconds']:>9.2f}s{rate:>11.0f}/s{rss:>9}"
+    phases = result.get("phases")
+    if phases:
+        seconds = result["seconds"] or 1
+        line += "  " + " ".join(f"{phase} {phases[phase] / seconds:>4.0%}" for phase in PHASES)
+        if result.get("rate_limited"):
+            line += f"  ({result['rate_limited']} x 429)"
+    print(line)
+
+
+def compare(results, baseline, tolerance):
+    """Print the throughput change against `baseline`. Returns True if nothing regressed."""
+    ok = True
+    print(f"\n{'case':<28}{'baseline':>11}{'now':>11}  change")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before or "error" in before or "error" in result:
+            continue
+        old = before["comments"] / before["seconds"]
+        new = result["comments"] / result["seconds"]
+        change = new / old - 1
+        regressed = change < -tolerance
+        ok = ok and not regressed
+        print(f"{name:<28}{old:>10.0f}/s{new:>9.0f}/s  {change:+.0%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--comments", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Comments per case (default: %(default)s)")
+    parser.add_argument("--format", nargs="+", default=["csv"],
+                        help="Output formats; with --writers also 'pandas' for main.save_to_excel")
+    parser.add_argument("--writers", action="store_true", help="Time the sinks alone, without HTTP")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every Nth comment page request with a 429")
+    parser.add_argument("--rpm", type=float, default=1_000_000,
+                        help="Requests per minute allowed by the rate controller")
+    parser.add_argument("--enrich", action="store_true", help="Add the text_analysis columns while scraping")
+    parser.add_argument("--backoff", type=float, default=0.05, help="First 429 backoff in seconds")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed throughput drop against the baseline (default: %(default)s)")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return 0
+
+    print(f"{'case':<28}{'comments':>10}{'time':>10}{'throughput':>13}{'peak RSS':>9}")
+    results = {}
+    for case in build_cases(args):
+        name = case_name(case)
+        results[name] = spawn(case)
+        print_result(name, results[name])
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if not compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
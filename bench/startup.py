@@ -0,0 +1,79 @@
+"""Cold-start benchmark for the GUI, the CLI and the frozen executable.
+
+    python -m bench.startup --runs 5
+    python -m bench.startup --exe dist/InstagramCommentScraper.exe
+
+Each target is started in a fresh process `--runs` times and the median wall
+time is reported, together with the heavy modules its import pulled in. The
+GUI is timed up to its first idle frame when a display is available and to
+the end of `import scrapper_gui` otherwise.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "instaloader", "requests", "openpyxl", "tkinter")
+
+PROBE = """
+import json, sys
+import {module}
+print(json.dumps([name for name in {heavy!r} if name in sys.modules]))
+"""
+
+
+def has_display():
+    return sys.platform in ("win32", "darwin") or bool(os.environ.get("DISPLAY"))
+
+
+def time_command(command, runs, env=None):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=False)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def loaded_modules(module):
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT, capture_output=True, text=True, check=False)
+    try:
+        return json.loads(output.stdout)
+    except ValueError:
+        return [f"error: {output.stderr.strip().splitlines()[-1:]}"]
+
+
+def targets(exe=None):
+    env = dict(os.environ, SCRAPER_EXIT_AFTER_STARTUP="1")
+    if has_display():
+        yield "gui (first frame)", [sys.executable, "scrapper_gui.py"], env, "scrapper_gui"
+    else:
+        yield "gui (import only)", [sys.executable, "-c", "import scrapper_gui"], None, "scrapper_gui"
+    yield "cli --help", [sys.executable, "cli.py", "--help"], None, "cli"
+    yield "python baseline", [sys.executable, "-c", "pass"], None, None
+    if exe:
+        yield "frozen exe", [os.path.abspath(exe)], env, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--exe", help="Path of the PyInstaller build to time as well")
+    args = parser.parse_args(argv)
+
+    print(f"{'target':<22}{'median':>10}  heavy modules loaded")
+    for name, command, env, module in targets(args.exe):
+        seconds = time_command(command, args.runs, env)
+        modules = ", ".join(loaded_modules(module)) if module else "-"
+        print(f"{name:<22}{seconds * 1000:>8.0f}ms  {modules or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+
+import custom_utils
+
+
+class Checkpoint:
+    """Pagination state of an unfinished scrape, persisted next to its output.
+
+    Only the page the scrape stopped on is refetched when resuming, so besides
+    the cursor of that page we keep just the ids of the comments from it that
+    already reached the sink. Everything before the cursor is never requested
+    again.
+    """
+
+    def __init__(self, shortcode, output_format, cursor=None, page_ids=None, rows_written=0,
+                 columns=None, pending_replies=None, since=None, directory=None):
+        self.shortcode = shortcode
+        self.output_format = output_format
+        self.cursor = cursor
+        self.page_ids = set(page_ids or ())
+        self.rows_written = rows_written
+        self.columns = columns
+        # Comments whose reply threads were not written yet
+        self.pending_replies = list(pending_replies or ())
+        # Timestamp an incremental run stops at, None for a full scrape
+        self.since = since
+        self.path = self.path_for(shortcode, directory)
+
+    @staticmethod
+    def path_for(shortcode, directory=None):
+        """The checkpoint file of `shortcode`, in `directory` or the data folder."""
+        if directory:
+            return os.path.join(directory, f"{shortcode}.checkpoint.json")
+        return custom_utils.get_data_folder(f"{shortcode}.checkpoint.json")
+
+    @classmethod
+    def load(cls, shortcode, directory=None):
+        """Return the saved checkpoint for `shortcode`, or None if there is none."""
+        path = cls.path_for(shortcode, directory)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        return cls(
+            shortcode,
+            data.get("output_format", "xlsx"),
+            cursor=data.get("cursor"),
+            page_ids=data.get("page_ids"),
+            rows_written=data.get("rows_written", 0),
+            columns=data.get("columns"),
+            pending_replies=data.get("pending_replies"),
+            since=data.get("since"),
+            directory=directory,
+        )
+
+    def save(self, cursor, page_ids, rows_written, pending_replies=()):
+        """Atomically record the state reached after a flushed batch."""
+        self.cursor = cursor
+        self.page_ids = set(page_ids)
+        self.rows_written = rows_written
+        self.pending_replies = list(pending_replies)
+        data = {
+            "shortcode": self.shortcode,
+            "output_format": self.output_format,
+            "columns": self.columns,
+            "cursor": cursor,
+            "page_ids": sorted(self.page_ids),
+            "rows_written": rows_written,
+            "pending_replies": self.pending_replies,
+            "since": self.since,
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Remove the checkpoint once the scrape has finished."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,190 @@
+"""Headless command line entry point.
+
+    python cli.py https://www.instagram.com/reel/XXXX/ --session session.json
+    python cli.py --urls-file posts.txt --session credentials.csv --format csv --concurrency 4
+
+Only the scraping core is imported (no tkinter), progress is written to
+stderr and the exit code tells a job runner how the run went.
+"""
+import argparse
+import signal
+import sys
+import threading
+
+import config
+import log_utils
+import metrics
+import sinks
+
+EXIT_OK = 0
+EXIT_INCOMPLETE = 1
+EXIT_USAGE = 2
+EXIT_LOGIN_FAILED = 3
+EXIT_INTERRUPTED = 130
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="instagram-comment-scraper",
+        description="Scrape the comments of Instagram posts and reels.")
+    parser.add_argument("urls", nargs="*", help="Post or reel URLs")
+    parser.add_argument("-f", "--urls-file", help="File with one or more URLs per line")
+    parser.add_argument("-s", "--session", required=True,
+                        help="Session JSON (as saved by the GUI) or credentials CSV; "
+                             "several rows are rotated across")
+    parser.add_argument("--format", dest="output_format", choices=sinks.FORMATS,
+                        default=config.output_format, help="Output file format (default: %(default)s)")
+    parser.add_argument("-c", "--concurrency", type=int, default=config.concurrency,
+                        help="Posts scraped at once (default: %(default)s)")
+    parser.add_argument("--rpm", type=float, default=config.requests_per_minute,
+                        help="Starting requests per minute (default: %(default)s)")
+    parser.add_argument("--min-rpm", type=float, default=config.min_requests_per_minute)
+    parser.add_argument("--max-rpm", type=float, default=config.max_requests_per_minute)
+    parser.add_argument("--engine", choices=("threads", "async"), default="threads",
+                        help="threads: instaloader worker pool; async: aiohttp engine with page "
+                             "prefetching (first session only)")
+    parser.add_argument("--prefetch", type=int, default=2,
+                        help="Comment pages fetched ahead per post by the async engine")
+    parser.add_argument("--replies", action="store_true", default=config.expand_replies,
+                        help="Also fetch reply threads (threads engine only)")
+    parser.add_argument("--reply-workers", type=int, default=config.reply_workers,
+                        help="Reply threads fetched in parallel per post (default: %(default)s)")
+    parser.add_argument("--new-only", action="store_true", default=config.incremental,
+                        help="Only fetch comments newer than the ones already saved for each post")
+    parser.add_argument("--enrich", action="store_true", default=config.enrich_text,
+                        help="Add mention, hashtag, emoji and text hash columns")
+    parser.add_argument("--profiles", action="store_true", default=config.enrich_profiles,
+                        help="Add private, follower count and follows-host columns, looked up once per "
+                             "commenter and cached in data/profile_cache.db (threads engine only)")
+    parser.add_argument("--analytics", action="store_true", default=config.analytics,
+                        help="Also load the comments into data/analytics.db for analytics.py queries")
+    parser.add_argument("--cache", dest="cache_mode", choices=("off", "cache", "record", "replay"),
+                        default=config.http_cache_mode,
+                        help="Response cache: cache post metadata, record every response, or replay "
+                             "a recording offline (threads engine only; default: %(default)s)")
+    parser.add_argument("--cache-file", help="Response cache file (default: data/http_cache.db)")
+    parser.add_argument("--metrics-port", type=int, default=config.metrics_port,
+                        help="Serve Prometheus metrics on this port")
+    parser.add_argument("--metrics-file", default=config.metrics_file,
+                        help="Keep a JSON snapshot of the metrics in this file")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only log warnings and errors")
+    return parser
+
+
+def configure(args):
+    """Copy parsed arguments onto the `config` module the scraping core reads."""
+    import batch
+    import session_pool
+
+    urls = list(args.urls)
+    if args.urls_file:
+        urls.extend(batch.load_urls(args.urls_file))
+    urls = batch.load_urls(urls)
+
+    records = session_pool.load_session_records(args.session)
+    if not records:
+        raise ValueError(f"No complete session records in {args.session}")
+    config.session_data = records[0]
+    config.sessions_file = args.session if len(records) > 1 else None
+
+    config.output_format = args.output_format
+    config.concurrency = args.concurrency
+    config.requests_per_minute = args.rpm
+    config.min_requests_per_minute = args.min_rpm
+    config.max_requests_per_minute = args.max_rpm
+    config.expand_replies = args.replies
+    config.reply_workers = args.reply_workers
+    config.incremental = args.new_only
+    config.enrich_text = args.enrich
+    config.enrich_profiles = args.profiles
+    config.analytics = args.analytics
+    config.http_cache_mode = args.cache_mode
+    config.http_cache_path = args.cache_file or config.http_cache_path
+    config.metrics_port = args.metrics_port
+    config.metrics_file = args.metrics_file
+    config.post_urls = urls
+    config.log_text = None
+    return urls
+
+
+def install_stop_handlers(stop_event):
+    def request_stop(signum, frame):
+        stop_event.set()
+    for name in ("SIGTERM", "SIGHUP"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), request_stop)
+
+
+def run(urls, stop_event, engine="threads", prefetch=2):
+    """Run the batch on a worker thread so Ctrl-C can stop it cleanly."""
+    result = {}
+
+    def target():
+        if engine == "async":
+            import async_engine
+            if config.sessions_file:
+                log_utils.log_message(
+                    "[WARNING] The async engine uses only the first session of the file.", None, "orange")
+            result["jobs"] = async_engine.run_batch(
+                urls, config.session_data, stop_event=stop_event, prefetch=prefetch)
+        else:
+            import batch
+            result["jobs"] = batch.main(urls)
+
+    worker = threading.Thread(target=target, name="scraper")
+    worker.start()
+    while worker.is_alive():
+        try:
+            worker.join(0.5)
+        except KeyboardInterrupt:
+            log_utils.log_message(
+                "[INFO] Interrupted, saving progress...", None, "orange")
+            stop_event.set()
+    return result.get("jobs")
+
+
+def exit_code(jobs, stop_event):
+    import batch
+
+    if stop_event.is_set():
+        return EXIT_INTERRUPTED
+    if not jobs:
+        return EXIT_LOGIN_FAILED
+    if all(job.status == batch.DONE for job in jobs):
+        return EXIT_OK
+    return EXIT_INCOMPLETE
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    log_utils.console_stream = sys.stderr
+
+    try:
+        urls = configure(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not urls:
+        parser.error("no post URLs given")
+    if args.replies and args.engine == "async":
+        parser.error("--replies is not supported by the async engine")
+    if args.profiles and args.engine == "async":
+        parser.error("--profiles is not supported by the async engine")
+
+    if args.quiet:
+        log_utils.console_colors = {"red", "orange", "yellow"}
+
+    stop_event = threading.Event()
+    config.stop_event = stop_event
+    install_stop_handlers(stop_event)
+
+    metrics.start_from_config()
+    jobs = run(urls, stop_event, args.engine, args.prefetch)
+    metrics.flush()
+    for job in jobs or []:
+        print(f"{job.status}\t{job.comments}\t{job.shortcode or job.url}\t{job.output_path or job.error or ''}")
+    return exit_code(jobs, stop_event)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
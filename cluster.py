@@ -0,0 +1,652 @@
+"""Distributed scraping: worker nodes pull posts from a shared queue under leases.
+
+    python cluster.py submit URL [URL ...] --format csv
+    python cluster.py worker --session credentials.csv --slots 2
+    python cluster.py status [JOB]
+    python cluster.py merge [JOB] --wait
+
+A submitted job is split into one task per post. Every worker node (its own
+sessions, its own IP) claims tasks from the queue. A claim is a lease of
+`--lease` seconds that the node's heartbeat renews while the post is
+scraped. If a node dies, its leases run out and other nodes take its tasks
+over. They resume from the checkpoint the dead node left in the job's output
+folder. A post is retried on another lease up to `max_attempts` times.
+
+Writes are fenced on the lease holder. In the queue, every change to a task
+names the worker holding it and does nothing once the lease moved on. The
+output file, its index and its checkpoint are fenced by the node itself:
+it only writes a batch while the lease has at least a third of its time
+left on the node's own clock, counted from before the last renewal that
+succeeded. A node that cannot renew, or finds its lease taken, stops the
+post without writing again. That leaves two windows: nodes whose clocks
+drift apart by more than a third of the lease, and one write that takes
+longer than that (the final save of a very large xlsx).
+
+Each post is written to `<output folder>/job-<id>/<shortcode>.<ext>`. Once
+every task of a job is final, `merge` combines them with
+`export.merge_files` into `merged.<ext>` in the same folder.
+
+The queue lives behind `LeaseBackend`. `SQLiteLeaseBackend` needs nothing but
+a file every node can reach (local runs, or a shared folder for a few
+nodes). A networked backend registers a URL scheme in `BACKENDS` and is
+picked with `--queue <scheme>://...`.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+import batch
+import config
+import custom_utils
+import log_utils
+import service
+import sinks
+from job_queue import CANCELLED, DONE, FAILED, FINAL_STATUSES, PARTIAL, QUEUED, RUNNING
+from rate_limit import RateBudget
+from scrape_job import ScrapeJob
+
+LEASED = "leased"
+
+EXIT_OK = 0
+EXIT_INCOMPLETE = 1
+EXIT_USAGE = 2
+EXIT_LOGIN_FAILED = 3
+
+
+def default_queue():
+    return getattr(config, "cluster_queue", None) or custom_utils.get_data_folder("cluster.db")
+
+
+class LeaseBackend:
+    """Shared job queue with leased tasks. Subclasses store it somewhere all nodes can reach.
+
+    Tasks are dicts with id, job_id, url, shortcode, status, worker,
+    lease_until, attempts, comments, error, options, output_dir and output.
+    Every call that changes a leased task names the worker holding it and does
+    nothing once the lease moved on.
+    """
+
+    def submit(self, urls, options, output_root):
+        """Queue one task per distinct post of `urls`. Returns the job id."""
+        raise NotImplementedError
+
+    def claim(self, worker_id, lease_seconds, max_attempts=3):
+        """Lease the oldest queued or expired task to `worker_id`, or return None."""
+        raise NotImplementedError
+
+    def heartbeat(self, worker_id, task_ids, lease_seconds):
+        """Extend the leases of `task_ids`. Returns the ids `worker_id` still holds."""
+        raise NotImplementedError
+
+    def release(self, task_id, worker_id, error=None):
+        """Give a leased task back to the queue, e.g. when the node shuts down."""
+        raise NotImplementedError
+
+    def complete(self, task_id, worker_id, status, comments=0, error=None):
+        """Record the result of a task. Returns False if `worker_id` no longer held it."""
+        raise NotImplementedError
+
+    def job(self, job_id):
+        """The job with its tasks, or None."""
+        raise NotImplementedError
+
+    def jobs(self, status=None, limit=100):
+        raise NotImplementedError
+
+    def set_merged(self, job_id, path):
+        raise NotImplementedError
+
+    def register_worker(self, worker_id, slots):
+        raise NotImplementedError
+
+    def workers(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, options TEXT NOT NULL, status TEXT NOT NULL, "
+            "output_dir TEXT NOT NULL, merged TEXT, created_at REAL NOT NULL, finished_at REAL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, job_id INTEGER NOT NULL, url TEXT NOT NULL, "
+            "shortcode TEXT NOT NULL, status TEXT NOT NULL, worker TEXT, lease_until REAL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, comments INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "updated_at REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_job ON tasks (job_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, host TEXT, slots INTEGER, "
+            "started_at REAL, last_seen REAL)")
+        self._lock = threading.Lock()
+
+    def _transaction(self, work):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def submit(self, urls, options, output_root):
+        def insert():
+            now = time.time()
+            job_id = self._conn.execute(
+                "INSERT INTO jobs (options, status, output_dir, created_at) VALUES (?, ?, '', ?)",
+                (json.dumps(options or {}), QUEUED, now)).lastrowid
+            self._conn.execute(
+                "UPDATE jobs SET output_dir = ? WHERE id = ?",
+                (os.path.join(os.path.abspath(output_root), f"job-{job_id}"), job_id))
+            self._conn.executemany(
+                "INSERT INTO tasks (job_id, url, shortcode, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, post.url, post.shortcode, QUEUED, now)
+                 for post in batch.make_jobs(urls) if post.shortcode])
+            return job_id
+        return self._transaction(insert)
+
+    def _task(self, task_id):
+        row = self._conn.execute(
+            "SELECT tasks.*, jobs.options, jobs.output_dir FROM tasks JOIN jobs ON jobs.id = tasks.job_id "
+            "WHERE tasks.id = ?", (task_id,)).fetchone()
+        return self._decode_task(row)
+
+    @staticmethod
+    def _decode_task(row):
+        task = dict(row)
+        task["options"] = json.loads(task["options"])
+        task["output"] = sinks.output_path(
+            task["shortcode"], task["options"].get("format", "xlsx"), task["output_dir"])
+        return task
+
+    def _finish_job(self, job_id):
+        """Give the job its final status once none of its tasks is left to run."""
+        statuses = [row[0] for row in self._conn.execute("SELECT status FROM tasks WHERE job_id = ?", (job_id,))]
+        if any(status not in FINAL_STATUSES for status in statuses):
+            return
+        if all(status == DONE for status in statuses):
+            status = DONE
+        elif all(status == FAILED for status in statuses):
+            status = FAILED
+        else:
+            status = PARTIAL
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (status, time.time(), job_id))
+
+    def claim(self, worker_id, lease_seconds, max_attempts=3):
+        def lease():
+            now = time.time()
+            rows = self._conn.execute(
+                "SELECT id, job_id, status, attempts FROM tasks WHERE status = ? "
+                "OR (status = ? AND lease_until < ?) ORDER BY id LIMIT 20", (QUEUED, LEASED, now)).fetchall()
+            for row in rows:
+                if row["status"] == LEASED and row["attempts"] >= max_attempts:
+                    # Its workers keep dying on it
+                    self._conn.execute(
+                        "UPDATE tasks SET status = ?, worker = NULL, error = ?, updated_at = ? WHERE id = ?",
+                        (FAILED, f"Lease expired {row['attempts']} times", now, row["id"]))
+                    self._finish_job(row["job_id"])
+                    continue
+                self._conn.execute(
+                    "UPDATE tasks SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE id = ?", (LEASED, worker_id, now + lease_seconds, now, row["id"]))
+                self._conn.execute(
+                    "UPDATE jobs SET status = ? WHERE id = ? AND status = ?", (RUNNING, row["job_id"], QUEUED))
+                return self._task(row["id"])
+            return None
+        return self._transaction(lease)
+
+    def heartbeat(self, worker_id, task_ids, lease_seconds):
+        def renew():
+            now = time.time()
+            self._conn.execute("UPDATE workers SET last_seen = ? WHERE id = ?", (now, worker_id))
+            held = set()
+            for task_id in task_ids:
+                if self._conn.execute(
+                        "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                        (now + lease_seconds, task_id, worker_id, LEASED)).rowcount:
+                    held.add(task_id)
+            return held
+        return self._transaction(renew)
+
+    def release(self, task_id, worker_id, error=None):
+        def give_back():
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, worker = NULL, lease_until = NULL, error = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?", (QUEUED, error, time.time(), task_id, worker_id, LEASED))
+        self._transaction(give_back)
+
+    def complete(self, task_id, worker_id, status, comments=0, error=None):
+        def record():
+            updated = self._conn.execute(
+                "UPDATE tasks SET status = ?, comments = ?, error = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (status, comments, error, time.time(), task_id, worker_id, LEASED)).rowcount
+            if updated:
+                self._finish_job(self._conn.execute(
+                    "SELECT job_id FROM tasks WHERE id = ?", (task_id,)).fetchone()[0])
+            return bool(updated)
+        return self._transaction(record)
+
+    def job(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            tasks = self._conn.execute(
+                "SELECT tasks.*, jobs.options, jobs.output_dir FROM tasks JOIN jobs ON jobs.id = tasks.job_id "
+                "WHERE job_id = ? ORDER BY tasks.id", (job_id,)).fetchall()
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        job["tasks"] = [self._decode_task(task) for task in tasks]
+        return job
+
+    def jobs(self, status=None, limit=100):
+        query, params = "SELECT id FROM jobs", ()
+        if status:
+            query, params = query + " WHERE status = ?", (status,)
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(query + " ORDER BY id DESC LIMIT ?", params + (limit,))]
+        return [self.job(job_id) for job_id in ids]
+
+    def set_merged(self, job_id, path):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET merged = ? WHERE id = ?", (path, job_id))
+
+    def register_worker(self, worker_id, slots):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workers (id, host, slots, started_at, last_seen) VALUES (?, ?, ?, ?, ?)",
+                (worker_id, socket.gethostname(), slots, now, now))
+
+    def workers(self):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute("SELECT * FROM workers ORDER BY id")]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# URL scheme -> backend factory taking the rest of the URL; a plain path is a SQLite file
+BACKENDS = {
+    "sqlite": SQLiteLeaseBackend,
+}
+
+
+def open_backend(location=None):
+    """Open the queue at `location`: a file path, `sqlite:///path` or `<scheme>://...` of a registered backend."""
+    location = location or default_queue()
+    scheme, separator, rest = location.partition("://")
+    if not separator:
+        return SQLiteLeaseBackend(location)
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unknown queue backend '{scheme}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[scheme](rest)
+
+
+class ClusterWorker:
+    """One node: runs up to `slots` leased posts at once with one logged-in loader.
+
+    All slots share the node's request budget. A heartbeat thread renews the
+    leases every third of `lease_seconds`. It stops any post whose lease was
+    taken over or ran out while the queue could not be reached.
+    """
+
+    def __init__(self, L, backend, worker_id=None, slots=2, lease_seconds=60, requests_per_minute=None,
+                 max_attempts=3, post_loader=None, log_target=None):
+        import main
+
+        self.L = L
+        self.backend = backend
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.slots = max(1, int(slots))
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.budget = RateBudget(requests_per_minute or getattr(config, "requests_per_minute", 60))
+        self.post_loader = post_loader or main.get_post
+        self.fetch_comments = main.fetch_comments
+        self.log_target = log_target
+        self.stop_event = threading.Event()
+        self.completed = 0
+        self._active = {}
+        self._deadlines = {}
+        self._lost = set()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def log(self, message, color="blue"):
+        log_utils.log_message(f"[WORKER {self.worker_id}] {message}", self.log_target, color)
+
+    def start(self):
+        self.backend.register_worker(self.worker_id, self.slots)
+        threads = [threading.Thread(target=self._heartbeat, name="cluster-heartbeat", daemon=True)]
+        threads += [threading.Thread(target=self._work, name=f"cluster-{number}", daemon=True)
+                    for number in range(self.slots)]
+        for thread in threads:
+            thread.start()
+        self._threads = threads
+
+    def stop(self):
+        """Stop every post; their tasks go back to the queue and resume on any node."""
+        self.stop_event.set()
+        with self._lock:
+            jobs = list(self._active.values())
+        for job in jobs:
+            job.stop_event.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _heartbeat(self):
+        interval = max(1.0, self.lease_seconds / 3)
+        while not self.stop_event.wait(interval):
+            with self._lock:
+                task_ids = list(self._active)
+            # The lease is counted from before the request, the backend's clock may run ahead
+            renewed_at = time.monotonic()
+            try:
+                held = self.backend.heartbeat(self.worker_id, task_ids, self.lease_seconds)
+            except Exception as e:
+                self.log(f"[WARNING] Heartbeat failed: {e}", "orange")
+                with self._lock:
+                    for task_id in task_ids:
+                        if self._deadlines.get(task_id, 0) <= time.monotonic():
+                            self._lose(task_id)
+                continue
+            with self._lock:
+                for task_id in task_ids:
+                    if task_id in held:
+                        if task_id in self._deadlines:
+                            self._deadlines[task_id] = renewed_at + self.lease_seconds
+                    else:
+                        self._lose(task_id)
+
+    def _lose(self, task_id):
+        """Stop a post whose lease is gone. Call with the lock held."""
+        job = self._active.get(task_id)
+        if job is not None:
+            self._lost.add(task_id)
+            job.stop_event.set()
+
+    def _holds(self, task_id):
+        """Fence for a post's writes: True while its lease has a third of its time left."""
+        with self._lock:
+            if task_id in self._lost:
+                return False
+            if time.monotonic() < self._deadlines.get(task_id, 0) - self.lease_seconds / 3:
+                return True
+            self._lose(task_id)
+            return False
+
+    def _work(self, idle_wait=2):
+        while not self.stop_event.is_set():
+            claimed_at = time.monotonic()
+            try:
+                task = self.backend.claim(self.worker_id, self.lease_seconds, self.max_attempts)
+            except Exception as e:
+                self.log(f"[WARNING] Could not claim a task: {e}", "orange")
+                task = None
+            if task is None:
+                self.stop_event.wait(idle_wait)
+                continue
+            self._run(task, claimed_at + self.lease_seconds)
+
+    def _run(self, task, deadline):
+        task_id, options = task["id"], task["options"]
+        job = ScrapeJob(
+            task["shortcode"], loader=self.L, output_format=options.get("format", "xlsx"),
+            stop_event=threading.Event(), log_target=self.log_target, budget=self.budget, url=task["url"],
+            expand_replies=options.get("replies", False), reply_workers=getattr(config, "reply_workers", 4),
+            incremental=options.get("new_only", False), enrich_text=options.get("enrich", False),
+            enrich_profiles=options.get("profiles", False), output_dir=task["output_dir"],
+            fence=lambda: self._holds(task_id))
+        with self._lock:
+            self._active[task_id] = job
+            self._deadlines[task_id] = deadline
+            if self.stop_event.is_set():
+                job.stop_event.set()
+        self.log(f"{task['shortcode']} (job {task['job_id']}, attempt {task['attempts']}) started.")
+
+        post, error = None, None
+        try:
+            with job.activate():
+                post = self.post_loader(job)
+                if post is not None and not job.stopped():
+                    self.fetch_comments(job, post)
+        except Exception as e:
+            error = str(e)
+        finally:
+            with self._lock:
+                del self._active[task_id]
+                del self._deadlines[task_id]
+                lost = task_id in self._lost
+                self._lost.discard(task_id)
+
+        if lost:
+            self.log(f"[WARNING] Lost the lease on {task['shortcode']}, leaving it to the next worker.", "orange")
+            return
+        try:
+            self._report(task, job, post, error)
+        except Exception as e:
+            # The lease runs out and another attempt picks the post up
+            self.log(f"[WARNING] Could not report {task['shortcode']} to the queue: {e}", "orange")
+
+    def _report(self, task, job, post, error):
+        task_id = task["id"]
+        if self.stop_event.is_set():
+            self.backend.release(task_id, self.worker_id)
+            self.log(f"{task['shortcode']} handed back to the queue.", "orange")
+            return
+
+        if job.finished:
+            status = DONE
+        elif post is None and error is None:
+            status, error = FAILED, "Post not found"
+        elif task["attempts"] < self.max_attempts:
+            self.backend.release(task_id, self.worker_id, error or "Scrape incomplete")
+            self.log(f"[WARNING] {task['shortcode']} incomplete, queued for another attempt.", "orange")
+            return
+        else:
+            status = PARTIAL if job.comments else FAILED
+        if self.backend.complete(task_id, self.worker_id, status, job.comments, error):
+            self.completed += 1
+            self.log(f"{task['shortcode']} {status} with {job.comments} comments.",
+                     "red" if status == FAILED else "green")
+
+
+def merge_job(backend, job_id, output_format=None, output=None, workers=None):
+    """Merge the outputs of a finished job into one file. Returns `(path, rows)`."""
+    import export
+
+    job = backend.job(job_id)
+    if job is None:
+        raise ValueError(f"No job {job_id}")
+    if job["status"] not in FINAL_STATUSES:
+        raise ValueError(f"Job {job_id} is still {job['status']}")
+    paths = [task["output"] for task in job["tasks"] if task["comments"] and os.path.isfile(task["output"])]
+    if not paths:
+        raise ValueError(f"Job {job_id} has no results to merge")
+    output_format = output_format or job["options"].get("format", "xlsx")
+    output = output or os.path.join(job["output_dir"], f"merged.{output_format}")
+    rows = export.merge_files(paths, output_format, output, workers)
+    backend.set_merged(job_id, output)
+    return output, rows
+
+
+def print_job(job):
+    counts = {}
+    for task in job["tasks"]:
+        counts[task["status"]] = counts.get(task["status"], 0) + 1
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"job {job['id']}: {job['status']} ({summary}), {sum(task['comments'] for task in job['tasks'])} "
+          f"comments -> {job['merged'] or job['output_dir']}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="instagram-comment-cluster", description="Scrape posts on several worker nodes from a shared queue.")
+    parser.add_argument("--queue", default=None,
+                        help="Queue file or backend URL shared by every node (default: data/cluster.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="Queue a job")
+    submit.add_argument("urls", nargs="*", help="Post or reel URLs")
+    submit.add_argument("-f", "--urls-file", help="File with one or more URLs per line")
+    submit.add_argument("--format", dest="output_format", choices=sorted(sinks.FORMATS),
+                        default=config.output_format)
+    submit.add_argument("--replies", action="store_true", default=config.expand_replies)
+    submit.add_argument("--new-only", action="store_true", default=config.incremental)
+    submit.add_argument("--enrich", action="store_true", default=config.enrich_text)
+    submit.add_argument("--profiles", action="store_true", default=config.enrich_profiles)
+    submit.add_argument("--out-dir", help="Folder every node can reach for the job outputs "
+                                          "(default: next to the queue file)")
+
+    worker = commands.add_parser("worker", help="Run this node as a worker until stopped")
+    worker.add_argument("-s", "--session", required=True,
+                        help="Session JSON or credentials CSV of this node; several rows are rotated across")
+    worker.add_argument("--slots", type=int, default=config.cluster_slots, help="Posts scraped at once")
+    worker.add_argument("--lease", type=float, default=config.cluster_lease_seconds,
+                        help="Lease length in seconds (default: %(default)s)")
+    worker.add_argument("--rpm", type=float, default=config.requests_per_minute,
+                        help="Requests per minute of this node (default: %(default)s)")
+    worker.add_argument("--id", dest="worker_id", help="Worker name (default: <host>-<pid>)")
+    worker.add_argument("-q", "--quiet", action="store_true", help="Only log warnings and errors")
+
+    status = commands.add_parser("status", help="Show jobs and workers")
+    status.add_argument("job", type=int, nargs="?")
+
+    merge = commands.add_parser("merge", help="Merge the outputs of finished jobs")
+    merge.add_argument("job", type=int, nargs="?", help="Job to merge (default: every finished, unmerged job)")
+    merge.add_argument("--to", dest="output_format", choices=("xlsx", "csv", "jsonl", "parquet", "sqlite"))
+    merge.add_argument("--out", help="Merged file (default: merged.<ext> in the job folder)")
+    merge.add_argument("--wait", action="store_true", help="Wait for the job to finish first")
+    return parser
+
+
+def run_worker(args, backend):
+    import main as single
+    import session_pool
+
+    log_utils.console_stream = sys.stderr
+    if args.quiet:
+        log_utils.console_colors = {"red", "orange", "yellow"}
+    records = session_pool.load_session_records(args.session)
+    if not records:
+        raise ValueError(f"No complete session records in {args.session}")
+    config.session_data = records[0]
+    config.sessions_file = args.session if len(records) > 1 else None
+    config.requests_per_minute = args.rpm
+    config.log_text = None
+
+    L = single.connect()
+    if not (L and L.context.is_logged_in):
+        log_utils.log_message("[ERROR] Login required. Exiting.", None, "red")
+        return EXIT_LOGIN_FAILED
+
+    worker = ClusterWorker(L, backend, args.worker_id, args.slots, args.lease, args.rpm,
+                           getattr(config, "cluster_max_attempts", 3))
+    stopped = threading.Event()
+    for name in ("SIGTERM", "SIGHUP"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), lambda signum, frame: stopped.set())
+    worker.start()
+    worker.log(f"Pulling from {args.queue or default_queue()} with {worker.slots} slots.", "green")
+    try:
+        while not stopped.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    worker.log("Stopping, handing unfinished posts back...", "orange")
+    worker.stop()
+    return EXIT_OK
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        backend = open_backend(args.queue)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        parser.error(str(e))
+    if args.command == "merge" and args.out and args.job is None:
+        parser.error("--out needs a job")
+
+    try:
+        if args.command == "submit":
+            urls = list(args.urls) + (batch.load_urls(args.urls_file) if args.urls_file else [])
+            urls, options = service.parse_job_request({
+                "urls": urls, "format": args.output_format, "replies": args.replies,
+                "new_only": args.new_only, "enrich": args.enrich, "profiles": args.profiles})
+            output_root = args.out_dir or os.path.join(
+                os.path.dirname(os.path.abspath(getattr(backend, "path", default_queue()))), "cluster-output")
+            job_id = backend.submit(urls, options, output_root)
+            print_job(backend.job(job_id))
+        elif args.command == "worker":
+            return run_worker(args, backend)
+        elif args.command == "status":
+            jobs = [backend.job(args.job)] if args.job else backend.jobs()
+            if None in jobs:
+                parser.error(f"No job {args.job}")
+            for job in jobs:
+                print_job(job)
+            now = time.time()
+            for worker in backend.workers():
+                print(f"worker {worker['id']}: {worker['slots']} slots, "
+                      f"last seen {now - worker['last_seen']:.0f}s ago")
+        elif args.command == "merge":
+            if args.job is None:
+                jobs = [job for job in backend.jobs() if job["status"] in FINAL_STATUSES and not job["merged"]]
+            else:
+                jobs = [backend.job(args.job)]
+                if jobs[0] is None:
+                    parser.error(f"No job {args.job}")
+            incomplete = False
+            for job in jobs:
+                while args.wait and job["status"] not in FINAL_STATUSES:
+                    time.sleep(5)
+                    job = backend.job(job["id"])
+                if job["status"] not in FINAL_STATUSES:
+                    print(f"job {job['id']}: still {job['status']}, run with --wait to wait for it")
+                    incomplete = True
+                    continue
+                if job["status"] == CANCELLED:
+                    continue
+                try:
+                    output, rows = merge_job(backend, job["id"], args.output_format, args.out)
+                except ValueError as e:
+                    print(f"job {job['id']}: {e}")
+                    incomplete = True
+                    continue
+                print(f"job {job['id']}: {rows} rows merged into {output}")
+            return EXIT_INCOMPLETE if incomplete else EXIT_OK
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    finally:
+        backend.close()
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    # merge runs export's process pool, which needs this on Windows
+    from multiprocessing import freeze_support
+
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Typed comment records and the columnar buffer they are batched in.
+
+Giveaway posts collect tens of thousands of comments from the same few
+thousand accounts, so usernames are interned and a batch is held as one list
+per column instead of one list per comment. Sinks read the columns straight
+out of the buffer; nothing goes through a DataFrame.
+"""
+import sys
+
+# (sink column, record attribute, SQLite type)
+SCHEMA = (
+    ("Username", "username", "TEXT"),
+    ("Comment", "text", "TEXT"),
+    ("Is Mentionable", "is_mentionable", "INTEGER"),
+    ("Comment ID", "comment_id", "TEXT"),
+    ("Created At", "created_at", "INTEGER"),
+    ("Like Count", "like_count", "INTEGER"),
+    ("Owner ID", "owner_id", "TEXT"),
+    ("Is Verified", "is_verified", "INTEGER"),
+    ("Parent ID", "parent_id", "TEXT"),
+    ("Depth", "depth", "INTEGER"),
+)
+
+# Columns computed per batch rather than held by records: text_analysis fills
+# the text columns and profiles the commenter profile columns
+TEXT_SCHEMA = (
+    ("Mentions", "TEXT"),
+    ("Mention Count", "INTEGER"),
+    ("Hashtags", "TEXT"),
+    ("Emoji Count", "INTEGER"),
+    ("Text Hash", "TEXT"),
+)
+PROFILE_SCHEMA = (
+    ("Is Private", "INTEGER"),
+    ("Follower Count", "INTEGER"),
+    ("Following Count", "INTEGER"),
+    ("Follows Host", "INTEGER"),
+)
+DERIVED_SCHEMA = TEXT_SCHEMA + PROFILE_SCHEMA
+
+COLUMN_ATTRS = {column: attr for column, attr, _ in SCHEMA}
+COLUMN_TYPES = {column: sql_type for column, _, sql_type in SCHEMA}
+COLUMN_TYPES.update(DERIVED_SCHEMA)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class CommentRecord:
+    """One scraped comment, with the fields the iPhone endpoint already returns."""
+
+    __slots__ = tuple(attr for _, attr, _ in SCHEMA)
+
+    def __init__(self, username, text, is_mentionable=False, comment_id=None, created_at=None,
+                 like_count=0, owner_id=None, is_verified=False, parent_id=None, depth=0):
+        self.username = _intern(username)
+        self.text = text
+        self.is_mentionable = is_mentionable
+        self.comment_id = comment_id
+        self.created_at = created_at
+        self.like_count = like_count
+        self.owner_id = _intern(owner_id)
+        self.is_verified = is_verified
+        self.parent_id = parent_id
+        self.depth = depth
+
+    @classmethod
+    def from_node(cls, node, parent_id=None):
+        """Build a record from a raw iPhone API comment node."""
+        user = node.get("user") or {}
+        return cls(
+            username=user.get("username"),
+            text=node.get("text"),
+            is_mentionable=bool(user.get("is_mentionable", False)),
+            comment_id=str(node.get("pk") or node.get("id")),
+            created_at=node.get("created_at"),
+            like_count=node.get("comment_like_count", 0),
+            owner_id=str(user["pk"]) if user.get("pk") is not None else None,
+            is_verified=bool(user.get("is_verified", False)),
+            parent_id=parent_id,
+            depth=1 if parent_id else 0,
+        )
+
+    def row(self, columns):
+        return [getattr(self, COLUMN_ATTRS[column]) for column in columns]
+
+    def __repr__(self):
+        return f"CommentRecord({self.username!r}, {self.comment_id!r})"
+
+
+class CommentBuffer:
+    """A batch of records stored column by column, in sink column order.
+
+    Derived columns (`DERIVED_SCHEMA`) must come after the record columns.
+    They are left empty by `append()` and filled for the whole batch with
+    `set_column()`.
+    """
+
+    __slots__ = ("columns", "_attrs", "_data", "_derived")
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self._attrs = [COLUMN_ATTRS[column] for column in self.columns if column in COLUMN_ATTRS]
+        self._data = [[] for _ in self.columns]
+        self._derived = self._data[len(self._attrs):]
+
+    def append(self, record):
+        for values, attr in zip(self._data, self._attrs):
+            values.append(getattr(record, attr))
+        for values in self._derived:
+            values.append(None)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def column(self, name):
+        return self._data[self.columns.index(name)]
+
+    def set_column(self, name, values):
+        """Replace the values of one column for the whole batch."""
+        current = self.column(name)
+        if len(values) != len(current):
+            raise ValueError(f"{name}: expected {len(current)} values, got {len(values)}")
+        current[:] = values
+
+    def drop(self, comment_ids):
+        """Remove the records whose Comment ID is in `comment_ids`."""
+        keep = [i for i, value in enumerate(self.column("Comment ID")) if value not in comment_ids]
+        for values in self._data:
+            values[:] = [values[i] for i in keep]
+
+    def rows(self):
+        """Iterate the batch as row tuples ordered like `columns`."""
+        return zip(*self._data)
+
+    def clear(self):
+        for values in self._data:
+            values.clear()
+
+    def __len__(self):
+        return len(self._data[0]) if self._data else 0
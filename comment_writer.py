@@ -0,0 +1,323 @@
+import itertools
+import os
+import time
+
+import analytics
+import config
+import iphone_api
+import metrics
+import profiles
+import sinks
+import text_analysis
+from checkpoint import Checkpoint
+from comment_record import CommentBuffer, CommentRecord
+from seen_index import SeenIndex
+
+
+class CommentWriter:
+    """Turns pages of raw comment nodes into sink rows for one `ScrapeJob`.
+
+    Rows are written in batches of `BATCH_SIZE` and every batch is
+    checkpointed, so any page source (the synchronous instaloader path or the
+    asyncio engine) gets the same resume behaviour.
+
+    Every written comment id goes into the output's `SeenIndex`, so running a
+    post again appends only the comments the file does not have yet.
+
+    In incremental mode (`job.incremental`) pagination stops as soon as a page
+    ends in a comment older than the newest one the previous run saved.
+
+    With `job.enrich_text` every batch gets the `text_analysis` columns
+    (mentions, hashtags, emoji count, text hash) just before it is written.
+    With a `profiles.ProfileResolver` it also gets the commenters' profile
+    columns. Saved rows are also handed to `config.results_feed` when the GUI
+    set one.
+
+    Before every write the job's fence is checked (`job.may_write()`). Once
+    it fails the job is stopped and nothing more is written: not the sink,
+    the index or the checkpoint, which now belong to whoever took over.
+
+    With a `replies.ReplyExpander`, threads with replies are handed to it as
+    their top-level row is queued, and finished threads are written as they
+    come back. Threads still in flight are checkpointed and resubmitted on
+    resume.
+    """
+
+    BATCH_SIZE = 20
+    LOG_EVERY = 10
+
+    def __init__(self, job, expander=None, profiles_resolver=None):
+        self.job = job
+        self.expander = expander
+        self.profiles = profiles_resolver
+        self.columns = sinks.THREAD_COLUMNS if expander else sinks.COLUMNS
+        if job.enrich_text:
+            self.columns = self.columns + text_analysis.TEXT_COLUMNS
+        if profiles_resolver:
+            self.columns = self.columns + profiles.PROFILE_COLUMNS
+        self.file_path = job.output_path
+        self.count = 0
+        self.replies = 0
+        self.duplicates = 0
+        self.rows_written = 0
+        self.sink = None
+        self.state = None
+        self.index = None
+        self.analytics = None
+        self.results = None
+        self.since = None
+        self.caught_up = False
+        self.fenced = False
+        self._newest = None
+        self._rows = CommentBuffer(self.columns)
+        self._batch_ids = set()
+        self._cursor = None
+        self._page_ids = []
+        self._skip_ids = set()
+
+    @property
+    def cursor(self):
+        """The page cursor to start (or resume) paginating from."""
+        return self.state.cursor if self.state else None
+
+    def open(self):
+        """Load or start the checkpoint and open the sink. Returns False on failure."""
+        job = self.job
+        index = SeenIndex(SeenIndex.path_for(self.file_path))
+        state = Checkpoint.load(job.shortcode, job.output_dir)
+        if state and (state.output_format, state.columns) != (job.output_format, self.columns):
+            job.log(
+                "[WARNING] Ignoring checkpoint saved with a different output format or columns.", "orange")
+            state.clear()
+            state = None
+
+        # Under the index lock an overlapping run cannot start the file over
+        # between our check and the sink opening it.
+        with index.exclusive():
+            append = self._prepare(index, state)
+            try:
+                self.sink = sinks.open_sink(self.file_path, job.output_format, columns=self.columns, append=append)
+            except Exception as e:
+                job.log(f"[ERROR] Could not open output file: {e}", "red")
+                self.sink = None
+        if self.sink is None:
+            index.close()
+            return False
+
+        state = self.state
+        self.index = index
+        self.analytics = analytics.from_config()
+        self.results = getattr(config, "results_feed", None)
+        self.since = state.since
+        self._cursor = state.cursor
+        self._page_ids = list(state.page_ids)
+        self._skip_ids = set(state.page_ids)
+        self.rows_written = state.rows_written
+        if self.expander:
+            for parent_id in state.pending_replies:
+                self.expander.submit(parent_id)
+        return True
+
+    def _prepare(self, index, state):
+        """Decide between resuming, appending to and replacing the output. Returns the sink's append flag."""
+        job = self.job
+        if state:
+            job.log(
+                f"[INFO] Resuming previous scrape after {state.rows_written} saved comments.", "blue")
+            if index.columns is None:
+                index.reset(self.columns)
+            self._reconcile(index, state)
+            self.state = state
+            return state.rows_written > 0
+
+        self.state = state = Checkpoint(
+            job.shortcode, job.output_format, columns=self.columns, directory=job.output_dir)
+        if index.columns == self.columns and os.path.exists(self.file_path):
+            state.rows_written = len(index)
+            job.log(f"[INFO] {state.rows_written} comments already saved to '{self.file_path}', "
+                    f"only new ones will be appended.", "blue")
+            newest = index.newest
+            if job.incremental and newest:
+                state.since = newest["created_at"]
+                job.log(f"[INFO] Fetching comments newer than {time.ctime(state.since)}.", "blue")
+            return True
+
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+            job.log(f"Deleted Previous File: {self.file_path}", "blue")
+        else:
+            job.log(f"File does not exist: {self.file_path}", "blue")
+        index.reset(self.columns)
+        return False
+
+    def _reconcile(self, index, state):
+        """Index the rows an interrupted run wrote after its last index commit.
+
+        A process killed between flushing a batch and committing its ids
+        leaves rows the index does not know, and they would be written again
+        on resume. Those rows come after the checkpoint's `rows_written`, so
+        only that tail is indexed. The xlsx sink keeps the rows written since
+        its last save in its journal, which is read whole.
+        """
+        import export
+
+        path, skip = self.file_path, state.rows_written
+        if self.job.output_format == "xlsx":
+            path, skip = f"{path}.journal.csv", 0
+        if not os.path.exists(path):
+            return
+        try:
+            with export.open_rows(path) as (columns, rows):
+                if "Comment ID" not in columns:
+                    return
+                position = columns.index("Comment ID")
+                added = index.add_existing(
+                    str(row[position]) for row in itertools.islice(rows, skip, None)
+                    if len(row) > position and row[position])
+        except Exception as e:
+            self.job.log(f"[WARNING] Could not check '{path}' against its index: {e}", "orange")
+            return
+        if added:
+            self.job.log(f"[INFO] {added} comments saved by an interrupted run were indexed.", "blue")
+
+    def add_page(self, cursor, nodes):
+        """Queue the comments of one page. Returns False once stopped or caught up."""
+        if cursor != self._cursor:
+            self._cursor = cursor
+            self._page_ids = []
+            self._skip_ids = set()
+
+        for node in nodes:
+            # ⚠️ CRITICAL: Check stop event at the start of each iteration
+            if self.job.stopped():
+                return False
+
+            node_id = iphone_api.comment_id(node)
+            if node_id in self._skip_ids:
+                continue
+            if self.expander and self.expander.has_replies(node):
+                self.expander.submit(node_id, node)
+            if node_id in self._batch_ids or node_id in self.index:
+                self.duplicates += 1
+                continue
+
+            record = CommentRecord.from_node(node)
+            self._rows.append(record)
+            self._batch_ids.add(node_id)
+            if record.created_at is not None and (self._newest is None or record.created_at > self._newest[0]):
+                self._newest = (record.created_at, node_id)
+            self._page_ids.append(node_id)
+            self.count += 1
+
+            if self.count % self.LOG_EVERY == 0:
+                self.job.log(f"[INFO] Fetched {self.count} comments so far...", "blue")
+
+            if self.count % self.BATCH_SIZE == 0:
+                self.save_batch()
+
+        if self.since is not None and nodes and self._is_old(nodes[-1]):
+            self.caught_up = True
+            self.job.log("[INFO] Reached the comments saved by the previous run.", "blue")
+            return False
+        return not self.job.stopped()
+
+    def _is_old(self, node):
+        created_at = node.get("created_at")
+        if created_at is None:
+            return iphone_api.comment_id(node) in self.index
+        return created_at <= self.since
+
+    def _add_replies(self, wait=False):
+        for parent_id, nodes in self.expander.completed(wait):
+            for node in nodes:
+                node_id = iphone_api.comment_id(node)
+                if node_id in self._batch_ids or node_id in self.index:
+                    self.duplicates += 1
+                    continue
+                self._rows.append(CommentRecord.from_node(node, parent_id))
+                self._batch_ids.add(node_id)
+                self.replies += 1
+
+    def _fenced_off(self):
+        """Whether the job lost the right to write its output; stops the job when it just did."""
+        if not self.fenced and not self.job.may_write():
+            self.fenced = True
+            self.job.stop_event.set()
+            self.job.log("[WARNING] This post was handed to another worker, stopping without saving.", "orange")
+        return self.fenced
+
+    def save_batch(self):
+        """Append the pending rows (and finished reply threads) to the sink and checkpoint them."""
+        if self._fenced_off():
+            self._rows.clear()
+            self._batch_ids.clear()
+            return
+        pending_replies = ()
+        if self.expander:
+            self._add_replies()
+            pending_replies = self.expander.pending()
+        if self.job.enrich_text and len(self._rows):
+            text_analysis.enrich(self._rows)
+        if self.profiles and len(self._rows):
+            self.profiles.enrich(self._rows)
+        with self.index.claim(self._rows.column("Comment ID"), self._newest) as taken:
+            # Saved by an overlapping run since we checked
+            if taken:
+                self.duplicates += len(taken)
+                self._rows.drop(taken)
+            with metrics.SINK_FLUSH_SECONDS.time():
+                self.sink.write_batch(self._rows)
+                self.sink.flush()
+        rows = list(self._rows.rows()) if self.analytics is not None or self.results is not None else []
+        if self.analytics is not None and rows:
+            try:
+                self.analytics.add_rows(self.job.shortcode, self.columns, rows)
+            except Exception as e:
+                self.job.log(f"[WARNING] Could not add comments to the analytics store: {e}", "orange")
+        if self.results is not None and rows:
+            self.results.put(self.job.shortcode, self.columns, rows)
+        metrics.COMMENTS.inc(len(self._rows))
+        self.rows_written += len(self._rows)
+        # Live progress for whoever watches the job
+        self.job.comments = self.rows_written
+        self.state.save(self._cursor, self._page_ids, self.rows_written, pending_replies)
+        self._rows.clear()
+        self._batch_ids.clear()
+
+    def close(self, finished):
+        """Save pending rows whether we finished, stopped or failed."""
+        job = self.job
+        if self.expander:
+            if finished:
+                job.log(f"[INFO] Waiting for {len(self.expander.pending())} reply threads...", "blue")
+                self._add_replies(wait=True)
+                finished = not self.expander.pending()
+            else:
+                self._add_replies()
+            self.expander.shutdown()
+            if self.replies:
+                job.log(f"[INFO] {self.replies} replies fetched.", "blue")
+        self.save_batch()
+        if self.profiles:
+            self.profiles.shutdown()
+        if self._fenced_off():
+            self.sink.abandon()
+            self.index.close()
+            job.comments = self.rows_written
+            job.finished = False
+            return self.rows_written
+        self.sink.close()
+        self.index.close()
+        if self.duplicates:
+            job.log(f"[INFO] Skipped {self.duplicates} comments that were already saved.", "blue")
+        if finished:
+            self.state.clear()
+        else:
+            job.log("[INFO] Progress saved. Run again to resume from this point.", "blue")
+        if self.rows_written:
+            job.log(f"[SUCCESS] {self.rows_written} comments saved to '{self.file_path}'.", "green")
+        else:
+            job.log("[WARNING] No comments to save.", "orange")
+        job.comments = self.rows_written
+        job.finished = finished
+        return self.rows_written
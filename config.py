@@ -7,8 +7,85 @@ session_data = {
 }
 
 
+# Optional credentials CSV/JSON with one session per row. When set, requests
+# are rotated across all of them and a rate-limited session cools down for
+# session_cooldown seconds while the others keep working.
+sessions_file = None
+session_cooldown = 300
+
 post_url = "https://www.instagram.com/reel/DDCQ0fHv3WP/?igsh=dnBkd21hY3d6dTUx"
 # post_url = "https://www.instagram.com/reel/DFFIDFqPfcW/?igsh=em5mdDdubnRrd3Bq"
 shortcode = "DDCQ0fHv3WP"
 
+# One of sinks.FORMATS: xlsx, csv, jsonl, sqlite
+output_format = "xlsx"
+
+# Also fetch reply threads (adds Parent ID and Depth columns)
+expand_replies = False
+reply_workers = 4
+
+# Only fetch comments newer than the ones already saved for a post
+incremental = False
+
+# Add Mentions, Mention Count, Hashtags, Emoji Count and Text Hash columns
+enrich_text = False
+
+# Add Is Private, Follower Count, Following Count and Follows Host columns.
+# Profiles are looked up once per commenter and cached for profile_cache_ttl
+# seconds; the host's follower list is read up to profile_max_follower_pages
+# pages of 200.
+enrich_profiles = False
+profile_workers = 4
+profile_cache_path = None  # defaults to data/profile_cache.db
+profile_cache_ttl = 7 * 24 * 3600
+profile_cache_negative_ttl = 3600  # users whose lookup failed
+profile_cache_max_entries = 500_000
+profile_max_follower_pages = 500
+
+# Also load every saved batch into the indexed store of analytics.py
+analytics = False
+analytics_path = None  # defaults to data/analytics.db
+
+# Response cache (see http_cache.py): "off", "cache", "record" or "replay"
+http_cache_mode = "off"
+http_cache_path = None  # defaults to data/http_cache.db
+http_cache_ttl = 24 * 3600
+http_cache_max_mb = 200
+
+# Batch mode: posts scraped at once and request budget shared by all of them
+concurrency = 2
+requests_per_minute = 60
+
+# Each query type starts at requests_per_minute and adapts between these
+# bounds: faster while requests succeed, halved (plus a backoff pause) on 429.
+min_requests_per_minute = 2
+max_requests_per_minute = 180
+# First pause after a 429, in seconds; doubles with every consecutive 429
+rate_limit_backoff = 30
+post_urls = []
+
+# Scrape service (service.py): HTTP job API address and jobs run at once
+service_host = "127.0.0.1"
+service_port = 8700
+service_workers = 2
+
+# Cluster mode (cluster.py): shared queue file, posts per node, lease length and
+# how often a post is retried on another lease before it is given up
+cluster_queue = None  # defaults to data/cluster.db
+cluster_slots = 2
+cluster_lease_seconds = 60
+cluster_max_attempts = 3
+
+# Comment pages fetched ahead of the writer before the fetcher waits for it
+pipeline_depth = 4
+
+# Metrics (see metrics.py): Prometheus text on http://metrics_host:metrics_port/metrics
+# and/or a JSON snapshot rewritten every metrics_interval seconds
+metrics_port = None
+metrics_host = "127.0.0.1"
+metrics_file = None
+metrics_interval = 5
+
 log_text = ""
+# Set by the GUI to a results_view.ResultsFeed; writers hand it every saved batch
+results_feed = None
@@ -0,0 +1,448 @@
+"""Convert and merge scraped output files on a process pool.
+
+    python export.py data/*.xlsx --to csv --out exports
+    python export.py data/*.xlsx data/*.csv --to parquet --merge campaign.parquet
+    python export.py data/*.xlsx --to xlsx --merge campaign.xlsx --workers 4
+
+Without `--merge` every input is converted to its own file in `--out`, one
+file per worker process. With `--merge`, workers convert the inputs into
+part files and the parent appends the parts in input order. A merged
+workbook gets one sheet per post; other formats get a leading `Shortcode`
+column. Rows are streamed from input to output in chunks of `CHUNK_ROWS`,
+so memory stays flat however many rows there are. Sheets that would pass
+Excel's row limit continue on a new sheet.
+
+Inputs may be any format in `sinks.FORMATS`; Parquet output needs pyarrow.
+"""
+import argparse
+import contextlib
+import csv
+import glob
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import sinks
+from comment_record import COLUMN_TYPES
+
+FORMATS = ("xlsx", "csv", "jsonl", "parquet", "sqlite")
+
+# Rows per sheet, header included
+MAX_SHEET_ROWS = 1_048_576
+CHUNK_ROWS = 50_000
+
+BOOL_COLUMNS = ("Is Mentionable", "Is Verified", "Is Private", "Follows Host")
+INT_COLUMNS = tuple(column for column, sql_type in COLUMN_TYPES.items()
+                    if sql_type == "INTEGER" and column not in BOOL_COLUMNS)
+
+
+def _to_bool(value):
+    if value is None or value == "" or isinstance(value, bool):
+        return None if value == "" else value
+    return str(value).lower() in ("true", "1")
+
+
+def _to_int(value):
+    if value is None or value == "" or isinstance(value, int):
+        return None if value == "" else value
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+def _to_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    # Ids read back from xlsx or sqlite may come out as numbers
+    return str(value)
+
+
+def converters(columns):
+    """One function per column restoring the type a CSV or workbook round trip lost."""
+    return [_to_bool if column in BOOL_COLUMNS else _to_int if column in INT_COLUMNS else _to_text
+            for column in columns]
+
+
+def input_format(path):
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension not in sinks.FORMATS:
+        raise ValueError(f"Cannot read '{path}': not one of {', '.join(sinks.FORMATS)}")
+    return extension
+
+
+@contextlib.contextmanager
+def open_rows(path):
+    """Yield `(columns, rows)` for a scraped output file; rows are read lazily."""
+    input_type = input_format(path)
+    if input_type == "csv":
+        with open(path, "r", newline="", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            yield next(reader, []), reader
+    elif input_type == "jsonl":
+        with open(path, "r", encoding="utf-8") as file:
+            first = file.readline()
+            columns = list(json.loads(first)) if first.strip() else []
+
+            def rows():
+                for line in itertools.chain([first], file):
+                    if line.strip():
+                        record = json.loads(line)
+                        yield [record.get(column) for column in columns]
+            yield columns, rows()
+    elif input_type == "sqlite":
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            cursor = conn.execute(f"SELECT * FROM {sinks.SqliteSink.table}")
+            yield [description[0] for description in cursor.description], cursor
+        finally:
+            conn.close()
+    else:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True)
+        try:
+            sheets = workbook.worksheets
+            columns = list(next(sheets[0].iter_rows(max_row=1, values_only=True), ())) if sheets else []
+
+            def rows():
+                # Workbooks split by this module continue on later sheets
+                for sheet in sheets:
+                    sheet_rows = sheet.iter_rows(values_only=True)
+                    next(sheet_rows, None)
+                    yield from sheet_rows
+            yield columns, rows()
+        finally:
+            workbook.close()
+
+
+def read_columns(path):
+    with open_rows(path) as (columns, _):
+        return [column for column in columns if column is not None]
+
+
+class XlsxExport:
+    """Write-only workbook whose sheets continue on a new sheet at Excel's row limit."""
+
+    def __init__(self, path, columns, max_rows=None):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.columns = list(columns)
+        self.max_rows = max_rows or MAX_SHEET_ROWS
+        self.rows_written = 0
+        self._workbook = Workbook(write_only=True)
+        self._titles = set()
+        self._sheet = None
+        self._title = None
+        self._part = 0
+        self._sheet_rows = 0
+
+    def _unique_title(self, title):
+        # Sheet titles are at most 31 characters and must be unique
+        candidate, number = title[:31], 1
+        while candidate.lower() in self._titles:
+            number += 1
+            suffix = f" ({number})"
+            candidate = title[:31 - len(suffix)] + suffix
+        self._titles.add(candidate.lower())
+        return candidate
+
+    def add_sheet(self, title="Comments", columns=None):
+        """Start a new sheet; the following rows go there."""
+        self.columns = list(columns or self.columns)
+        self._title = title
+        self._part = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self._part += 1
+        title = self._title if self._part == 1 else f"{self._title} ({self._part})"
+        self._sheet = self._workbook.create_sheet(self._unique_title(title))
+        self._sheet.append(self.columns)
+        self._sheet_rows = 1
+
+    def write_rows(self, rows):
+        if self._sheet is None:
+            self.add_sheet()
+        count = 0
+        for row in rows:
+            if self._sheet_rows >= self.max_rows:
+                self._new_sheet()
+            self._sheet.append(list(row))
+            self._sheet_rows += 1
+            count += 1
+        self.rows_written += count
+        return count
+
+    def close(self):
+        if self._sheet is None:
+            self.add_sheet()
+        self._workbook.save(self.path)
+
+
+class ParquetExport:
+    """Parquet file written one row group per `CHUNK_ROWS` rows."""
+
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+        self.pa = pyarrow
+        self.path = path
+        self.columns = list(columns)
+        self.schema = pyarrow.schema([
+            (column, pyarrow.bool_() if column in BOOL_COLUMNS
+             else pyarrow.int64() if column in INT_COLUMNS else pyarrow.string())
+            for column in self.columns])
+        self.rows_written = 0
+        self._rows = []
+        self._writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write_rows(self, rows):
+        count = 0
+        for row in rows:
+            self._rows.append(row)
+            count += 1
+            if len(self._rows) >= CHUNK_ROWS:
+                self._flush()
+        self.rows_written += count
+        return count
+
+    def write_table(self, table):
+        """Append an Arrow table with the same schema, e.g. a part written by a worker."""
+        self._flush()
+        self._writer.write_table(table)
+        self.rows_written += table.num_rows
+
+    def _flush(self):
+        if self._rows:
+            arrays = [self.pa.array(values, type=field.type) for values, field in zip(zip(*self._rows), self.schema)]
+            self._writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+class JsonRowsPart:
+    """One JSON array per line: a typed intermediate for merges into xlsx or SQLite."""
+
+    def __init__(self, path, columns):
+        self._file = open(path, "w", encoding="utf-8")
+        self.rows_written = 0
+
+    def write_rows(self, rows):
+        self._file.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        self.rows_written += len(rows)
+
+    def close(self):
+        self._file.close()
+
+
+def open_writer(path, output_format, columns):
+    if output_format == "xlsx":
+        return XlsxExport(path, columns)
+    if output_format == "parquet":
+        return ParquetExport(path, columns)
+    if output_format == "jsonrows":
+        return JsonRowsPart(path, columns)
+    return sinks.open_sink(path, output_format, columns=columns)
+
+
+def shortcode_of(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _chunks(rows, size=CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def convert(path, output, output_format, columns=None, shortcode=None):
+    """Stream the rows of `path` into a new `output` file. Returns the row count.
+
+    `columns` reorders the input columns (missing ones are left empty), and
+    `shortcode` adds it as a leading `Shortcode` column.
+    """
+    with open_rows(path) as (input_columns, rows):
+        input_columns = [column for column in input_columns if column is not None]
+        columns = list(columns or input_columns)
+        positions = [input_columns.index(column) if column in input_columns else None for column in columns]
+        convert_values = converters(columns)
+        out_columns = (["Shortcode"] if shortcode else []) + columns
+        prefix = [shortcode] if shortcode else []
+
+        writer = open_writer(output, output_format, out_columns)
+        try:
+            for chunk in _chunks(rows):
+                writer.write_rows([
+                    prefix + [to_type(row[position] if position is not None and position < len(row) else None)
+                              for position, to_type in zip(positions, convert_values)]
+                    for row in chunk])
+        finally:
+            writer.close()
+        return writer.rows_written
+
+
+# Format of the part files behind a merge. CSV, JSONL and Parquet parts are
+# copied into the output as they are; xlsx and SQLite are filled from typed
+# JSON rows
+PART_FORMATS = {"csv": "csv", "jsonl": "jsonl", "parquet": "parquet", "xlsx": "jsonrows", "sqlite": "jsonrows"}
+
+
+def _append_part(target, part_path, part_format, shortcode):
+    """Append one part to the merged output; `target` is a file or writer."""
+    if part_format == "csv":
+        with open(part_path, "rb") as part:
+            part.readline()
+            shutil.copyfileobj(part, target, 1024 * 1024)
+    elif part_format == "jsonl":
+        with open(part_path, "rb") as part:
+            shutil.copyfileobj(part, target, 1024 * 1024)
+    elif part_format == "parquet":
+        import pyarrow.parquet
+
+        for batch in pyarrow.parquet.ParquetFile(part_path).iter_batches(CHUNK_ROWS):
+            target.write_table(target.pa.Table.from_batches([batch], target.schema))
+    else:
+        if isinstance(target, XlsxExport):
+            target.add_sheet(shortcode, target.columns)
+        with open(part_path, "r", encoding="utf-8") as part:
+            for chunk in _chunks(part):
+                rows = [json.loads(line) for line in chunk]
+                if isinstance(target, XlsxExport):
+                    # One sheet per post, so the shortcode column is dropped
+                    rows = [row[1:] for row in rows]
+                target.write_rows(rows)
+
+
+def merged_columns(paths):
+    """Union of the input columns, in the order they first appear."""
+    columns = []
+    for path in paths:
+        for column in read_columns(path):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def export_files(paths, output_format, out_dir, workers=None):
+    """Convert every input to its own file in `out_dir`. Returns `{input: (output, rows)}`."""
+    os.makedirs(out_dir, exist_ok=True)
+    outputs = [os.path.join(out_dir, f"{shortcode_of(path)}.{output_format}") for path in paths]
+    for path, output in zip(paths, outputs):
+        if os.path.abspath(path) == os.path.abspath(output):
+            raise ValueError(f"'{path}' would be overwritten by its own export")
+    with ProcessPoolExecutor(workers) as pool:
+        counts = pool.map(convert, paths, outputs, [output_format] * len(paths))
+        return {path: (output, rows) for path, output, rows in zip(paths, outputs, counts)}
+
+
+def merge_files(paths, output_format, output, workers=None):
+    """Merge every input into one `output` file. Returns the number of rows."""
+    columns = merged_columns(paths)
+    part_format = PART_FORMATS[output_format]
+    shortcodes = [shortcode_of(path) for path in paths]
+
+    with tempfile.TemporaryDirectory(prefix="export-", dir=os.path.dirname(os.path.abspath(output))) as parts_dir:
+        part_paths = [os.path.join(parts_dir, f"{number}.{part_format}") for number in range(len(paths))]
+        with ProcessPoolExecutor(workers) as pool:
+            # Parts are appended in input order as soon as each one is ready
+            parts = pool.map(convert, paths, part_paths, [part_format] * len(paths),
+                             [columns] * len(paths), shortcodes)
+            out_columns = ["Shortcode"] + columns
+            if part_format in ("csv", "jsonl"):
+                with open(output, "w", newline="", encoding="utf-8") as target:
+                    if part_format == "csv":
+                        csv.writer(target).writerow(out_columns)
+                with open(output, "ab") as target:
+                    total = 0
+                    for part_path, shortcode, rows in zip(part_paths, shortcodes, parts):
+                        _append_part(target, part_path, part_format, shortcode)
+                        os.remove(part_path)
+                        total += rows
+                return total
+
+            target = XlsxExport(output, columns) if output_format == "xlsx" else open_writer(
+                output, output_format, out_columns)
+            try:
+                for part_path, shortcode, rows in zip(part_paths, shortcodes, parts):
+                    _append_part(target, part_path, part_format, shortcode)
+                    os.remove(part_path)
+            finally:
+                target.close()
+            return target.rows_written
+
+
+def expand_inputs(patterns):
+    """Expand glob patterns (Windows shells leave them to us), skipping scraper side files."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path.endswith(".journal.csv") or path in paths:
+                continue
+            if os.path.splitext(path)[1].lstrip(".").lower() in sinks.FORMATS:
+                paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="instagram-comment-export", description="Convert or merge scraped comment files.")
+    parser.add_argument("inputs", nargs="+", help="Scraped files or glob patterns, e.g. data/*.xlsx")
+    parser.add_argument("--to", dest="output_format", choices=FORMATS, required=True, help="Output format")
+    parser.add_argument("--out", default="exports", help="Folder for converted files (default: %(default)s)")
+    parser.add_argument("--merge", metavar="FILE", help="Merge every input into this one file instead")
+    parser.add_argument("-w", "--workers", type=int, help="Worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    paths = expand_inputs(args.inputs)
+    if args.merge:
+        # A merge written into the data folder must not be read back on the next run
+        paths = [path for path in paths if os.path.abspath(path) != os.path.abspath(args.merge)]
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"no such file: {', '.join(missing)}")
+    if not paths:
+        parser.error("no input files")
+
+    started = time.perf_counter()
+    try:
+        if args.merge:
+            rows = merge_files(paths, args.output_format, args.merge, args.workers)
+            print(f"{rows} rows from {len(paths)} files merged into {args.merge}", file=sys.stderr)
+        else:
+            results = export_files(paths, args.output_format, args.out, args.workers)
+            for output, count in results.values():
+                print(f"{count}\t{output}")
+            rows = sum(count for _, count in results.values())
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"{rows} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    # Needed for process pools in a PyInstaller build
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""On-disk cache of Instagram JSON responses, with record and replay modes.
+
+`install()` wraps `get_json` of an instaloader context, which every GraphQL
+and iPhone request goes through, so responses are stored in one SQLite file
+keyed by a hash of the request. Modes:
+
+    cache   serve post/profile metadata younger than `ttl`; everything else is live
+    record  fetch everything live and store every response
+    replay  answer only from the file and raise CacheMiss for anything else
+
+A file recorded once can be replayed to run the whole synchronous pipeline
+offline, e.g. for benchmarks and regression checks. The file is kept under
+`max_bytes` by evicting the least recently used responses.
+"""
+import gzip
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+import custom_utils
+
+MODES = ("off", "cache", "record", "replay")
+
+METADATA_PATHS = re.compile(r"^/?api/v1/(media/\d+/info|users/web_profile_info)/")
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+def default_path():
+    return custom_utils.get_data_folder("http_cache.db")
+
+
+def request_key(host, path, params):
+    """Content address of a request: the hash of its host, path and parameters."""
+    payload = json.dumps([host, path.strip("/"), params or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_metadata(path, params):
+    """Whether a request looks up a post or profile rather than paginating."""
+    if METADATA_PATHS.match(path):
+        return True
+    variables = str((params or {}).get("variables", ""))
+    return path.strip("/") == "graphql/query" and ('"shortcode"' in variables or '"username"' in variables)
+
+
+class ResponseCache:
+    def __init__(self, path=None, mode="cache", ttl=24 * 3600, max_bytes=200 * 1024 * 1024):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode '{mode}'. Choose from: {', '.join(MODES)}")
+        self.path = path or default_path()
+        self.mode = mode
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, url TEXT, body BLOB, "
+            "size INTEGER, created REAL, accessed REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key, max_age=None):
+        """The stored response for `key`, or None if there is none younger than `max_age`."""
+        with self._lock:
+            row = self._conn.execute("SELECT body, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (max_age is not None and time.time() - row[1] > max_age):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(gzip.decompress(row[0]))
+
+    def put(self, key, url, data):
+        body = gzip.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), compresslevel=6)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, body, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (key, url, body, len(body), now, now))
+            self._size += len(body) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used responses until the file is at 90% of its budget."""
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if self._size <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._size -= size
+
+    def fetch(self, request, host, path, params):
+        """Answer a request from the cache or by calling `request()`, as the mode says."""
+        key = request_key(host, path, params)
+        if self.mode == "replay":
+            data = self.get(key)
+            if data is None:
+                raise CacheMiss(f"No recorded response for {host}/{path.strip('/')}")
+            return data
+
+        store = self.mode == "record" or is_metadata(path, params)
+        if self.mode == "cache" and store:
+            data = self.get(key, self.ttl)
+            if data is not None:
+                return data
+
+        data = request()
+        if store:
+            self.put(key, f"{host}/{path.strip('/')}", data)
+        return data
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._size}
+
+    def close(self):
+        self._conn.close()
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def from_config():
+    """The cache configured in `config`, shared by every session, or None when it is off."""
+    import config
+
+    mode = getattr(config, "http_cache_mode", "off")
+    if mode == "off":
+        return None
+    path = getattr(config, "http_cache_path", None) or default_path()
+    with _shared_lock:
+        cache = _shared.get((path, mode))
+        if cache is None:
+            cache = _shared[(path, mode)] = ResponseCache(
+                path, mode, ttl=getattr(config, "http_cache_ttl", 24 * 3600),
+                max_bytes=getattr(config, "http_cache_max_mb", 200) * 1024 * 1024)
+        return cache
+
+
+def install(context, cache):
+    """Route every `get_json` call of an instaloader `context` through `cache`."""
+    get_json = context.get_json
+
+    def cached_get_json(path, params, host="www.instagram.com", session=None, **kwargs):
+        # Retries re-enter through here; only the first attempt consults the cache
+        if kwargs.get("_attempt", 1) > 1:
+            return get_json(path, params, host, session, **kwargs)
+        return cache.fetch(lambda: get_json(path, params, host, session, **kwargs), host, path, params)
+
+    context.get_json = cached_get_json
+    context.response_cache = cache
+    return context
@@ -0,0 +1,60 @@
+"""Thin pagination layer over Instagram's iPhone comments endpoint.
+
+This mirrors what `instaloader.Post._get_comments_via_iphone_endpoint()` does,
+but exposes the `min_id` cursor of every page so a scrape can be checkpointed
+and resumed from the page it stopped on.
+"""
+import metrics
+
+COMMENTS_PATH = "api/v1/media/{media_id}/comments/"
+
+
+SHORTCODE_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+def shortcode_to_mediaid(shortcode):
+    """Decode a post shortcode into its numeric media id, without a request."""
+    media_id = 0
+    for char in shortcode[:11]:
+        media_id = media_id * 64 + SHORTCODE_ALPHABET.index(char)
+    return media_id
+
+
+def comment_page_params(min_id=None):
+    """Query parameters for a page of top-level comments."""
+    params = {"can_support_threading": "true", "permalink_enabled": "false"}
+    if min_id is not None:
+        params["min_id"] = min_id
+    return params
+
+
+def fetch_comment_page(context, media_id, min_id=None):
+    """Fetch a single page of top-level comments."""
+    return context.get_iphone_json(COMMENTS_PATH.format(media_id=media_id), comment_page_params(min_id))
+
+
+def iter_comment_pages(context, media_id, min_id=None, budget=None, stop_event=None):
+    """Yield `(cursor, comment_nodes)` for every page starting at `min_id`.
+
+    `cursor` is the `min_id` the page was requested with (None for the first
+    page), i.e. the value to pass back in to fetch that same page again.
+    When a shared `budget` is given every page request takes a token from it
+    first; pagination ends quietly once `stop_event` is set.
+    """
+    cursor = min_id
+    while True:
+        if budget is not None and not budget.acquire(stop_event):
+            return
+        if stop_event is not None and stop_event.is_set():
+            return
+        with metrics.PAGE_FETCH_SECONDS.time():
+            page = fetch_comment_page(context, media_id, cursor)
+        yield cursor, page.get("comments", [])
+        next_min_id = page.get("next_min_id")
+        if not next_min_id:
+            return
+        cursor = next_min_id
+
+
+def comment_id(node):
+    return str(node.get("pk") or node.get("id"))
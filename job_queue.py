@@ -0,0 +1,120 @@
+"""Persistent queue of scrape jobs, kept in SQLite so it survives restarts.
+
+A job is a list of post URLs plus its options. `claim()` moves the oldest
+queued job to running, and `finish()` gives it a final status. When a worker
+dies with the process, its job is left running. `requeue_running()` puts
+those jobs back at the head of the queue, and their posts resume from the
+checkpoints of the interrupted run.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+PARTIAL = "partial"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINAL_STATUSES = (DONE, PARTIAL, FAILED, CANCELLED)
+
+
+class JobQueue:
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, urls TEXT NOT NULL, options TEXT NOT NULL, "
+            "status TEXT NOT NULL, posts TEXT NOT NULL DEFAULT '[]', error TEXT, runs INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _decode(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for key in ("urls", "options", "posts"):
+            job[key] = json.loads(job[key])
+        return job
+
+    def submit(self, urls, options=None):
+        """Queue a job and return its id."""
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO jobs (urls, options, status, created_at) VALUES (?, ?, ?, ?)",
+                (json.dumps(list(urls)), json.dumps(options or {}), QUEUED, time.time())).lastrowid
+
+    def get(self, job_id):
+        with self._lock:
+            return self._decode(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list(self, status=None, limit=100):
+        """Jobs, newest first, optionally only those with `status`."""
+        query, params = "SELECT * FROM jobs", ()
+        if status:
+            query, params = query + " WHERE status = ?", (status,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id DESC LIMIT ?", params + (limit,)).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def counts(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def claim(self):
+        """Mark the oldest queued job as running and return it, or None if the queue is empty."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, runs = runs + 1 WHERE id = ?",
+                        (RUNNING, time.time(), row["id"]))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return self.get(row["id"]) if row is not None else None
+
+    def update_posts(self, job_id, posts):
+        """Store the progress of each post of a job."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET posts = ? WHERE id = ?", (json.dumps(posts), job_id))
+
+    def finish(self, job_id, status, error=None, posts=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, posts = COALESCE(?, posts) WHERE id = ?",
+                (status, error, time.time(), json.dumps(posts) if posts is not None else None, job_id))
+
+    def requeue(self, job_id):
+        """Put a running job back in the queue; it keeps its place."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ? WHERE id = ? AND status = ?", (QUEUED, job_id, RUNNING))
+
+    def requeue_running(self):
+        """Queue again every job left running by a previous process. Returns how many."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ? WHERE status = ?", (QUEUED, RUNNING)).rowcount
+
+    def cancel_queued(self, job_id):
+        """Cancel the job if it has not started yet. Returns True if it was queued."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)).rowcount == 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
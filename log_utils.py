@@ -1,14 +1,121 @@
+import queue
 import sys
+from datetime import datetime
+
+COLOR_MAP = {
+    "red": "#dc2626",
+    "green": "#16a34a",
+    "blue": "#2563eb",
+    "orange": "#ea580c",
+    "yellow": "#ca8a04",
+    "black": "#1f2937",
+}
+
+# Where console output goes; None keeps errors on stderr and the rest on stdout
+console_stream = None
+# Colors echoed to the console; None echoes everything
+console_colors = None
+
 
 def log_message(message, log_text_widget=None, color="black"):
-    """Logs messages to the console and optionally to a Tkinter Text widget."""
-    
-    formatted_message = f"[{color.upper()}] {message}"
-    print(formatted_message, file=sys.stderr if color == "red" else sys.stdout)
+    """Logs messages to the console and optionally to the GUI log.
+
+    `log_text_widget` is normally a `LogBus`, which is safe to use from any
+    thread. A plain Tkinter Text widget is still accepted but must only be
+    written from the Tk main thread.
+    """
+
+    if console_colors is None or color in console_colors:
+        formatted_message = f"[{color.upper()}] {message}"
+        stream = console_stream or (sys.stderr if color == "red" else sys.stdout)
+        print(formatted_message, file=stream)
 
-    if log_text_widget:
+    if isinstance(log_text_widget, LogBus):
+        log_text_widget.put(message, color)
+    elif log_text_widget:
         log_text_widget.config(state="normal")
+        if color not in log_text_widget.tag_names():
+            log_text_widget.tag_configure(color, foreground=COLOR_MAP.get(color, color))
         log_text_widget.insert("end", f"{message}\n", color)
-        log_text_widget.tag_configure(color, foreground=color)
         log_text_widget.yview("end")
         log_text_widget.config(state="disabled")
+
+
+class LogBus:
+    """Queue between worker threads and a Tk Text widget.
+
+    Any thread may `put()` log records or `call()` UI updates; the Tk main
+    loop drains them in batches on an `after()` timer. Color tags are created
+    once, and the widget keeps at most `max_lines` lines.
+    """
+
+    def __init__(self, widget, max_lines=5000, interval_ms=100, max_batch=1000):
+        self.widget = widget
+        self.max_lines = max_lines
+        self.interval_ms = interval_ms
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._tags = set()
+        self._lines = int(widget.index("end-1c").split(".")[0])
+        for color in COLOR_MAP:
+            self._tag(color)
+
+    def _tag(self, color):
+        tag_name = f"color_{color}"
+        if tag_name not in self._tags:
+            self.widget.tag_config(tag_name, foreground=COLOR_MAP.get(color, color))
+            self._tags.add(tag_name)
+        return tag_name
+
+    def put(self, message, color="black"):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self._queue.put((f"[{timestamp}] {message}\n", color))
+
+    def call(self, callback, *args, **kwargs):
+        """Run `callback` on the Tk main thread at the next drain."""
+        self._queue.put((callback, (args, kwargs)))
+
+    def start(self):
+        self.widget.after(self.interval_ms, self._drain)
+
+    def _drain(self):
+        records = []
+        try:
+            while len(records) < self.max_batch:
+                records.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if records:
+            self._apply(records)
+        self.widget.after(self.interval_ms, self._drain)
+
+    def _apply(self, records):
+        lines = []
+        for item, extra in records:
+            if callable(item):
+                self._write(lines)
+                lines = []
+                args, kwargs = extra
+                item(*args, **kwargs)
+            else:
+                lines.append((item, extra))
+        self._write(lines)
+
+    def _write(self, lines):
+        if not lines:
+            return
+        widget = self.widget
+        widget.config(state="normal")
+        # Text.insert accepts alternating text/tag arguments, one call per batch
+        chunks = []
+        for text, color in lines:
+            chunks.extend((text, self._tag(color)))
+        widget.insert("end", *chunks)
+        self._lines += len(lines)
+        excess = self._lines - self.max_lines
+        if excess > 0:
+            widget.delete("1.0", f"{excess + 1}.0")
+            self._lines -= excess
+        widget.see("end")
+        widget.config(state="disabled")
@@ -1,75 +1,33 @@
-import instaloader
-import pandas as pd
-import custom_utils
 import config
 import log_utils
-from datetime import datetime, timedelta
-import os
-
-
-def login_with_session(session_data):
-    """Logs in using a session dictionary."""
-
-    class MyRateController(instaloader.RateController):
-        def __init__(self, context):
-            super().__init__(context)
-            self.rate_limited = False
-
-        def query_waittime(self, query_type: str, current_time: float, untracked_queries: bool = False) -> float:
-            """
-            Custom wait time calculation that ensures no query waits more than 1 minute (60 seconds).
-            """
-            base_wait_time = super().query_waittime(
-                query_type, current_time, untracked_queries)
-            return min(base_wait_time, 0)
-
-        def sleep(self, secs):
-            # ADDED: Check for stop during sleep
-            stop_event = getattr(config, 'stop_event', None)
-
-            if secs > 0:
-                wait_msg = f"Too many queries. Waiting {round(secs)} seconds, until {(datetime.now() + timedelta(seconds=secs)).strftime('%H:%M:%S')}."
-                log_utils.log_message(
-                    f"[RATE LIMIT] {wait_msg}", config.log_text, "yellow")
-
-            # MODIFIED: Sleep in small increments and check stop event
-            remaining = min(secs, 0)
-            while remaining > 0:
-                if stop_event and stop_event.is_set():
-                    log_utils.log_message(
-                        "[INFO] Stop requested during rate limit wait", config.log_text, "orange")
-                    return
-                sleep_time = min(0.5, remaining)  # Sleep 0.5 seconds at a time
-                super().sleep(sleep_time)
-                remaining -= sleep_time
-
-        def handle_429(self, query_type: str) -> None:
-            """
-            Handle Instagram's 429 Too Many Requests error by enforcing a one-time wait,
-            then resetting rate limits so it can continue normally.
-            """
-            stop_event = getattr(config, 'stop_event', None)
-
-            # Check if stop was requested
-            if stop_event and stop_event.is_set():
-                return
-
-            if not self.rate_limited:
-                wait_time = 60
-                log_utils.log_message(
-                    f"[RATE LIMIT] 429 Too Many Requests. Waiting {wait_time} seconds to reset...", config.log_text, "yellow")
-                self.sleep(wait_time)
-                self.rate_limited = True
-
-            self._query_timestamps.clear()
-            self._earliest_next_request_time = 0.0
-            self._iphone_earliest_next_request_time = 0.0
-            log_utils.log_message(
-                "[RATE LIMIT] Resuming normal query speed.", config.log_text, "yellow")
-            self.rate_limited = False
+import metrics
+import session_pool
+import iphone_api
+import profiles
+from comment_writer import CommentWriter
+from pipeline import PagePipeline
+from replies import ReplyExpander
+from scrape_job import ScrapeJob
+
+
+def login_with_session(session_data, on_429=None):
+    """Logs in using a session dictionary.
+
+    Requests are paced by an `AdaptiveRateController`. `on_429(query_type)` is
+    called before its 429 backoff; it may raise to abort the request instead
+    of retrying on this session. With `config.http_cache_mode` set, responses
+    go through the shared `http_cache.ResponseCache`.
+    """
+    # Deferred so the GUI and CLI start without loading instaloader/requests
+    import http_cache
+    import instaloader
+    from rate_controller import AdaptiveRateController
 
     L = instaloader.Instaloader(
-        rate_controller=lambda ctx: MyRateController(ctx))
+        rate_controller=lambda ctx: AdaptiveRateController(ctx, on_429=on_429))
+    cache = http_cache.from_config()
+    if cache:
+        http_cache.install(L.context, cache)
 
     try:
         log_utils.log_message(
@@ -84,109 +42,118 @@ def login_with_session(session_data):
         return None
 
 
-def get_post(L, shortcode):
-    """Fetch post details using its shortcode."""
-    # ADDED: Check for stop event
-    stop_event = getattr(config, 'stop_event', None)
-    if stop_event and stop_event.is_set():
-        return None
+def connect():
+    """Log in with every session in `config.sessions_file`, or else `config.session_data`.
+
+    With a sessions file the returned loader rotates requests across the
+    healthy sessions of a `session_pool.SessionPool`.
+    """
+    sessions_file = getattr(config, "sessions_file", None)
+    if not sessions_file:
+        return login_with_session(config.session_data)
 
+    log_utils.log_message(
+        f"[INFO] Logging in every session from {sessions_file}...", config.log_text, "blue")
     try:
-        log_utils.log_message(
-            f"[INFO] Fetching post details for shortcode: {shortcode}", config.log_text, "blue")
-        post = instaloader.Post.from_shortcode(L.context, shortcode)
-        log_utils.log_message(
-            "[SUCCESS] Post fetched successfully.", config.log_text, "green")
-        return post
+        pool = session_pool.SessionPool.from_file(sessions_file)
     except Exception as e:
         log_utils.log_message(
-            f"[ERROR] Failed to fetch post: {e}", config.log_text, "red")
+            f"[ERROR] Could not load sessions: {e}", config.log_text, "red")
         return None
+    return pool.loader() if pool.healthy_count() else None
 
 
-def fetch_comments(post):
-    """Extract comments, usernames, and mentionable status from a post with pagination logging."""
-    comments_data = []
-    count = 0
+def report_rate(L):
+    """Log the achieved request rate of every session behind `L`."""
+    pool = getattr(L, "pool", None)
+    loaders = [session.loader for session in pool.sessions if session.loader] if pool else [L]
+    for loader in loaders:
+        controller = getattr(loader.context, "_rate_controller", None)
+        if hasattr(controller, "report"):
+            controller.report()
 
-    # ADDED: Get stop event from config
-    stop_event = getattr(config, 'stop_event', None)
+
+def get_post(job):
+    """Fetch post details using the shortcode of `job`."""
+    # ADDED: Check for stop event
+    if not job.wait_for_request():
+        return None
+
+    import instaloader
 
     try:
-        log_utils.log_message(
-            "[INFO] Fetching comments...", config.log_text, "blue")
+        job.log(
+            f"[INFO] Fetching post details for shortcode: {job.shortcode}", "blue")
+        post = instaloader.Post.from_shortcode(job.loader.context, job.shortcode)
+        job.log("[SUCCESS] Post fetched successfully.", "green")
+        return post
+    except Exception as e:
+        job.log(f"[ERROR] Failed to fetch post: {e}", "red")
+        return None
 
-        file_path = custom_utils.get_data_folder(f"{config.shortcode}.xlsx")
 
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            log_utils.log_message(
-                f"Deleted Previous File: {file_path}", config.log_text, "blue")
+def fetch_comments(job, post):
+    """Extract comments, usernames, and mentionable status from a post with pagination logging.
+
+    Progress is checkpointed with every saved batch, so a run that was stopped,
+    crashed or rate limited resumes from the page it reached instead of
+    starting over. Pages are fetched on their own thread while the writer
+    saves the previous ones (see `pipeline.PagePipeline`). With
+    `job.expand_replies` the reply threads are fetched in parallel and
+    written as extra rows. With `job.enrich_profiles` the commenters'
+    profiles are resolved on a transform stage (see `profiles`). Sets
+    `job.comments` to the number of comments in the output file and
+    `job.finished` once every page was fetched.
+    """
+    job.log("[INFO] Fetching comments...", "blue")
+
+    expander = None
+    if job.expand_replies:
+        expander = ReplyExpander(post._context, post.mediaid, job, job.reply_workers)
+    resolver = None
+    if job.enrich_profiles:
+        resolver = profiles.ProfileResolver(
+            post._context, job, profiles.from_config(), host_id=getattr(post, "owner_id", None),
+            workers=getattr(config, "profile_workers", 4),
+            max_follower_pages=getattr(config, "profile_max_follower_pages", 500))
+    writer = CommentWriter(job, expander, resolver)
+    if not writer.open():
+        if expander:
+            expander.shutdown()
+        if resolver:
+            resolver.shutdown()
+        return 0
+
+    finished = False
+    try:
+        pipeline = PagePipeline(job, writer, transform=resolver.prefetch if resolver else None,
+                                depth=getattr(config, "pipeline_depth", 4))
+        pipeline.run(iphone_api.iter_comment_pages(
+            post._context, post.mediaid, writer.cursor, job.budget, pipeline.stop_event))
+
+        if job.stopped():
+            job.log(
+                f"[INFO] Scraping stopped by user. Fetched {writer.count} comments before stopping.", "orange")
         else:
-            log_utils.log_message(
-                f"File does not exist: {file_path}", config.log_text, "blue")
-
-        for comment in post._get_comments_via_iphone_endpoint():
-            # ⚠️ CRITICAL: Check stop event at the start of each iteration
-            if stop_event and stop_event.is_set():
-                log_utils.log_message(
-                    f"[INFO] Scraping stopped by user. Fetched {count} comments before stopping.",
-                    config.log_text,
-                    "orange"
-                )
-                # Save any pending comments before exiting
-                if comments_data:
-                    save_to_excel(comments_data, custom_utils.get_data_folder(
-                        f"{config.shortcode}.xlsx"), append=True, showMessage=False)
-                return  # Exit the function immediately
-
-            username = comment.owner.username
-            comment_text = comment.text
-            is_mentionable = comment._node.get("iphone_struct", {}).get(
-                "user", {}).get("is_mentionable", False)
-
-            # Append data to list
-            comments_data.append([username, comment_text, is_mentionable])
-            count += 1
-
-            # Log every 10 comments
-            if count % 10 == 0:
-                log_utils.log_message(
-                    f"[INFO] Fetched {count} comments so far...", config.log_text, "blue")
-
-            # Append to Excel every 20 comments
-            if count % 20 == 0:
-                # ADDED: Check stop before saving
-                if stop_event and stop_event.is_set():
-                    log_utils.log_message(
-                        "[INFO] Stop requested. Saving data...", config.log_text, "orange")
-                    save_to_excel(comments_data, custom_utils.get_data_folder(
-                        f"{config.shortcode}.xlsx"), append=True, showMessage=False)
-                    return
-
-                save_to_excel(comments_data, custom_utils.get_data_folder(
-                    f"{config.shortcode}.xlsx"), append=True, showMessage=False)
-                comments_data = []  # Clear the list after appending
-
-        # Save remaining comments
-        if comments_data:
-            save_to_excel(comments_data, custom_utils.get_data_folder(
-                f"{config.shortcode}.xlsx"), append=True)
-
-        log_utils.log_message(
-            f"[SUCCESS] Total comments fetched: {count}", config.log_text, "green")
+            finished = True
+            job.log(f"[SUCCESS] Total comments fetched: {writer.count}", "green")
 
     except Exception as e:
-        log_utils.log_message(
-            f"[ERROR] Error fetching comments: {e}", config.log_text, "red")
-        # Save any pending comments even if there's an error
-        if comments_data:
-            save_to_excel(comments_data, custom_utils.get_data_folder(
-                f"{config.shortcode}.xlsx"), append=True, showMessage=False)
+        job.log(f"[ERROR] Error fetching comments: {e}", "red")
+
+    finally:
+        writer.close(finished)
+
+    return writer.rows_written
 
 
 def save_to_excel(comments_data, filename="instagram_comments.xlsx", append=False, showMessage=True):
-    """Save extracted comments to an Excel file with an option to append."""
+    """Save extracted comments to an Excel file with an option to append.
+
+    Needs pandas, which the streaming sinks in `sinks` do not.
+    """
+    import pandas as pd
+
     if comments_data:
         df_new = pd.DataFrame(comments_data, columns=[
                               "Username", "Comment", "Is Mentionable"])
@@ -208,6 +175,22 @@ def save_to_excel(comments_data, filename="instagram_comments.xlsx", append=Fals
             "[WARNING] No comments to save.", config.log_text, "orange")
 
 
+def scrape(job):
+    """Fetch the post of `job` and all of its comments."""
+    with job.activate():
+        post = get_post(job)
+
+        # Check after getting post
+        if job.stopped():
+            return job
+
+        if post:
+            fetch_comments(job, post)
+        else:
+            job.log("[ERROR] Failed to retrieve post.", "red")
+    return job
+
+
 def main():
     # ADDED: Get stop event at the beginning
     stop_event = getattr(config, 'stop_event', None)
@@ -219,24 +202,17 @@ def main():
     if stop_event and stop_event.is_set():
         return
 
-    L = login_with_session(config.session_data)
+    metrics.start_from_config()
+    L = connect()
 
     # Check after login
     if stop_event and stop_event.is_set():
         return
 
     if L and L.context.is_logged_in:
-        post = get_post(L, config.shortcode)
-
-        # Check after getting post
-        if stop_event and stop_event.is_set():
-            return
-
-        if post:
-            fetch_comments(post)
-        else:
-            log_utils.log_message(
-                "[ERROR] Failed to retrieve post.", config.log_text, "red")
+        scrape(ScrapeJob.from_config(L))
+        report_rate(L)
+        metrics.flush()
     else:
         log_utils.log_message(
             "[ERROR] Login required. Exiting.", config.log_text, "red")
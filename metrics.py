@@ -0,0 +1,299 @@
+"""Process-wide counters, gauges and histograms for scrape runs.
+
+The hot paths update the metrics defined at the bottom of this module. They
+can be exported three ways:
+
+    metrics.serve(9108)                  # Prometheus text on /metrics, JSON on /metrics.json
+    metrics.write_snapshot("m.json")     # one JSON snapshot, written atomically
+    metrics.summary()                    # one line for the GUI status area
+
+Every job of a process adds to the same metrics; run one exporter per worker
+process and let Prometheus tell them apart by instance.
+"""
+import bisect
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, window=60):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+        self.window = window
+        self._samples = collections.deque()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        now = time.monotonic()
+        with self._lock:
+            self.value += amount
+            # One sample a second is enough for rate()
+            if not self._samples or now - self._samples[-1][0] >= 1:
+                self._samples.append((now, self.value - amount))
+            while now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+
+    def rate(self):
+        """Average increase per second over the last `window` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if not self._samples:
+                return 0.0
+            started, value = self._samples[0]
+            elapsed = now - started
+            return (self.value - value) / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self):
+        return self.value
+
+    def prometheus(self):
+        return [f"{self.name} {self.value:g}"]
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help, func=None):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def snapshot(self):
+        return self.func() if self.func else self.value
+
+    def prometheus(self):
+        return [f"{self.name} {self.snapshot():g}"]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    @contextlib.contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the `q` quantile, or None without data."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+                seen += count
+                if seen >= rank:
+                    return bound
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+    def prometheus(self):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f'{self.name}_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {self.sum:g}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help, func=None):
+        return self._get(Gauge, name, help, func)
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, buckets)
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in list(self.metrics.items())}
+
+    def prometheus(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.prometheus())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def write_snapshot(path, registry=REGISTRY):
+    """Atomically write the current metrics to `path` as JSON."""
+    data = {"time": time.time(), "pid": os.getpid(), "metrics": registry.snapshot()}
+    # The periodic writer and flush() may write at the same time
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=1)
+    os.replace(tmp_path, path)
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve /metrics (Prometheus text) and /metrics.json on a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body = json.dumps(registry.snapshot()).encode()
+                content_type = "application/json"
+            elif self.path.startswith("/metrics"):
+                body = registry.prometheus().encode()
+                content_type = "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+_exporters = {}
+
+
+def start_from_config():
+    """Start the exporters set in `config` (metrics_port, metrics_file) once per process."""
+    import config
+    import log_utils
+
+    port = getattr(config, "metrics_port", None)
+    if port and "server" not in _exporters:
+        try:
+            _exporters["server"] = serve(port, getattr(config, "metrics_host", "127.0.0.1"))
+            log_utils.log_message(
+                f"[INFO] Metrics on http://{getattr(config, 'metrics_host', '127.0.0.1')}:{port}/metrics",
+                config.log_text, "blue")
+        except OSError as e:
+            log_utils.log_message(f"[WARNING] Could not serve metrics on port {port}: {e}",
+                                  config.log_text, "orange")
+
+    path = getattr(config, "metrics_file", None)
+    if path and "file" not in _exporters:
+        interval = getattr(config, "metrics_interval", 5)
+
+        def write_periodically():
+            last_error = None
+            while True:
+                time.sleep(interval)
+                try:
+                    write_snapshot(path)
+                except Exception as e:
+                    # Keep exporting; only log an error the first time in a row it happens
+                    if str(e) != last_error:
+                        log_utils.log_message(f"[WARNING] Could not write metrics to '{path}': {e}",
+                                              config.log_text, "orange")
+                    last_error = str(e)
+                else:
+                    last_error = None
+
+        _exporters["file"] = path
+        threading.Thread(target=write_periodically, name="metrics-file", daemon=True).start()
+
+
+def flush():
+    """Write a last snapshot to the configured metrics file, if any."""
+    if "file" in _exporters:
+        write_snapshot(_exporters["file"])
+
+
+def summary():
+    """One line with the figures worth watching live."""
+    parts = [f"{COMMENTS.value:,.0f} comments", f"{COMMENTS.rate():.0f}/s"]
+    p50 = PAGE_FETCH_SECONDS.quantile(0.5)
+    if p50 is not None:
+        parts.append(f"page p50 ≤{p50 * 1000:.0f}ms")
+    if RATE_LIMITED.value:
+        parts.append(f"{RATE_LIMITED.value:.0f}× 429")
+    if RATE_LIMIT_SLEEP.value >= 1:
+        parts.append(f"{RATE_LIMIT_SLEEP.value:.0f}s rate-limit waits")
+    if QUEUE_DEPTH.value:
+        parts.append(f"queue {QUEUE_DEPTH.value:.0f}")
+    return " · ".join(parts)
+
+
+PAGE_FETCH_SECONDS = REGISTRY.histogram(
+    "scraper_page_fetch_seconds", "Time to fetch one page of comments, including rate controller waits")
+REPLY_FETCH_SECONDS = REGISTRY.histogram(
+    "scraper_reply_page_fetch_seconds", "Time to fetch one page of replies")
+COMMENTS = REGISTRY.counter("scraper_comments_total", "Comments written to output files")
+COMMENTS_PER_SECOND = REGISTRY.gauge(
+    "scraper_comments_per_second", "Comments written per second over the last minute", COMMENTS.rate)
+RATE_LIMITED = REGISTRY.counter("scraper_rate_limited_total", "429 Too Many Requests responses")
+RATE_LIMIT_SLEEP = REGISTRY.counter(
+    "scraper_rate_limit_sleep_seconds_total", "Time spent waiting on rate limits")
+SINK_FLUSH_SECONDS = REGISTRY.histogram(
+    "scraper_sink_flush_seconds", "Time to write and flush one batch to the output file")
+QUEUE_DEPTH = REGISTRY.gauge("scraper_queue_depth", "Pages fetched but not yet handed to the writer")
@@ -0,0 +1,130 @@
+"""Fetch → transform → write pipeline for one scrape.
+
+The fetcher, the optional transform stage and the writer each run on their
+own thread and hand pages on through bounded queues. Requests keep going out
+while a batch is being written, and a disk slower than the network only
+holds `depth` pages per queue before the fetcher waits for it.
+
+    pipeline = PagePipeline(job, writer)
+    pipeline.run(iphone_api.iter_comment_pages(..., stop_event=pipeline.stop_event))
+"""
+import copy
+import queue
+import threading
+
+import metrics
+
+DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class PagePipeline:
+    """Streams `(cursor, nodes)` pages from a page iterator into a `CommentWriter`.
+
+    `transform(nodes)` may return a new list of nodes for each page (e.g. to
+    enrich them) and runs on its own stage. The writer stage runs on the
+    calling thread; it stops as soon as `writer.add_page()` returns False. If
+    the fetcher fails, the pages it fetched before are still written and the
+    error is raised once they are. The writer is not closed here, so the
+    caller decides between finished and partial in one place.
+
+    `stop_event` is set when the job is stopped and as soon as the writer is
+    done, even when it stopped on its own (caught up). The stages run as a
+    copy of the job whose stop event it is, so waits that follow the current
+    job (rate limit backoff) end with the pipeline. Page iterators should be
+    given it too.
+    """
+
+    def __init__(self, job, writer, transform=None, depth=4):
+        self.job = job
+        self.writer = writer
+        self.transform = transform
+        self.depth = max(1, depth)
+        self.stop_event = threading.Event()
+        self._stage_job = copy.copy(job)
+        self._stage_job.stop_event = self.stop_event
+
+    def _put(self, out_queue, item):
+        """Queue `item`, waiting for room. Returns False if the writer is gone."""
+        while not self.stop_event.is_set():
+            try:
+                out_queue.put(item, timeout=0.2)
+            except queue.Full:
+                continue
+            if item is not DONE and not isinstance(item, _Failure):
+                metrics.QUEUE_DEPTH.inc()
+            return True
+        return False
+
+    def _drain(self, in_queue):
+        """Yield the pages of `in_queue` until DONE, re-raising an upstream failure."""
+        while True:
+            try:
+                item = in_queue.get(timeout=0.2)
+            except queue.Empty:
+                if self.job.stopped():
+                    self.stop_event.set()
+                if self.stop_event.is_set():
+                    return
+                continue
+            if item is DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            metrics.QUEUE_DEPTH.dec()
+            yield item
+
+    def _stage(self, pages, out_queue, transform=None):
+        with self._stage_job.activate():
+            try:
+                for cursor, nodes in pages:
+                    if transform is not None:
+                        nodes = transform(nodes)
+                    if not self._put(out_queue, (cursor, nodes)):
+                        return
+            except Exception as e:
+                self._put(out_queue, _Failure(e))
+            else:
+                self._put(out_queue, DONE)
+
+    def _discard(self, queues):
+        for stage_queue in queues:
+            while True:
+                try:
+                    item = stage_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, tuple):
+                    metrics.QUEUE_DEPTH.dec()
+
+    def run(self, pages):
+        """Run every stage until the pages run out, the writer stops or a stage fails."""
+        name = self.job.shortcode
+        fetched = queue.Queue(self.depth)
+        queues = [fetched]
+        threads = [threading.Thread(
+            target=self._stage, args=(pages, fetched), name=f"fetch-{name}", daemon=True)]
+        if self.transform is not None:
+            transformed = queue.Queue(self.depth)
+            queues.append(transformed)
+            threads.append(threading.Thread(
+                target=self._stage, args=(self._drain(fetched), transformed, self.transform),
+                name=f"transform-{name}", daemon=True))
+
+        if self.job.stopped():
+            self.stop_event.set()
+        for thread in threads:
+            thread.start()
+        try:
+            for cursor, nodes in self._drain(queues[-1]):
+                if not self.writer.add_page(cursor, nodes):
+                    break
+        finally:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+            self._discard(queues)
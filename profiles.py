@@ -0,0 +1,323 @@
+"""Commenter profile columns, resolved once per user and kept in a shared cache.
+
+Comment nodes only carry the username, verified flag and `is_mentionable`.
+Giveaway checks also need to know whether an account is private, how many
+followers it has and whether it follows the host. `ProfileResolver` fills
+the `PROFILE_COLUMNS` of each batch:
+
+- it runs as the transform stage of `pipeline.PagePipeline`, so the owners of
+  a page are resolved while the previous page is being written;
+- a page's owner ids are deduplicated, answered from the `ProfileCache` where
+  possible and only the misses are looked up, on a small worker pool;
+- the host's follower list is paged through once (200 accounts per request)
+  instead of checking every commenter.
+
+The cache is one SQLite file shared by every post and run. Profiles older
+than `ttl` are looked up again, and the least recently used ones are
+evicted once it holds more than `max_entries`. Users whose lookup failed
+(private, deleted, rate limited) are cached with empty fields for
+`negative_ttl`, so they do not cost a request on every batch.
+"""
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import custom_utils
+from comment_record import PROFILE_SCHEMA
+
+PROFILE_COLUMNS = [column for column, _ in PROFILE_SCHEMA]
+
+USER_INFO_PATH = "api/v1/users/{user_id}/info/"
+FOLLOWERS_PATH = "api/v1/friendships/{user_id}/followers/"
+FOLLOWERS_PAGE_SIZE = 200
+
+# The profile fields kept in the cache, in PROFILE_COLUMNS order
+FIELDS = ("is_private", "follower_count", "following_count")
+
+# What a lookup returns for a user that could not be looked up (as opposed to None when stopped)
+FAILED = object()
+
+
+def default_path():
+    return custom_utils.get_data_folder("profile_cache.db")
+
+
+def profile_fields(user):
+    """The cached fields of a `users/<id>/info` user object."""
+    return {
+        "is_private": bool(user["is_private"]) if user.get("is_private") is not None else None,
+        "follower_count": user.get("follower_count"),
+        "following_count": user.get("following_count"),
+    }
+
+
+class ProfileCache:
+    def __init__(self, path=None, ttl=7 * 24 * 3600, max_entries=500_000, negative_ttl=3600):
+        self.path = path or default_path()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS profiles (owner_id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+            "fetched REAL NOT NULL, accessed REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS profiles_accessed ON profiles (accessed)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS followers (host_id TEXT NOT NULL, owner_id TEXT NOT NULL, "
+            "PRIMARY KEY (host_id, owner_id)) WITHOUT ROWID")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS follower_lists (host_id TEXT PRIMARY KEY, fetched REAL NOT NULL, "
+            "complete INTEGER NOT NULL)")
+        self._size = self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def get_many(self, owner_ids):
+        """The fresh cached profiles of `owner_ids`, as a dict."""
+        owner_ids = list(owner_ids)
+        found = {}
+        now = time.time()
+        with self._lock:
+            # Stay well below SQLite's limit on host parameters
+            for start in range(0, len(owner_ids), 500):
+                chunk = owner_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT owner_id, data FROM profiles WHERE owner_id IN ({','.join('?' * len(chunk))}) "
+                    f"AND fetched > ?", chunk + [now - self.ttl]).fetchall()
+                found.update((owner_id, json.loads(data)) for owner_id, data in rows)
+            if found:
+                self._conn.executemany(
+                    "UPDATE profiles SET accessed = ? WHERE owner_id = ?", [(now, key) for key in found])
+            self.hits += len(found)
+            self.misses += len(owner_ids) - len(found)
+        return found
+
+    def put_many(self, profiles, ttl=None):
+        """Store `{owner_id: fields}` for `ttl` seconds, evicting the least recently used profiles when full."""
+        if not profiles:
+            return
+        now = time.time()
+        # Freshness is checked against `self.ttl`, so a shorter ttl is stored as an older fetch
+        fetched = now - self.ttl + ttl if ttl is not None else now
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO profiles (owner_id, data, fetched, accessed) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (owner_id) DO UPDATE SET data = excluded.data, fetched = excluded.fetched, "
+                    "accessed = excluded.accessed",
+                    [(owner_id, json.dumps(fields), fetched, now) for owner_id, fields in profiles.items()])
+                self._size = self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+                if self._size > self.max_entries:
+                    self._evict()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _evict(self):
+        """Drop least recently used profiles until the cache is at 90% of `max_entries`."""
+        excess = self._size - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM profiles WHERE owner_id IN "
+            "(SELECT owner_id FROM profiles ORDER BY accessed LIMIT ?)", (excess,))
+        self._size -= excess
+
+    def followers(self, host_id):
+        """The cached follower ids of `host_id` as `(ids, complete)`, or None if missing or stale."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched, complete FROM follower_lists WHERE host_id = ?", (host_id,)).fetchone()
+            if row is None or time.time() - row[0] > self.ttl:
+                return None
+            ids = {owner_id for owner_id, in self._conn.execute(
+                "SELECT owner_id FROM followers WHERE host_id = ?", (host_id,))}
+        return ids, bool(row[1])
+
+    def put_followers(self, host_id, owner_ids, complete):
+        """Replace the follower list of `host_id`."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM followers WHERE host_id = ?", (host_id,))
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO followers (host_id, owner_id) VALUES (?, ?)",
+                    [(host_id, owner_id) for owner_id in owner_ids])
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO follower_lists (host_id, fetched, complete) VALUES (?, ?, ?)",
+                    (host_id, time.time(), int(complete)))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "profiles": self._size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ProfileResolver:
+    """Resolves the profiles of commenters for one `ScrapeJob`.
+
+    `prefetch(nodes)` is the pipeline transform: it resolves the owners of a
+    page ahead of the writer and hands the nodes on unchanged. `enrich(buffer)`
+    fills the profile columns of a batch, resolving whoever was not prefetched
+    (reply authors). Lookups take a token from the job's request budget; a
+    lookup that fails or is stopped leaves the user's columns empty, and one
+    that failed is not retried until the cache's `negative_ttl` ran out.
+
+    `host_id` is the post owner. Its follower list comes from the cache, or
+    is paged through once per run on a background thread, up to
+    `max_follower_pages` pages. Batches written before it is complete get an
+    empty Follows Host, so the writer never waits for it. If the list is
+    longer than that, Follows Host is only filled for the followers that
+    were seen.
+    """
+
+    def __init__(self, context, job, cache, host_id=None, workers=4, max_follower_pages=500):
+        self.context = context
+        self.job = job
+        self.cache = cache
+        self.host_id = str(host_id) if host_id is not None else None
+        self.max_follower_pages = max_follower_pages
+        self.lookups = 0
+        self._known = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._host_followers = None
+        self._closed = threading.Event()
+        self._warned = False
+        self._pool = ThreadPoolExecutor(max(1, workers), thread_name_prefix=f"profiles-{job.shortcode}")
+        if self.host_id is not None:
+            self._host_followers = cache.followers(self.host_id)
+            if self._host_followers is None:
+                # Its own thread, so the lookups keep every pool worker
+                threading.Thread(target=self._load_host_followers, name=f"followers-{job.shortcode}",
+                                 daemon=True).start()
+
+    def prefetch(self, nodes):
+        self.resolve({str(node["user"]["pk"]) for node in nodes if (node.get("user") or {}).get("pk") is not None})
+        return nodes
+
+    def resolve(self, owner_ids):
+        """Make sure every id of `owner_ids` is known, looking up each missing one once."""
+        with self._lock:
+            missing = {owner_id for owner_id in owner_ids if owner_id and owner_id not in self._known}
+        if not missing:
+            return
+        cached = self.cache.get_many(missing)
+        with self._lock:
+            self._known.update(cached)
+            futures = []
+            for owner_id in missing - cached.keys():
+                # Another stage may already be looking this user up
+                future = self._futures.get(owner_id)
+                if future is None:
+                    future = self._futures[owner_id] = self._pool.submit(self._lookup, owner_id)
+                futures.append(future)
+        fetched, failed = {}, {}
+        for future in futures:
+            owner_id, fields = future.result()
+            if fields is FAILED:
+                failed[owner_id] = dict.fromkeys(FIELDS)
+            elif fields is not None:
+                fetched[owner_id] = fields
+        self.cache.put_many(fetched)
+        self.cache.put_many(failed, ttl=self.cache.negative_ttl)
+        with self._lock:
+            self._known.update(fetched)
+            self._known.update(failed)
+            for future in futures:
+                self._futures.pop(future.result()[0], None)
+
+    def _lookup(self, owner_id):
+        if not self.job.wait_for_request():
+            return owner_id, None
+        try:
+            data = self.context.get_iphone_json(USER_INFO_PATH.format(user_id=owner_id), {})
+        except Exception as e:
+            with self._lock:
+                warn, self._warned = not self._warned, True
+            if warn:
+                self.job.log(f"[WARNING] Could not look up profile {owner_id}: {e}", "orange")
+            return owner_id, FAILED
+        self.lookups += 1
+        return owner_id, profile_fields(data.get("user") or {})
+
+    def host_followers(self):
+        """The host's follower ids as `(ids, complete)`, or None while they are still being read."""
+        return self._host_followers
+
+    def _load_host_followers(self):
+        fetched = self._fetch_followers()
+        if fetched is not None:
+            self.cache.put_followers(self.host_id, *fetched)
+        self._host_followers = fetched or (set(), False)
+
+    def _fetch_followers(self):
+        self.job.log("[INFO] Fetching the host's followers...", "blue")
+        followers = set()
+        max_id = ""
+        for _ in range(self.max_follower_pages):
+            if not self.job.wait_for_request() or self._closed.is_set():
+                return None
+            try:
+                page = self.context.get_iphone_json(
+                    FOLLOWERS_PATH.format(user_id=self.host_id), {"count": FOLLOWERS_PAGE_SIZE, "max_id": max_id})
+            except Exception as e:
+                self.job.log(f"[WARNING] Could not fetch the host's followers: {e}", "orange")
+                return None
+            followers.update(str(user["pk"]) for user in page.get("users", []) if user.get("pk") is not None)
+            max_id = page.get("next_max_id")
+            if not max_id:
+                return followers, True
+        self.job.log(
+            f"[WARNING] The host has more than {len(followers)} followers; Follows Host is only "
+            f"filled for those.", "orange")
+        return followers, False
+
+    def enrich(self, buffer):
+        """Fill the profile columns of `buffer` from its Owner ID column."""
+        owner_ids = buffer.column("Owner ID")
+        self.resolve(set(owner_ids))
+        empty = dict.fromkeys(FIELDS)
+        with self._lock:
+            profiles = [self._known.get(owner_id, empty) for owner_id in owner_ids]
+        for field, column in zip(FIELDS, PROFILE_COLUMNS):
+            buffer.set_column(column, [profile[field] for profile in profiles])
+
+        followers, complete = self.host_followers() or (set(), False)
+        buffer.set_column("Follows Host", [
+            True if owner_id in followers else False if complete else None for owner_id in owner_ids])
+
+    def shutdown(self):
+        self._closed.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        if self.lookups:
+            self.job.log(f"[INFO] Looked up {self.lookups} commenter profiles.", "blue")
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def from_config():
+    """The profile cache configured in `config`, shared by every job in the process."""
+    import config
+
+    path = getattr(config, "profile_cache_path", None) or default_path()
+    with _shared_lock:
+        cache = _shared.get(path)
+        if cache is None:
+            cache = _shared[path] = ProfileCache(
+                path, ttl=getattr(config, "profile_cache_ttl", 7 * 24 * 3600),
+                max_entries=getattr(config, "profile_cache_max_entries", 500_000),
+                negative_ttl=getattr(config, "profile_cache_negative_ttl", 3600))
+        return cache
@@ -0,0 +1,125 @@
+import collections
+import threading
+import time
+from datetime import datetime, timedelta
+
+import instaloader
+
+import config
+import log_utils
+import metrics
+import scrape_job
+from rate_limit import AdaptiveBucket, interruptible_sleep
+
+
+class AdaptiveRateController(instaloader.RateController):
+    """Paces Instaloader requests with one adaptive token bucket per query type.
+
+    Instaloader does not report successful responses, so a query counts as
+    successful once the next query of the same type is about to start without
+    a 429 having been handled in between. The controller belongs to a
+    session and may be shared by several jobs; waits and log lines follow the
+    `scrape_job.current()` job of the calling thread.
+    """
+
+    REPORT_EVERY = 50
+
+    def __init__(self, context, on_429=None, stop_event=None):
+        super().__init__(context)
+        self.on_429 = on_429
+        self.stop_event = stop_event
+        self.requests = 0
+        self.rate_limits = 0
+        self.slept = 0.0
+        self._buckets = {}
+        self._in_flight = set()
+        self._recent = collections.deque()
+        self._lock = threading.Lock()
+
+    def _stop_event(self):
+        job = scrape_job.current()
+        if job is not None:
+            return job.stop_event
+        return self.stop_event or getattr(config, 'stop_event', None)
+
+    def _log(self, message, color):
+        job = scrape_job.current()
+        log_utils.log_message(message, job.log_target if job else config.log_text, color)
+
+    def _bucket(self, query_type):
+        with self._lock:
+            bucket = self._buckets.get(query_type)
+            if bucket is None:
+                bucket = self._buckets[query_type] = AdaptiveBucket(
+                    per_minute=getattr(config, "requests_per_minute", 60),
+                    min_per_minute=getattr(config, "min_requests_per_minute", 2),
+                    max_per_minute=getattr(config, "max_requests_per_minute", 180),
+                    backoff_base=getattr(config, "rate_limit_backoff", 30),
+                )
+            return bucket
+
+    def query_waittime(self, query_type: str, current_time: float, untracked_queries: bool = False) -> float:
+        return self._bucket(query_type).peek()
+
+    def wait_before_query(self, query_type: str) -> None:
+        bucket = self._bucket(query_type)
+        if query_type in self._in_flight:
+            bucket.on_success()
+        self.sleep(bucket.reserve())
+
+        with self._lock:
+            self._in_flight.add(query_type)
+            self.requests += 1
+            now = time.monotonic()
+            self._recent.append(now)
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            report = self.requests % self.REPORT_EVERY == 0
+        if report:
+            self.report()
+
+    def sleep(self, secs):
+        if secs <= 0:
+            return
+        if secs >= 1:
+            wait_msg = f"Waiting {round(secs)} seconds, until {(datetime.now() + timedelta(seconds=secs)).strftime('%H:%M:%S')}."
+            self._log(f"[RATE LIMIT] {wait_msg}", "yellow")
+        started = time.monotonic()
+        if not interruptible_sleep(secs, self._stop_event()):
+            self._log("[INFO] Stop requested during rate limit wait", "orange")
+        slept = time.monotonic() - started
+        self.slept += slept
+        metrics.RATE_LIMIT_SLEEP.inc(slept)
+
+    def handle_429(self, query_type: str) -> None:
+        """Slow this query type down and pause with exponential, jittered backoff."""
+        if self.on_429 is not None:
+            self.on_429(query_type)
+
+        self.rate_limits += 1
+        metrics.RATE_LIMITED.inc()
+        self._in_flight.discard(query_type)
+        bucket = self._bucket(query_type)
+        backoff = bucket.on_rate_limited()
+        self._log(
+            f"[RATE LIMIT] 429 Too Many Requests ({query_type}). "
+            f"Slowing to {bucket.per_minute:.1f} requests/min.", "yellow")
+
+        stop_event = self._stop_event()
+        if stop_event and stop_event.is_set():
+            return
+        self.sleep(backoff)
+
+    def achieved_per_minute(self):
+        """Requests actually sent during the last minute."""
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for stamp in self._recent if now - stamp <= 60)
+
+    def report(self):
+        targets = ", ".join(
+            f"{query_type[:12]} {bucket.per_minute:.0f}/min" for query_type, bucket in list(self._buckets.items()))
+        self._log(
+            f"[RATE] {self.achieved_per_minute()} requests in the last minute "
+            f"({self.requests} total, {self.rate_limits} rate limited, {round(self.slept)}s waiting). "
+            f"Targets: {targets}", "blue")
@@ -0,0 +1,86 @@
+import random
+import threading
+import time
+
+
+def interruptible_sleep(secs, stop_event=None, step=0.5):
+    """Sleep for `secs`, waking early if `stop_event` is set. Returns False if stopped."""
+    if stop_event is None:
+        if secs > 0:
+            time.sleep(secs)
+        return True
+    return not stop_event.wait(secs) if secs > 0 else not stop_event.is_set()
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilling at `per_minute / 60` tokens a second.
+
+    `reserve()` takes a token immediately and returns how long the caller has
+    to wait before using it, so concurrent callers queue up fairly instead of
+    polling.
+    """
+
+    def __init__(self, per_minute=60, burst=None):
+        self.per_minute = float(per_minute)
+        self.burst = burst or max(1, int(per_minute) // 6)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def reserve(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return max(0.0, -self._tokens) * 60.0 / self.per_minute
+
+    def peek(self):
+        """Seconds until a token would be available, without taking it."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, 1 - self._tokens) * 60.0 / self.per_minute
+
+
+class RateBudget(TokenBucket):
+    """Token bucket shared by every worker of a run."""
+
+    def acquire(self, stop_event=None):
+        """Block until a token is available. Returns False if stopped first."""
+        return interruptible_sleep(self.reserve(), stop_event)
+
+
+class AdaptiveBucket(TokenBucket):
+    """Token bucket that speeds up while requests succeed and backs off on 429.
+
+    The rate grows by `increase` requests/min per success (additive increase)
+    and is halved on every 429 (multiplicative decrease). Consecutive 429s
+    also return an exponentially growing, jittered pause.
+    """
+
+    def __init__(self, per_minute=60, min_per_minute=2, max_per_minute=180, increase=0.5,
+                 backoff_base=30.0, backoff_cap=900.0, burst=None):
+        super().__init__(per_minute, burst)
+        self.min_per_minute = min_per_minute
+        self.max_per_minute = max_per_minute
+        self.increase = increase
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.consecutive_429 = 0
+
+    def on_success(self):
+        with self._lock:
+            self.consecutive_429 = 0
+            self.per_minute = min(self.max_per_minute, self.per_minute + self.increase)
+
+    def on_rate_limited(self):
+        """Slow down after a 429 and return how long to pause before retrying."""
+        with self._lock:
+            self.consecutive_429 += 1
+            self.per_minute = max(self.min_per_minute, self.per_minute / 2)
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+            backoff = min(self.backoff_cap, self.backoff_base * 2 ** (self.consecutive_429 - 1))
+        return random.uniform(backoff / 2, backoff)
@@ -0,0 +1,102 @@
+"""Optional reply expansion for scraped comment threads.
+
+Top-level pagination only sees the replies Instagram previews inline. With
+`expand_replies` on, every comment that has replies is handed to a
+`ReplyExpander`, which fetches its child-comment pages on a small worker pool
+while the top-level pages keep streaming. Reply rows carry the parent
+comment id and a depth of 1.
+"""
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import metrics
+
+CHILD_COMMENTS_PATH = "api/v1/media/{media_id}/comments/{comment_id}/child_comments/"
+
+
+def iter_reply_pages(context, media_id, comment_id, budget=None, stop_event=None):
+    """Yield the child comment nodes of `comment_id`, one page at a time."""
+    max_id = ""
+    while True:
+        if budget is not None and not budget.acquire(stop_event):
+            return
+        if stop_event is not None and stop_event.is_set():
+            return
+        with metrics.REPLY_FETCH_SECONDS.time():
+            page = context.get_iphone_json(
+                CHILD_COMMENTS_PATH.format(media_id=media_id, comment_id=comment_id), {"max_id": max_id})
+        yield page.get("child_comments", [])
+        max_id = page.get("next_max_child_cursor")
+        if not page.get("has_more_tail_child_comments") or not max_id:
+            return
+
+
+class ReplyExpander:
+    """Fetches reply threads on a bounded pool for one `ScrapeJob`.
+
+    `submit()` queues a thread, `completed()` hands back the threads that are
+    done as `(parent_id, reply_nodes)` and `pending()` lists the parents still
+    in flight, so the writer can checkpoint them.
+    """
+
+    def __init__(self, context, media_id, job, workers=4):
+        self.context = context
+        self.media_id = media_id
+        self.job = job
+        self._pool = ThreadPoolExecutor(max(1, workers), thread_name_prefix=f"replies-{job.shortcode}")
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def has_replies(node):
+        return node.get("child_comment_count", 0) > 0
+
+    def submit(self, parent_id, node=None):
+        """Fetch the replies of `parent_id`; `node` lets fully previewed threads skip the request."""
+        with self._lock:
+            if parent_id not in self._futures:
+                self._futures[parent_id] = self._pool.submit(self._fetch, parent_id, node)
+
+    def _fetch(self, parent_id, node):
+        if node is not None:
+            preview = node.get("preview_child_comments") or []
+            if node.get("child_comment_count", 0) == len(preview):
+                return preview
+
+        replies = []
+        with self.job.activate():
+            for page in iter_reply_pages(
+                    self.context, self.media_id, parent_id, self.job.budget, self.job.stop_event):
+                replies.extend(page)
+        if self.job.stopped():
+            raise InterruptedError(parent_id)
+        return replies
+
+    def pending(self):
+        with self._lock:
+            return list(self._futures)
+
+    def completed(self, wait=False):
+        """Pop finished threads. Stopped or cancelled ones stay pending for the checkpoint; failed ones are dropped."""
+        with self._lock:
+            futures = list(self._futures.items())
+        done = []
+        for parent_id, future in futures:
+            if not (wait or future.done()):
+                continue
+            try:
+                replies = future.result()
+            except (InterruptedError, CancelledError):
+                # Stopped, or still queued when the pool shut down
+                continue
+            except Exception as e:
+                # Retrying on resume would fail the same way and keep the post from finishing
+                self.job.log(f"[WARNING] Could not fetch replies of {parent_id}, skipping them: {e}", "orange")
+                replies = []
+            with self._lock:
+                del self._futures[parent_id]
+            done.append((parent_id, replies))
+        return done
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,279 @@
+"""Results tab of the GUI: every scraped row, streamed in as it is saved.
+
+Writers hand each saved batch to `config.results_feed` (a `ResultsFeed`)
+from their own threads. The Tk main loop drains it on an `after()` timer,
+the way `log_utils.LogBus` does for the log.
+
+The Treeview only ever holds the rows that fit on screen. Scrolling moves an
+offset into the row list and refills those items, so the widget costs the
+same with 500 rows as with 500k.
+
+Filtering goes through a `SearchIndex` that is extended as rows arrive. A
+query matches the rows that have, for each of its words, a word starting
+with it in their username or comment. A query looks its words up in
+the sorted vocabulary instead of scanning every row.
+"""
+import bisect
+import queue
+import re
+import tkinter as tk
+from array import array
+from tkinter import ttk
+
+# (heading, sink column, width)
+VIEW_COLUMNS = (
+    ("Post", None, 90),
+    ("Username", "Username", 130),
+    ("Comment", "Comment", 320),
+    ("Mentionable", "Is Mentionable", 80),
+    ("Likes", "Like Count", 50),
+)
+
+WORD_RE = re.compile(r"\w+")
+# Prefixes up to this length get their own posting lists, so the first keystrokes
+# of a query, which match the most rows, need no union
+SHORT_PREFIX = 3
+
+
+def words(text):
+    """The distinct lowercase words of `text`."""
+    return set(WORD_RE.findall(text.lower())) if text else set()
+
+
+class ResultsFeed:
+    """Thread-safe hand-off of saved batches to the results tab."""
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def put(self, shortcode, columns, rows):
+        self._queue.put((shortcode, columns, rows))
+
+    def get_nowait(self):
+        return self._queue.get_nowait()
+
+
+class SearchIndex:
+    """Word-prefix index over row ids, built incrementally.
+
+    Rows are added in id order, so every posting list is already sorted.
+    Words seen for the first time wait in `_new` and are merged into the
+    sorted vocabulary on the next search. Longer query words are answered by
+    the union of the posting lists of every word they start.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._short = {}
+        self._vocab = []
+        self._new = []
+
+    def add(self, row_id, row_words):
+        for word in row_words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = array("I")
+                self._new.append(word)
+            postings.append(row_id)
+        for prefix in {word[:n] for word in row_words for n in range(1, min(len(word), SHORT_PREFIX) + 1)}:
+            postings = self._short.get(prefix)
+            if postings is None:
+                postings = self._short[prefix] = array("I")
+            postings.append(row_id)
+
+    def _prefixed(self, prefix):
+        """Every indexed word starting with `prefix`."""
+        if self._new:
+            # Timsort merges the sorted vocabulary and the sorted new words in one pass
+            self._new.sort()
+            self._vocab += self._new
+            self._vocab.sort()
+            self._new = []
+        start = bisect.bisect_left(self._vocab, prefix)
+        end = bisect.bisect_left(self._vocab, prefix + "\U0010ffff", start)
+        return self._vocab[start:end]
+
+    def _rows_with(self, prefix):
+        """Ids of the rows with a word starting with `prefix`, as a sorted array or a set."""
+        if len(prefix) <= SHORT_PREFIX:
+            return self._short.get(prefix, ())
+        found = set()
+        for word in self._prefixed(prefix):
+            found.update(self._postings[word])
+        return found
+
+    def search(self, query):
+        """Sorted ids of the rows matching every word of `query`, or None for an empty query."""
+        query_words = words(query)
+        if not query_words:
+            return None
+        # Smallest candidate set first
+        candidates = sorted(map(self._rows_with, query_words), key=len)
+        if len(candidates) == 1:
+            return sorted(candidates[0]) if isinstance(candidates[0], set) else list(candidates[0])
+        matches = set(candidates[0])
+        for other in candidates[1:]:
+            matches.intersection_update(other)
+            if not matches:
+                return []
+        return sorted(matches)
+
+    @staticmethod
+    def matches(query_words, row_words):
+        """Whether a row with `row_words` matches every word of a query, for rows arriving under a filter."""
+        return all(any(word.startswith(prefix) for word in row_words) for prefix in query_words)
+
+
+class ResultsView(tk.Frame):
+    """A search box over a virtualized Treeview of the scraped rows."""
+
+    def __init__(self, master, interval_ms=200, max_batch=5000, **kwargs):
+        super().__init__(master, **kwargs)
+        self.feed = ResultsFeed()
+        self.interval_ms = interval_ms
+        self.max_batch = max_batch
+        self.rows = []
+        self.index = SearchIndex()
+        self.matches = None
+        self.offset = 0
+        self.visible = 20
+        self._query_words = set()
+        self._pending_filter = None
+
+        top = tk.Frame(self, bg=self["bg"])
+        top.pack(fill=tk.X, pady=(0, 6))
+        tk.Label(top, text="Filter", font=("Arial", 9), bg=self["bg"]).pack(side=tk.LEFT, padx=(0, 5))
+        self.query_var = tk.StringVar()
+        self.query_var.trace_add("write", lambda *_: self._schedule_filter())
+        tk.Entry(
+            top,
+            textvariable=self.query_var,
+            font=("Arial", 9),
+            relief=tk.FLAT,
+            bg="#ecf0f1",
+            highlightthickness=1,
+            highlightbackground="#bdc3c7",
+            highlightcolor="#3498db"
+        ).pack(side=tk.LEFT, fill=tk.X, expand=True, ipady=4)
+        tk.Button(
+            top,
+            text="Clear",
+            command=self.clear,
+            font=("Arial", 9),
+            relief=tk.FLAT,
+            cursor="hand2"
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        self.count_label = tk.Label(top, text="0 rows", font=("Arial", 9), bg=self["bg"], fg="#7f8c8d")
+        self.count_label.pack(side=tk.LEFT, padx=(8, 0))
+
+        table = tk.Frame(self, bg=self["bg"])
+        table.pack(fill=tk.BOTH, expand=True)
+        self.scrollbar = ttk.Scrollbar(table, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = ttk.Treeview(
+            table, columns=[heading for heading, _, _ in VIEW_COLUMNS], show="headings", selectmode="browse")
+        for heading, _, width in VIEW_COLUMNS:
+            self.tree.heading(heading, text=heading)
+            self.tree.column(heading, width=width, stretch=heading == "Comment")
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-1 if event.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-1, "units"))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(1, "units"))
+        self.tree.bind("<Prior>", lambda event: self.scroll(-1, "pages"))
+        self.tree.bind("<Next>", lambda event: self.scroll(1, "pages"))
+
+    def start(self):
+        self.after(self.interval_ms, self._drain)
+
+    @property
+    def total(self):
+        return len(self.rows) if self.matches is None else len(self.matches)
+
+    def _drain(self):
+        added = 0
+        try:
+            while added < self.max_batch:
+                shortcode, columns, rows = self.feed.get_nowait()
+                self._add(shortcode, columns, rows)
+                added += len(rows)
+        except queue.Empty:
+            pass
+        if added:
+            self.render()
+        self.after(self.interval_ms, self._drain)
+
+    def _add(self, shortcode, columns, rows):
+        # Stay on the newest rows while the view is scrolled to the end
+        follow = self.offset + self.visible >= self.total
+        positions = [columns.index(column) if column else None for _, column, _ in VIEW_COLUMNS]
+        username, comment = positions[1], positions[2]
+        for row in rows:
+            row_id = len(self.rows)
+            self.rows.append(tuple(
+                shortcode if position is None else "" if row[position] is None else row[position]
+                for position in positions))
+            row_words = words(row[username]) | words(row[comment])
+            self.index.add(row_id, row_words)
+            if self.matches is not None and SearchIndex.matches(self._query_words, row_words):
+                self.matches.append(row_id)
+        if follow:
+            self.offset = max(0, self.total - self.visible)
+
+    def _schedule_filter(self):
+        # Only the query typed last is looked up, not every keystroke on the way
+        if self._pending_filter is not None:
+            self.after_cancel(self._pending_filter)
+        self._pending_filter = self.after(120, self.apply_filter)
+
+    def apply_filter(self):
+        self._pending_filter = None
+        query = self.query_var.get()
+        self._query_words = words(query)
+        self.matches = self.index.search(query)
+        self.offset = 0
+        self.render()
+
+    def clear(self):
+        self.rows = []
+        self.index = SearchIndex()
+        self.matches = None if self.matches is None else []
+        self.offset = 0
+        self.render()
+
+    def scroll(self, amount, what="units"):
+        step = self.visible if what == "pages" else 3
+        self.offset = max(0, min(self.offset + int(amount) * step, self.total - self.visible))
+        self.render()
+
+    def _on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.offset = max(0, min(int(float(args[0]) * self.total), self.total - self.visible))
+            self.render()
+        elif action == "scroll":
+            self.scroll(args[0], args[1])
+
+    def _on_resize(self, event):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        # One row less for the headings
+        visible = max(1, event.height // row_height - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def render(self):
+        """Fill the Treeview with the rows at the current offset."""
+        total = self.total
+        self.offset = max(0, min(self.offset, total - self.visible))
+        end = min(total, self.offset + self.visible)
+        ids = range(self.offset, end) if self.matches is None else self.matches[self.offset:end]
+        self.tree.delete(*self.tree.get_children())
+        for row_id in ids:
+            self.tree.insert("", tk.END, values=self.rows[row_id])
+        if total:
+            self.scrollbar.set(self.offset / total, end / total)
+        else:
+            self.scrollbar.set(0, 1)
+        shown = f"{total:,} of {len(self.rows):,} rows" if self.matches is not None else f"{total:,} rows"
+        self.count_label.config(text=shown)
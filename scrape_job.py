@@ -0,0 +1,102 @@
+"""Per-scrape state, so several scrapes can run in one process.
+
+A `ScrapeJob` carries everything the pipeline used to read from the
+process-wide `config` module: the logged-in loader, shortcode, output format,
+log target, stop event, shared request budget, reply expansion,
+incremental and text/profile enrichment settings, and the folder its
+output and checkpoint go to (the data folder unless `output_dir` is set).
+A job run under a lease also gets a `fence`, a callable that returns False
+once the job may no longer write its output.
+`ScrapeJob.from_config()` builds one from `config` for the single-post
+GUI/script path.
+"""
+import contextlib
+import threading
+
+import config
+import log_utils
+import sinks
+
+_local = threading.local()
+
+
+def current():
+    """The ScrapeJob the calling thread is working on, if any."""
+    return getattr(_local, "job", None)
+
+
+class ScrapeJob:
+    def __init__(self, shortcode, loader=None, output_format="xlsx", stop_event=None,
+                 log_target=None, budget=None, url=None, expand_replies=False, reply_workers=4,
+                 incremental=False, enrich_text=False, enrich_profiles=False, output_dir=None, fence=None):
+        self.shortcode = shortcode
+        self.loader = loader
+        self.output_format = output_format
+        self.stop_event = stop_event or threading.Event()
+        self.log_target = log_target
+        self.budget = budget
+        self.url = url
+        self.expand_replies = expand_replies
+        self.reply_workers = reply_workers
+        self.incremental = incremental
+        self.enrich_text = enrich_text
+        self.enrich_profiles = enrich_profiles
+        self.output_dir = output_dir
+        self.fence = fence
+        self.comments = 0
+        self.finished = False
+
+    @classmethod
+    def from_config(cls, loader=None, **overrides):
+        """Snapshot the job settings currently held by `config`."""
+        options = {
+            "shortcode": getattr(config, "shortcode", None),
+            "output_format": getattr(config, "output_format", "xlsx"),
+            "stop_event": getattr(config, "stop_event", None),
+            "log_target": getattr(config, "log_text", None),
+            "url": getattr(config, "post_url", None),
+            "expand_replies": getattr(config, "expand_replies", False),
+            "reply_workers": getattr(config, "reply_workers", 4),
+            "incremental": getattr(config, "incremental", False),
+            "enrich_text": getattr(config, "enrich_text", False),
+            "enrich_profiles": getattr(config, "enrich_profiles", False),
+        }
+        options.update(overrides)
+        return cls(loader=loader, **options)
+
+    def __repr__(self):
+        return f"ScrapeJob({self.shortcode!r}, {self.output_format}, comments={self.comments})"
+
+    @property
+    def output_path(self):
+        return sinks.output_path(self.shortcode, self.output_format, self.output_dir)
+
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def may_write(self):
+        """Whether the output is still this job's to write."""
+        return self.fence is None or self.fence()
+
+    def wait_for_request(self):
+        """Take a token from the shared budget. Returns False if stopped while waiting."""
+        if self.stopped():
+            return False
+        return self.budget is None or self.budget.acquire(self.stop_event)
+
+    def log(self, message, color="black"):
+        log_utils.log_message(message, self.log_target, color)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Mark this job as the one the calling thread is working on.
+
+        Code shared between jobs, such as a session's rate controller, uses
+        `current()` to honour the right stop event and log target.
+        """
+        previous = current()
+        _local.job = self
+        try:
+            yield self
+        finally:
+            _local.job = previous
@@ -8,8 +8,11 @@ import tempfile
 from datetime import datetime
 import config
 import custom_utils
-import main
+import batch
+import session_pool
 import log_utils
+import metrics
+from results_view import ResultsView
 
 
 class InstagramScraperGUI:
@@ -144,7 +147,7 @@ class InstagramScraperGUI:
         # Post URL Section
         url_frame = tk.LabelFrame(
             main_frame,
-            text="Post/Reel URL",
+            text="Post/Reel URL(s) — separate several with spaces or commas",
             font=("Arial", 11, "bold"),
             bg="#ffffff",
             padx=12,
@@ -204,18 +207,24 @@ class InstagramScraperGUI:
             bg="#f0f0f0",
             fg="#7f8c8d"
         )
-        self.status_label.pack(pady=(5, 10))
+        self.status_label.pack(pady=(5, 0))
 
-        # Logging Section
-        log_frame = tk.LabelFrame(
+        # Live figures from metrics.py while a scrape runs
+        self.metrics_label = tk.Label(
             main_frame,
-            text="Activity Log",
-            font=("Arial", 11, "bold"),
-            bg="#ffffff",
-            padx=8,
-            pady=8
+            text="",
+            font=("Arial", 9),
+            bg="#f0f0f0",
+            fg="#7f8c8d"
         )
-        log_frame.pack(fill=tk.BOTH, expand=True)
+        self.metrics_label.pack(pady=(0, 10))
+
+        # Activity log and live results, one tab each
+        notebook = ttk.Notebook(main_frame)
+        notebook.pack(fill=tk.BOTH, expand=True)
+
+        log_frame = tk.Frame(notebook, bg="#ffffff", padx=8, pady=8)
+        notebook.add(log_frame, text="Activity Log")
 
         log_container = tk.Frame(log_frame, bg="#ffffff")
         log_container.pack(fill=tk.BOTH, expand=True)
@@ -238,7 +247,16 @@ class InstagramScraperGUI:
         self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.log_text.yview)
 
-        config.log_text = self.log_text
+        # Worker threads log through the bus; the Tk loop drains it in batches
+        self.log_bus = log_utils.LogBus(self.log_text, max_lines=5000)
+        self.log_bus.start()
+        config.log_text = self.log_bus
+
+        # Saved rows stream in from the writers through config.results_feed
+        self.results_view = ResultsView(notebook, bg="#ffffff", padx=8, pady=8)
+        notebook.add(self.results_view, text="Results")
+        self.results_view.start()
+        config.results_feed = self.results_view.feed
 
         self.log_message("[INFO] Application started successfully", "green")
         self.log_message(f"[INFO] Session file: {self.session_file}", "blue")
@@ -254,7 +272,7 @@ class InstagramScraperGUI:
             return
 
         try:
-            with open(file_path, 'r') as file:
+            with open(file_path, 'r', newline='') as file:
                 reader = csv.DictReader(file)
                 data = next(reader)
 
@@ -265,8 +283,15 @@ class InstagramScraperGUI:
 
                 self.log_message(
                     "[SUCCESS] Session data imported from CSV", "green")
-                messagebox.showinfo(
-                    "Success", "Session data imported successfully!")
+
+            # Several accounts: rotate requests across all of them
+            records = session_pool.load_session_records(file_path)
+            config.sessions_file = file_path if len(records) > 1 else None
+            if config.sessions_file:
+                self.log_message(
+                    f"[INFO] {len(records)} sessions found, scraping will rotate across them", "blue")
+            messagebox.showinfo(
+                "Success", "Session data imported successfully!")
         except Exception as e:
             self.log_message(f"[ERROR] Failed to import CSV: {e}", "red")
             messagebox.showerror("Error", f"Failed to import CSV: {e}")
@@ -314,6 +339,7 @@ class InstagramScraperGUI:
                 self.log_message(
                     f"[ERROR] Failed to delete session file: {e}", "red")
 
+        config.sessions_file = None
         self.log_message("[INFO] Session data cleared", "blue")
 
     def populate_fields(self):
@@ -348,11 +374,17 @@ class InstagramScraperGUI:
             return
 
         try:
-            shortcode = custom_utils.extract_id(post_url)
-            config.post_url = post_url
-            config.shortcode = shortcode
-            self.log_message(
-                f"[INFO] Extracted shortcode: {shortcode}", "blue")
+            post_urls = batch.load_urls(post_url)
+            config.post_urls = post_urls if len(post_urls) > 1 else []
+            if config.post_urls:
+                self.log_message(
+                    f"[INFO] Batch mode: {len(post_urls)} URLs queued", "blue")
+            else:
+                shortcode = custom_utils.extract_id(post_url)
+                config.post_url = post_url
+                config.shortcode = shortcode
+                self.log_message(
+                    f"[INFO] Extracted shortcode: {shortcode}", "blue")
         except Exception as e:
             messagebox.showerror("Error", f"Invalid URL: {e}")
             self.log_message(
@@ -370,36 +402,58 @@ class InstagramScraperGUI:
         config.stop_event = self.stop_event
 
         threading.Thread(target=self.run_scraper, daemon=True).start()
+        self.refresh_metrics()
 
     def run_scraper(self):
-        """Run the scraper in a separate thread"""
+        """Run the scraper in a separate thread
+
+        Widgets are only touched through self.log_bus, which hands the
+        updates over to the Tk main loop.
+        """
+        ui = self.log_bus.call
         try:
-            self.status_label.config(
-                text="⚙️ Scraping in progress...", fg="#f39c12")
+            ui(self.status_label.config,
+               text="⚙️ Scraping in progress...", fg="#f39c12")
             self.log_message("[INFO] Scraper started...", "green")
 
             # Call main function WITHOUT passing stop_event
             # The stop_event is now accessible via config.stop_event
-            main.main()
+            if config.post_urls:
+                batch.main(config.post_urls)
+            else:
+                # Imported here so the window shows up before instaloader loads
+                import main
+                main.main()
 
             if not self.stop_event.is_set():
-                self.status_label.config(
-                    text="✅ Scraping completed!", fg="#27ae60")
+                ui(self.status_label.config,
+                   text="✅ Scraping completed!", fg="#27ae60")
                 self.log_message(
                     "[SUCCESS] Scraping completed successfully", "green")
             else:
-                self.status_label.config(
-                    text="⏹ Stopped by user", fg="#e67e22")
+                ui(self.status_label.config,
+                   text="⏹ Stopped by user", fg="#e67e22")
                 self.log_message("[INFO] Scraping stopped by user", "orange")
         except Exception as e:
             if not self.stop_event.is_set():
-                self.status_label.config(text=f"❌ Error: {e}", fg="#e74c3c")
+                ui(self.status_label.config, text=f"❌ Error: {e}", fg="#e74c3c")
                 self.log_message(f"[ERROR] An error occurred: {e}", "red")
         finally:
-            self.is_scraping = False
-            self.stop_requested = False
-            self.start_button.config(state=tk.NORMAL)
-            self.stop_button.config(state=tk.DISABLED)
+            ui(self.finish_scraping)
+
+    def refresh_metrics(self):
+        """Show the live metrics every second while scraping"""
+        self.metrics_label.config(text=metrics.summary())
+        if self.is_scraping:
+            self.root.after(1000, self.refresh_metrics)
+
+    def finish_scraping(self):
+        """Reset controls once the scraper thread is done"""
+        self.is_scraping = False
+        self.refresh_metrics()
+        self.stop_requested = False
+        self.start_button.config(state=tk.NORMAL)
+        self.stop_button.config(state=tk.DISABLED)
 
     def stop_scraping(self):
         """Stop the scraping process"""
@@ -412,31 +466,15 @@ class InstagramScraperGUI:
             self.status_label.config(text="⏸️ Stopping...", fg="#e67e22")
 
     def log_message(self, message, color="black"):
-        """Add message to log with color"""
-        self.log_text.config(state=tk.NORMAL)
-
-        color_map = {
-            "red": "#dc2626",
-            "green": "#16a34a",
-            "blue": "#2563eb",
-            "orange": "#ea580c",
-            "black": "#1f2937"
-        }
-
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        formatted_message = f"[{timestamp}] {message}\n"
-
-        tag_name = f"color_{color}"
-        self.log_text.tag_config(
-            tag_name, foreground=color_map.get(color, "#1f2937"))
-
-        self.log_text.insert(tk.END, formatted_message, tag_name)
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
+        """Add message to log with color (safe to call from any thread)"""
+        self.log_bus.put(message, color)
 
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = InstagramScraperGUI(root)
     app.populate_fields()
+    # Used by bench/startup.py to time a cold start up to the first idle frame
+    if os.environ.get("SCRAPER_EXIT_AFTER_STARTUP"):
+        root.after_idle(root.destroy)
     root.mainloop()
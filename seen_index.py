@@ -0,0 +1,154 @@
+"""Persistent index of the comment ids already written to an output file.
+
+Each output file gets a small SQLite database next to it holding the id of
+every row written, so re-running a post (or two runs overlapping on it) only
+appends comments that are not in the file yet. An in-memory bloom filter sits
+in front of the table: ids it has never seen, which is nearly every comment
+of a fresh page, are answered without touching SQLite.
+"""
+import contextlib
+import hashlib
+import json
+import math
+import sqlite3
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings, tuned for `capacity` items."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1024, capacity)
+        self.size = int(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def full(self):
+        return self.count > self.capacity
+
+
+class SeenIndex:
+    """Comment ids already saved to one output file, with the columns they were saved with."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (id TEXT PRIMARY KEY) WITHOUT ROWID")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._load_bloom()
+
+    @staticmethod
+    def path_for(output_path):
+        return f"{output_path}.seen.db"
+
+    def _load_bloom(self):
+        self._bloom = BloomFilter(len(self) * 2)
+        for (comment_id,) in self._conn.execute("SELECT id FROM seen"):
+            self._bloom.add(comment_id)
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def __contains__(self, comment_id):
+        if comment_id not in self._bloom:
+            return False
+        return self._conn.execute("SELECT 1 FROM seen WHERE id = ?", (comment_id,)).fetchone() is not None
+
+    @property
+    def columns(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'columns'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    @property
+    def newest(self):
+        """`{"id", "created_at"}` of the newest top-level comment saved, or None."""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'newest'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def reset(self, columns):
+        """Forget every id, e.g. because the output file was started over."""
+        self._conn.execute("DELETE FROM seen")
+        self._conn.execute("DELETE FROM meta WHERE key = 'newest'")
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('columns', ?)", (json.dumps(list(columns)),))
+        self._bloom = BloomFilter(0)
+
+    def add_existing(self, comment_ids):
+        """Record ids found in the output file itself. Returns how many the index was missing.
+
+        Call under `exclusive()`.
+        """
+        comment_ids = list(comment_ids)
+        before = self._conn.total_changes
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO seen (id) VALUES (?)", ((comment_id,) for comment_id in comment_ids))
+        added = self._conn.total_changes - before
+        if added:
+            for comment_id in comment_ids:
+                self._bloom.add(comment_id)
+            if self._bloom.full:
+                self._load_bloom()
+        return added
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Hold the write lock, so overlapping runs see each other's setup."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    @contextlib.contextmanager
+    def claim(self, comment_ids, newest=None):
+        """Record `comment_ids` as saved once the block exits without an error.
+
+        `newest` is the `(created_at, id)` of the newest top-level comment in
+        the batch; the index keeps the newest one across all batches.
+
+        Yields the set of ids another run saved in the meantime. The write
+        lock is held for the whole block, so overlapping runs on the same
+        output take turns writing their batches.
+        """
+        comment_ids = list(comment_ids)
+        with self.exclusive():
+            taken = set()
+            for comment_id in comment_ids:
+                if self._conn.execute("INSERT OR IGNORE INTO seen (id) VALUES (?)", (comment_id,)).rowcount == 0:
+                    taken.add(comment_id)
+            yield taken
+            if newest is not None:
+                self._update_newest(*newest)
+        for comment_id in comment_ids:
+            self._bloom.add(comment_id)
+        if self._bloom.full:
+            self._load_bloom()
+
+    def _update_newest(self, created_at, comment_id):
+        current = self.newest
+        if current is None or created_at > current["created_at"]:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('newest', ?)",
+                (json.dumps({"id": comment_id, "created_at": created_at}),))
+
+    def close(self):
+        self._conn.close()
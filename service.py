@@ -0,0 +1,417 @@
+"""Scrape service: a local HTTP API in front of a persistent job queue.
+
+    python service.py --session credentials.csv --port 8700 --workers 2
+
+    POST /jobs                           {"urls": [...], "format": "csv", "replies": false,
+                                          "new_only": false, "enrich": false, "concurrency": 2}
+    GET  /jobs                           jobs, newest first (?status=running)
+    GET  /jobs/<id>                      one job with the progress of each post
+    POST /jobs/<id>/cancel               stop a running job or drop a queued one
+                                         (also DELETE /jobs/<id>)
+    GET  /jobs/<id>/results/<shortcode>  download the output file of one post
+    GET  /metrics                        Prometheus metrics (JSON on /metrics.json)
+
+Jobs are stored in `data/jobs.db` (see `job_queue.py`). Up to `--workers`
+jobs run at once. Each one runs as a `batch.BatchScheduler` with its own
+stop event, and all of them share one request budget. Jobs that were
+running when the service stopped are queued again on the next start and
+resume from their checkpoints.
+
+The API has no authentication; keep it on localhost.
+"""
+import argparse
+import json
+import mimetypes
+import os
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import batch
+import config
+import custom_utils
+import job_queue
+import log_utils
+import metrics
+import sinks
+from rate_limit import RateBudget
+
+EXIT_OK = 0
+EXIT_USAGE = 2
+EXIT_LOGIN_FAILED = 3
+
+
+def parse_job_request(data):
+    """Validate a submitted job. Returns `(urls, options)` or raises ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    urls = data.get("urls")
+    if isinstance(urls, str):
+        urls = [urls]
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        raise ValueError("'urls' must be a list of post URLs")
+    urls = batch.load_urls(urls)
+    if not urls:
+        raise ValueError("no post URLs given")
+    invalid = [url for url in urls if not custom_utils.extract_id(url)]
+    if invalid:
+        raise ValueError(f"not a post or reel URL: {', '.join(invalid)}")
+
+    options = {
+        "format": data.get("format", getattr(config, "output_format", "xlsx")),
+        "concurrency": data.get("concurrency", getattr(config, "concurrency", 2)),
+        "replies": data.get("replies", getattr(config, "expand_replies", False)),
+        "new_only": data.get("new_only", getattr(config, "incremental", False)),
+        "enrich": data.get("enrich", getattr(config, "enrich_text", False)),
+        "profiles": data.get("profiles", getattr(config, "enrich_profiles", False)),
+    }
+    if options["format"] not in sinks.FORMATS:
+        raise ValueError(f"'format' must be one of {', '.join(sinks.FORMATS)}")
+    # bool is an int subclass, so JSON true would pass as 1
+    if (not isinstance(options["concurrency"], int) or isinstance(options["concurrency"], bool)
+            or options["concurrency"] < 1):
+        raise ValueError("'concurrency' must be a positive integer")
+    for key in ("replies", "new_only", "enrich", "profiles"):
+        if not isinstance(options[key], bool):
+            raise ValueError(f"'{key}' must be true or false")
+    return urls, options
+
+
+def post_states(jobs):
+    """JSON-ready progress of the `batch.BatchJob`s of a run."""
+    return [{
+        "url": job.url,
+        "shortcode": job.shortcode,
+        "status": job.status,
+        "comments": job.scrape.comments if job.scrape else job.comments,
+        "error": job.error,
+        "output": job.output_path,
+    } for job in jobs]
+
+
+def final_status(jobs):
+    if all(job.status == batch.DONE for job in jobs):
+        return job_queue.DONE
+    if all(job.status in (batch.FAILED, batch.INVALID) for job in jobs):
+        return job_queue.FAILED
+    return job_queue.PARTIAL
+
+
+class ScrapeService:
+    """Runs queued jobs on `workers` threads with one logged-in loader."""
+
+    def __init__(self, L, queue, workers=2, requests_per_minute=None, post_loader=None, log_target=None):
+        self.L = L
+        self.queue = queue
+        self.workers = max(1, int(workers))
+        self.budget = RateBudget(requests_per_minute or getattr(config, "requests_per_minute", 60))
+        self.post_loader = post_loader
+        self.log_target = log_target
+        self.stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._running = {}
+        self._cancelled = set()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        requeued = self.queue.requeue_running()
+        if requeued:
+            log_utils.log_message(
+                f"[SERVICE] {requeued} interrupted jobs queued again.", self.log_target, "blue")
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"service-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop the running jobs; they are queued again for the next start."""
+        self.stop_event.set()
+        self._wakeup.set()
+        with self._lock:
+            schedulers = list(self._running.values())
+        for scheduler in schedulers:
+            scheduler.stop_event.set()
+        for thread in self._threads:
+            thread.join()
+
+    def submit(self, urls, options):
+        job_id = self.queue.submit(urls, options)
+        log_utils.log_message(
+            f"[SERVICE] Job {job_id} queued with {len(urls)} posts.", self.log_target, "blue")
+        self._wakeup.set()
+        return self.job(job_id)
+
+    def job(self, job_id):
+        """The stored job, with live progress while it runs."""
+        job = self.queue.get(job_id)
+        with self._lock:
+            scheduler = self._running.get(job_id)
+        if job is not None and scheduler is not None:
+            job["posts"] = post_states(scheduler.jobs)
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Returns False if it already ended."""
+        if self.queue.cancel_queued(job_id):
+            log_utils.log_message(f"[SERVICE] Job {job_id} cancelled.", self.log_target, "orange")
+            return True
+        with self._lock:
+            scheduler = self._running.get(job_id)
+            if scheduler is None:
+                # Claimed by a worker that has not started it yet
+                job = self.queue.get(job_id)
+                if job is None or job["status"] != job_queue.RUNNING:
+                    return False
+            self._cancelled.add(job_id)
+        if scheduler is not None:
+            scheduler.stop_event.set()
+        return True
+
+    def _work(self):
+        while not self.stop_event.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._wakeup.wait(1)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        job_id, options = job["id"], job["options"]
+        log_utils.log_message(
+            f"[SERVICE] Job {job_id} started" + (f" (run {job['runs']})" if job["runs"] > 1 else "") + ".",
+            self.log_target, "blue")
+        scheduler = batch.BatchScheduler(
+            self.L, job["urls"], concurrency=options.get("concurrency", 2),
+            output_format=options.get("format"), stop_event=threading.Event(),
+            post_loader=self.post_loader, log_target=self.log_target,
+            expand_replies=options.get("replies"), incremental=options.get("new_only"),
+            enrich_text=options.get("enrich"), enrich_profiles=options.get("profiles"),
+            budget=self.budget,
+            on_update=lambda post: self.queue.update_posts(job_id, post_states(scheduler.jobs)))
+        with self._lock:
+            self._running[job_id] = scheduler
+            # Cancelled, or the service stopped, between claim() and now
+            if job_id in self._cancelled or self.stop_event.is_set():
+                scheduler.stop_event.set()
+
+        error = None
+        try:
+            scheduler.run()
+        except Exception as e:
+            error = str(e)
+        finally:
+            with self._lock:
+                del self._running[job_id]
+                cancelled = job_id in self._cancelled
+                self._cancelled.discard(job_id)
+
+        posts = post_states(scheduler.jobs)
+        if cancelled:
+            status = job_queue.CANCELLED
+        elif self.stop_event.is_set():
+            self.queue.update_posts(job_id, posts)
+            self.queue.requeue(job_id)
+            log_utils.log_message(
+                f"[SERVICE] Job {job_id} interrupted, it resumes on the next start.", self.log_target, "orange")
+            return
+        else:
+            status = job_queue.FAILED if error else final_status(scheduler.jobs)
+        self.queue.finish(job_id, status, error, posts)
+        log_utils.log_message(
+            f"[SERVICE] Job {job_id} {status}: {scheduler.summary()}" + (f" ({error})" if error else ""),
+            self.log_target, "red" if status == job_queue.FAILED else "green")
+
+
+def make_handler(service):
+    class ServiceHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_headers(self, status, content_type, length, headers=()):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(length))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+
+        def _send(self, status, body, content_type="application/json", headers=()):
+            self._send_headers(status, content_type, len(body), headers)
+            self.wfile.write(body)
+
+        def _json(self, status, data):
+            self._send(status, json.dumps(data).encode())
+
+        def _error(self, status, message):
+            self._json(status, {"error": message})
+
+        def _route(self):
+            parts = [part for part in urlsplit(self.path).path.split("/") if part]
+            if len(parts) >= 2 and parts[0] == "jobs":
+                if not parts[1].isdigit():
+                    return parts, None
+                return parts, int(parts[1])
+            return parts, None
+
+        def do_GET(self):
+            parts, job_id = self._route()
+            if parts == ["metrics"]:
+                self._send(200, metrics.REGISTRY.prometheus().encode(), "text/plain; version=0.0.4")
+            elif parts == ["metrics.json"]:
+                self._json(200, metrics.REGISTRY.snapshot())
+            elif parts == ["jobs"]:
+                status = parse_qs(urlsplit(self.path).query).get("status", [None])[0]
+                self._json(200, {"jobs": service.queue.list(status), "counts": service.queue.counts()})
+            elif len(parts) == 2 and job_id is not None:
+                job = service.job(job_id)
+                if job is None:
+                    self._error(404, "no such job")
+                else:
+                    self._json(200, job)
+            elif len(parts) == 4 and job_id is not None and parts[2] == "results":
+                self._send_result(job_id, parts[3])
+            else:
+                self._error(404, "not found")
+
+        def _send_result(self, job_id, shortcode):
+            job = service.job(job_id)
+            post = next((post for post in (job or {}).get("posts", []) if post["shortcode"] == shortcode), None)
+            path = post and post["output"]
+            # Only the output files recorded for the job are served
+            if not path or not os.path.isfile(path):
+                self._error(404, "no results for this post yet")
+                return
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            with open(path, "rb") as file:
+                # A running job keeps appending; send the bytes the file held when it was opened
+                remaining = os.fstat(file.fileno()).st_size
+                self._send_headers(200, content_type, remaining,
+                                   [("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')])
+                while remaining:
+                    chunk = file.read(min(remaining, 1 << 16))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+
+        def do_POST(self):
+            parts, job_id = self._route()
+            if parts == ["jobs"]:
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    urls, options = parse_job_request(json.loads(self.rfile.read(length) or b"{}"))
+                except ValueError as e:
+                    self._error(400, str(e))
+                    return
+                self._json(201, service.submit(urls, options))
+            elif len(parts) == 3 and job_id is not None and parts[2] == "cancel":
+                self._cancel(job_id)
+            else:
+                self._error(404, "not found")
+
+        def do_DELETE(self):
+            parts, job_id = self._route()
+            if len(parts) == 2 and job_id is not None:
+                self._cancel(job_id)
+            else:
+                self._error(404, "not found")
+
+        def _cancel(self, job_id):
+            if service.queue.get(job_id) is None:
+                self._error(404, "no such job")
+            elif service.cancel(job_id):
+                self._json(202, service.job(job_id))
+            else:
+                self._error(409, "job already finished")
+
+    return ServiceHandler
+
+
+def serve(service, port, host="127.0.0.1"):
+    """Start the HTTP API for `service`; call `serve_forever()` on the result."""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="instagram-comment-scraper-service",
+        description="Run scrape jobs submitted over a local HTTP API.")
+    parser.add_argument("-s", "--session", required=True,
+                        help="Session JSON (as saved by the GUI) or credentials CSV; "
+                             "several rows are rotated across")
+    parser.add_argument("--host", default=config.service_host, help="Address to listen on (default: %(default)s)")
+    parser.add_argument("-p", "--port", type=int, default=config.service_port,
+                        help="Port to listen on (default: %(default)s)")
+    parser.add_argument("-w", "--workers", type=int, default=config.service_workers,
+                        help="Jobs run at once (default: %(default)s)")
+    parser.add_argument("--db", help="Job queue file (default: data/jobs.db)")
+    parser.add_argument("--rpm", type=float, default=config.requests_per_minute,
+                        help="Requests per minute shared by every job (default: %(default)s)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only log warnings and errors")
+    return parser
+
+
+def main(argv=None):
+    import main as single
+    import session_pool
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    log_utils.console_stream = sys.stderr
+    if args.quiet:
+        log_utils.console_colors = {"red", "orange", "yellow"}
+
+    try:
+        records = session_pool.load_session_records(args.session)
+    except OSError as e:
+        parser.error(str(e))
+    if not records:
+        parser.error(f"No complete session records in {args.session}")
+    config.session_data = records[0]
+    config.sessions_file = args.session if len(records) > 1 else None
+    config.requests_per_minute = args.rpm
+    config.log_text = None
+
+    L = single.connect()
+    if not (L and L.context.is_logged_in):
+        log_utils.log_message("[ERROR] Login required. Exiting.", None, "red")
+        return EXIT_LOGIN_FAILED
+
+    queue = job_queue.JobQueue(args.db or custom_utils.get_data_folder("jobs.db"))
+    service = ScrapeService(L, queue, args.workers, args.rpm)
+    try:
+        server = serve(service, args.port, args.host)
+    except OSError as e:
+        log_utils.log_message(f"[ERROR] Could not listen on port {args.port}: {e}", None, "red")
+        return EXIT_USAGE
+
+    def request_stop(signum, frame):
+        # shutdown() waits for serve_forever(), which runs on this thread
+        threading.Thread(target=server.shutdown).start()
+    for name in ("SIGTERM", "SIGHUP"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), request_stop)
+
+    service.start()
+    log_utils.log_message(
+        f"[SERVICE] Listening on http://{args.host}:{args.port}/jobs with {service.workers} workers.", None, "green")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log_utils.log_message("[SERVICE] Stopping, saving progress...", None, "orange")
+        server.server_close()
+        service.stop()
+        queue.close()
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""Pool of logged-in sessions that requests are rotated across.
+
+Every session record (the csrftoken/sessionid/ds_user_id/mid/ig_did fields
+the GUI asks for) gets its own Instaloader. Requests go round-robin to the
+healthy sessions; one that hits a 429 sits out a cooldown while the others
+keep working.
+"""
+import csv
+import itertools
+import json
+import threading
+import time
+
+import config
+import log_utils
+
+SESSION_FIELDS = ["csrftoken", "sessionid", "ds_user_id", "mid", "ig_did"]
+
+
+class SessionRateLimited(Exception):
+    """Raised out of a request when its session was rate limited and benched."""
+
+
+class NoSessionAvailable(Exception):
+    """Raised when every session in the pool is unhealthy."""
+
+
+def load_session_records(path):
+    """Read every session record from a credentials CSV or a JSON file.
+
+    JSON may hold a single record (as saved by the GUI) or a list of them.
+    Records with missing fields are skipped.
+    """
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        rows = data if isinstance(data, list) else [data]
+    else:
+        with open(path, "r", newline="", encoding="utf-8-sig") as file:
+            rows = list(csv.DictReader(file))
+
+    records = []
+    for row in rows:
+        record = {field: (row.get(field) or "").strip() for field in SESSION_FIELDS}
+        if all(record.values()):
+            records.append(record)
+    return records
+
+
+class PooledSession:
+    def __init__(self, record, loader=None):
+        self.record = record
+        self.name = record["ds_user_id"]
+        self.loader = loader
+        self.healthy = loader is not None
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.rate_limits = 0
+
+    def available(self, now):
+        return self.healthy and now >= self.cooldown_until
+
+
+class SessionPool:
+    def __init__(self, sessions, cooldown=None, stop_event=None):
+        self.sessions = list(sessions)
+        self.cooldown = cooldown if cooldown is not None else getattr(config, "session_cooldown", 300)
+        self.stop_event = stop_event
+        self._order = itertools.cycle(range(len(self.sessions))) if self.sessions else None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_records(cls, records, login=None, check=True, **options):
+        """Log every record in and health-check it; failures are kept but unhealthy."""
+        if login is None:
+            import main
+            login = main.login_with_session
+
+        pool = cls([], **options)
+        for record in records:
+            session = PooledSession(record)
+            session.loader = login(record, on_429=pool._on_429_for(session))
+            session.healthy = session.loader is not None and (not check or pool._check(session))
+            pool.sessions.append(session)
+        pool._order = itertools.cycle(range(len(pool.sessions))) if pool.sessions else None
+
+        log_utils.log_message(
+            f"[INFO] Session pool ready: {pool.healthy_count()}/{len(pool.sessions)} sessions healthy.",
+            config.log_text, "green" if pool.healthy_count() else "red")
+        return pool
+
+    @classmethod
+    def from_file(cls, path, **options):
+        return cls.from_records(load_session_records(path), **options)
+
+    def _check(self, session):
+        try:
+            username = session.loader.test_login()
+        except Exception as e:
+            log_utils.log_message(
+                f"[WARNING] Session {session.name} failed its health check: {e}", config.log_text, "orange")
+            return False
+        if not username:
+            log_utils.log_message(
+                f"[WARNING] Session {session.name} is not logged in.", config.log_text, "orange")
+            return False
+        return True
+
+    def _on_429_for(self, session):
+        def on_429(query_type):
+            self.bench(session)
+            if self.healthy_count() > 1:
+                raise SessionRateLimited(session.name)
+        return on_429
+
+    def healthy_count(self):
+        return sum(1 for session in self.sessions if session.healthy)
+
+    def bench(self, session, seconds=None):
+        """Put `session` in cooldown after a 429."""
+        with self._lock:
+            session.rate_limits += 1
+            session.cooldown_until = time.monotonic() + (seconds or self.cooldown)
+        log_utils.log_message(
+            f"[RATE LIMIT] Session {session.name} cooling down for {round(seconds or self.cooldown)}s.",
+            config.log_text, "yellow")
+
+    def acquire(self):
+        """Return the next healthy session that is not cooling down, waiting if needed."""
+        while True:
+            with self._lock:
+                if not self.healthy_count():
+                    raise NoSessionAvailable("No healthy Instagram sessions left in the pool")
+                now = time.monotonic()
+                for _ in range(len(self.sessions)):
+                    session = self.sessions[next(self._order)]
+                    if session.available(now):
+                        return session
+                wait = min(s.cooldown_until for s in self.sessions if s.healthy) - now
+            stop_event = self.stop_event or getattr(config, "stop_event", None)
+            if stop_event is not None:
+                if stop_event.wait(min(max(wait, 0.05), 0.5)):
+                    raise NoSessionAvailable("Stopped while waiting for a session")
+            else:
+                time.sleep(min(max(wait, 0.05), 0.5))
+
+    def loader(self):
+        """An Instaloader-like facade whose context rotates across the pool."""
+        return PooledLoader(self)
+
+    def stats(self):
+        return [
+            {"session": s.name, "healthy": s.healthy, "requests": s.requests,
+             "rate_limits": s.rate_limits,
+             "cooling_down": max(0.0, s.cooldown_until - time.monotonic())}
+            for s in self.sessions
+        ]
+
+
+class RotatingContext:
+    """Forwards each call to the context of the next available session.
+
+    A request whose session gets rate limited is retried on another one.
+    Plain attributes (`username`, `iphone_headers`) are read from the session
+    used last, without waiting for one to become available.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._current = None
+
+    def _session(self):
+        """The session used last, or the first healthy one once that is no longer usable."""
+        current = self._current
+        if current is None or not current.healthy:
+            current = next((session for session in self._pool.sessions if session.healthy), None)
+            if current is None:
+                raise NoSessionAvailable("No healthy Instagram sessions left in the pool")
+            self._current = current
+        return current
+
+    def __getattr__(self, name):
+        attribute = getattr(self._session().loader.context, name)
+        if not callable(attribute):
+            return attribute
+
+        def rotated(*args, **kwargs):
+            current = self._pool.acquire()
+            while True:
+                self._current = current
+                current.requests += 1
+                try:
+                    return getattr(current.loader.context, name)(*args, **kwargs)
+                except SessionRateLimited:
+                    current = self._pool.acquire()
+        return rotated
+
+
+class PooledLoader:
+    def __init__(self, pool):
+        self.pool = pool
+        self.context = RotatingContext(pool)
@@ -0,0 +1,252 @@
+import csv
+import json
+import os
+import sqlite3
+
+import custom_utils
+from comment_record import COLUMN_TYPES
+
+COLUMNS = ["Username", "Comment", "Is Mentionable", "Comment ID", "Created At", "Like Count",
+           "Owner ID", "Is Verified"]
+
+# Columns written when replies are expanded
+THREAD_COLUMNS = COLUMNS + ["Parent ID", "Depth"]
+
+FORMATS = ("xlsx", "csv", "jsonl", "sqlite")
+
+
+class CommentSink:
+    """Append-only destination for scraped comment rows.
+
+    A sink is opened once per run and kept open until `close()`, so every
+    `write_rows()` call only costs the size of the batch being written.
+    """
+
+    extension = ""
+
+    def __init__(self, path, columns=None, append=False):
+        self.path = path
+        self.columns = list(columns or COLUMNS)
+        self.append = append
+        self.rows_written = 0
+        self.closed = False
+
+    def write_rows(self, rows):
+        """Append a batch of rows (sequences ordered like `columns`)."""
+        rows = list(rows)
+        if rows:
+            self._write(rows)
+            self.rows_written += len(rows)
+        return len(rows)
+
+    def write_batch(self, buffer):
+        """Append a `comment_record.CommentBuffer` whose columns match the sink's."""
+        return self.write_rows(buffer.rows())
+
+    def _write(self, rows):
+        raise NotImplementedError
+
+    def flush(self):
+        """Make everything written so far durable on disk."""
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            self._close()
+            self.closed = True
+
+    def _close(self):
+        pass
+
+    def abandon(self):
+        """Release the sink without finishing its file, when another run took the output over."""
+        if not self.closed:
+            self._abandon()
+            self.closed = True
+
+    def _abandon(self):
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def open_for_append(path, truncate=False, **kwargs):
+    """Open a text file in append mode, so writes from overlapping runs never overwrite each other."""
+    if truncate:
+        open(path, "w").close()
+    return open(path, "a", encoding="utf-8", **kwargs)
+
+
+class CsvSink(CommentSink):
+    extension = "csv"
+
+    def __init__(self, path, columns=None, append=False):
+        super().__init__(path, columns, append)
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self._file = open_for_append(path, truncate=not append, newline="")
+        self._writer = csv.writer(self._file)
+        if write_header:
+            self._writer.writerow(self.columns)
+            # Another run appending next checks the file size for the header
+            self._file.flush()
+
+    def _write(self, rows):
+        self._writer.writerows(rows)
+
+    def flush(self):
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class JsonlSink(CommentSink):
+    extension = "jsonl"
+
+    def __init__(self, path, columns=None, append=False):
+        super().__init__(path, columns, append)
+        self._file = open_for_append(path, truncate=not append)
+
+    def _write(self, rows):
+        self._file.writelines(
+            json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+    def flush(self):
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class SqliteSink(CommentSink):
+    extension = "sqlite"
+    table = "comments"
+
+    def __init__(self, path, columns=None, append=False):
+        super().__init__(path, columns, append)
+        if not append and os.path.exists(path):
+            os.remove(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        column_defs = ", ".join(f'"{column}" {COLUMN_TYPES.get(column, "")}'.rstrip() for column in self.columns)
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} ({column_defs})")
+        placeholders = ", ".join("?" for _ in self.columns)
+        self._insert_sql = f"INSERT INTO {self.table} VALUES ({placeholders})"
+
+    def _write(self, rows):
+        self._conn.executemany(self._insert_sql, rows)
+
+    def flush(self):
+        self._conn.commit()
+
+    def _close(self):
+        self._conn.close()
+
+
+class XlsxSink(CommentSink):
+    """Streams rows into a write-only openpyxl workbook saved once on close.
+
+    When appending to an existing workbook its rows are copied across once at
+    open time instead of being re-read on every batch. Because the workbook
+    only reaches disk on close, every batch is also appended to a CSV journal
+    next to it; a run that crashed is recovered from that journal on the next
+    append. A journal older than the workbook was already saved into it by a
+    run that died before removing the journal, and is dropped.
+    """
+
+    extension = "xlsx"
+
+    def __init__(self, path, columns=None, append=False):
+        super().__init__(path, columns, append)
+        from openpyxl import Workbook
+
+        self.journal_path = f"{path}.journal.csv"
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet()
+        if append and os.path.exists(path):
+            self._copy_existing(path)
+        else:
+            self._sheet.append(self.columns)
+        replay = append and os.path.exists(self.journal_path)
+        if replay and os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(self.journal_path):
+            replay = False
+        if replay:
+            self._replay_journal()
+        self._journal = CsvSink(self.journal_path, self.columns, append=replay)
+
+    def _copy_existing(self, path):
+        from openpyxl import load_workbook
+
+        existing = load_workbook(path, read_only=True)
+        try:
+            for row in existing.active.iter_rows(values_only=True):
+                self._sheet.append(row)
+        finally:
+            existing.close()
+
+    def _replay_journal(self):
+        import export
+
+        with open(self.journal_path, "r", newline="", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            # The CSV round trip turned every value into text; empty cells were None
+            convert_values = export.converters(next(reader, None) or self.columns)
+            for row in reader:
+                self._sheet.append([None if value == "" else to_type(value)
+                                    for to_type, value in zip(convert_values, row)])
+
+    def _write(self, rows):
+        self._journal.write_rows(rows)
+        for row in rows:
+            self._sheet.append(list(row))
+
+    def flush(self):
+        self._journal.flush()
+
+    def _abandon(self):
+        # The journal stays for whoever saves the workbook
+        self._journal.close()
+        self._sheet.close()
+
+    def _close(self):
+        self._journal.close()
+        # Replaced in one step, so a crash leaves either the old workbook and its journal or the new one
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        self._workbook.save(tmp_path)
+        os.replace(tmp_path, self.path)
+        os.remove(self.journal_path)
+
+
+SINKS = {
+    "xlsx": XlsxSink,
+    "csv": CsvSink,
+    "jsonl": JsonlSink,
+    "sqlite": SqliteSink,
+}
+
+
+def output_path(shortcode, output_format="xlsx", directory=None):
+    """Return the path a scrape of `shortcode` writes to, in `directory` or the data folder."""
+    filename = f"{shortcode}.{SINKS[output_format].extension}"
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+    return custom_utils.get_data_folder(filename)
+
+
+def open_sink(path, output_format="xlsx", columns=None, append=False):
+    """Open the sink registered for `output_format`."""
+    try:
+        sink_class = SINKS[output_format]
+    except KeyError:
+        raise ValueError(
+            f"Unknown output format '{output_format}'. Choose from: {', '.join(FORMATS)}")
+    return sink_class(path, columns=columns, append=append)
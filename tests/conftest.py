@@ -0,0 +1,55 @@
+import contextlib
+import csv
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty folder, so `data/` files of the default paths stay out of the repository."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(scope="session")
+def mock_instagram():
+    from bench import mock_server
+
+    server = mock_server.start_server(comments=300, page_size=20)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def scrape(workdir, mock_instagram, monkeypatch):
+    """Scrape the mock post into data/RESUME.csv, stopping after `stop_after_pages` pages if given."""
+    import main
+    from bench import mock_server
+    from comment_writer import CommentWriter
+    from scrape_job import ScrapeJob
+
+    def run(stop_after_pages=None):
+        job = ScrapeJob("RESUME", mock_server.MockLoader(mock_instagram.base_url), output_format="csv")
+        with contextlib.ExitStack() as stack:
+            if stop_after_pages is not None:
+                pages = iter(range(stop_after_pages - 1))
+                add_page = CommentWriter.add_page
+
+                def add_page_then_stop(writer, cursor, nodes):
+                    if next(pages, None) is None:
+                        job.stop_event.set()
+                    return add_page(writer, cursor, nodes)
+                stack.enter_context(monkeypatch.context()).setattr(CommentWriter, "add_page", add_page_then_stop)
+            main.fetch_comments(job, mock_server.get_post(job))
+        return job
+    return run
+
+
+def saved_ids(job):
+    with open(job.output_path, newline="", encoding="utf-8") as file:
+        return [row[3] for row in list(csv.reader(file))[1:]]
@@ -0,0 +1,132 @@
+import time
+
+import pytest
+
+from cluster import LEASED, SQLiteLeaseBackend, open_backend
+from job_queue import DONE, FAILED, PARTIAL, QUEUED, RUNNING
+
+URLS = ["https://www.instagram.com/p/AAAAAAAAAAA/", "https://www.instagram.com/p/BBBBBBBBBBB/"]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteLeaseBackend(str(tmp_path / "queue.db"))
+    yield backend
+    backend.close()
+
+
+def test_submit_splits_one_task_per_post(backend, tmp_path):
+    job_id = backend.submit(URLS + URLS[:1], {"format": "csv"}, str(tmp_path / "out"))
+    job = backend.job(job_id)
+    assert job["status"] == QUEUED
+    assert [task["shortcode"] for task in job["tasks"]] == ["AAAAAAAAAAA", "BBBBBBBBBBB"]
+    assert job["tasks"][0]["output"] == str(tmp_path / "out" / f"job-{job_id}" / "AAAAAAAAAAA.csv")
+
+
+def test_claim_leases_each_task_once(backend, tmp_path):
+    job_id = backend.submit(URLS, {}, str(tmp_path))
+    first = backend.claim("a", 60)
+    second = backend.claim("b", 60)
+    assert (first["worker"], second["worker"]) == ("a", "b")
+    assert first["id"] != second["id"]
+    assert backend.claim("c", 60) is None
+    assert backend.job(job_id)["status"] == RUNNING
+
+
+def test_heartbeat_only_renews_held_leases(backend, tmp_path):
+    backend.submit(URLS, {}, str(tmp_path))
+    task = backend.claim("a", 60)
+    other = backend.claim("b", 60)
+    assert backend.heartbeat("a", [task["id"], other["id"]], 60) == {task["id"]}
+
+
+def test_expired_lease_is_taken_over_and_old_holder_is_fenced(backend, tmp_path):
+    job_id = backend.submit(URLS[:1], {}, str(tmp_path))
+    task = backend.claim("a", 0.1)
+    time.sleep(0.2)
+    taken = backend.claim("b", 60)
+    assert taken["id"] == task["id"]
+    assert taken["attempts"] == 2
+
+    assert backend.heartbeat("a", [task["id"]], 60) == set()
+    assert not backend.complete(task["id"], "a", DONE, 10)
+    backend.release(task["id"], "a")
+    assert backend.job(job_id)["tasks"][0]["status"] == LEASED
+
+    assert backend.complete(task["id"], "b", DONE, 10)
+    job = backend.job(job_id)
+    assert job["status"] == DONE
+    assert job["tasks"][0]["comments"] == 10
+
+
+def test_task_fails_after_max_attempts(backend, tmp_path):
+    job_id = backend.submit(URLS[:1], {}, str(tmp_path))
+    for worker in ("a", "b"):
+        assert backend.claim(worker, 0.05, max_attempts=2) is not None
+        time.sleep(0.1)
+    assert backend.claim("c", 60, max_attempts=2) is None
+    job = backend.job(job_id)
+    assert job["tasks"][0]["status"] == FAILED
+    assert job["status"] == FAILED
+
+
+def test_release_requeues_and_job_status_is_mixed(backend, tmp_path):
+    job_id = backend.submit(URLS, {}, str(tmp_path))
+    first = backend.claim("a", 60)
+    backend.release(first["id"], "a", "node shutting down")
+    assert backend.job(job_id)["tasks"][0]["status"] == QUEUED
+
+    for _ in URLS:
+        task = backend.claim("b", 60)
+        backend.complete(task["id"], "b", DONE if task["id"] == first["id"] else FAILED)
+    assert backend.job(job_id)["status"] == PARTIAL
+
+
+def test_open_backend(tmp_path):
+    backend = open_backend(f"sqlite://{tmp_path / 'queue.db'}")
+    assert isinstance(backend, SQLiteLeaseBackend)
+    backend.close()
+    with pytest.raises(ValueError):
+        open_backend("redis://localhost")
+
+
+class UnreachableBackend(SQLiteLeaseBackend):
+    reachable = True
+
+    def heartbeat(self, worker_id, task_ids, lease_seconds):
+        if not self.reachable:
+            raise OSError("queue unreachable")
+        return super().heartbeat(worker_id, task_ids, lease_seconds)
+
+
+def test_worker_stops_post_when_it_cannot_renew(tmp_path, workdir):
+    import csv
+
+    from bench import mock_server
+    from cluster import ClusterWorker
+
+    server = mock_server.start_server(comments=3000, page_size=20, latency=0.02)
+    path = str(tmp_path / "queue.db")
+    backend = UnreachableBackend(path)
+    job_id = backend.submit(URLS[:1], {"format": "csv"}, str(tmp_path / "out"))
+    worker = ClusterWorker(mock_server.MockLoader(server.base_url), backend, "a", slots=1, lease_seconds=1.5,
+                           requests_per_minute=60000, post_loader=mock_server.get_post)
+    worker.start()
+    try:
+        deadline = time.time() + 10
+        while not worker._active and time.time() < deadline:
+            time.sleep(0.05)
+        backend.reachable = False
+        while worker._active and time.time() < deadline:
+            time.sleep(0.05)
+        assert not worker._active
+    finally:
+        worker.stop()
+        server.shutdown()
+
+    task = backend.job(job_id)["tasks"][0]
+    assert task["status"] == LEASED
+    with open(task["output"], newline="", encoding="utf-8") as file:
+        written = sum(1 for _ in csv.reader(file)) - 1
+    assert 0 < written < 3000
+    backend.close()
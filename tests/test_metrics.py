@@ -0,0 +1,28 @@
+import json
+import threading
+
+import metrics
+
+
+def test_concurrent_snapshots_publish_whole_files(tmp_path):
+    path = str(tmp_path / "metrics.json")
+    registry = metrics.Registry()
+    registry.counter("jobs_total", "Jobs").inc(3)
+    errors = []
+
+    def write():
+        try:
+            for _ in range(50):
+                metrics.write_snapshot(path, registry)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with open(path, encoding="utf-8") as file:
+        assert json.load(file)["metrics"]["jobs_total"] == 3
+    assert sorted(item.name for item in tmp_path.iterdir()) == ["metrics.json"]
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from rate_limit import AdaptiveBucket, RateBudget, TokenBucket, interruptible_sleep
+
+
+def test_token_bucket_spends_burst_then_paces():
+    bucket = TokenBucket(per_minute=600, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    # 600/min is one token every 0.1s
+    assert 0.05 < bucket.reserve() <= 0.1
+    assert 0.15 < bucket.reserve() <= 0.2
+
+
+def test_rate_budget_stops_waiting_when_stopped():
+    budget = RateBudget(per_minute=1, burst=1)
+    assert budget.acquire()
+    stop_event = threading.Event()
+    threading.Timer(0.1, stop_event.set).start()
+    started = time.monotonic()
+    assert not budget.acquire(stop_event)
+    assert time.monotonic() - started < 5
+
+
+def test_interruptible_sleep_returns_false_once_stopped():
+    stop_event = threading.Event()
+    stop_event.set()
+    assert not interruptible_sleep(10, stop_event)
+    assert interruptible_sleep(0)
+
+
+def test_adaptive_bucket_increases_additively_and_halves_on_429():
+    bucket = AdaptiveBucket(per_minute=60, min_per_minute=10, max_per_minute=62, increase=1)
+    bucket.on_success()
+    assert bucket.per_minute == 61
+    for _ in range(3):
+        bucket.on_success()
+    assert bucket.per_minute == 62
+
+    bucket.on_rate_limited()
+    assert bucket.per_minute == 31
+    for _ in range(3):
+        bucket.on_rate_limited()
+    assert bucket.per_minute == 10
+
+
+def test_adaptive_bucket_backoff_grows_and_resets():
+    bucket = AdaptiveBucket(backoff_base=10, backoff_cap=35)
+    pauses = [bucket.on_rate_limited() for _ in range(4)]
+    for pause, ceiling in zip(pauses, (10, 20, 35, 35)):
+        assert ceiling / 2 <= pause <= ceiling
+    bucket.on_success()
+    assert bucket.on_rate_limited() <= 10
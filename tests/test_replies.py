@@ -0,0 +1,48 @@
+import threading
+
+from replies import ReplyExpander
+from scrape_job import ScrapeJob
+
+
+class FailingContext:
+    def get_iphone_json(self, path, params):
+        raise OSError("connection reset")
+
+
+def test_failed_reply_threads_do_not_stay_pending():
+    job = ScrapeJob("REPLIES", stop_event=threading.Event())
+    expander = ReplyExpander(FailingContext(), "1", job)
+    expander.submit("10")
+    assert expander.completed(wait=True) == [("10", [])]
+    assert expander.pending() == []
+    expander.shutdown()
+
+
+def test_stopped_reply_threads_stay_pending():
+    stop_event = threading.Event()
+    stop_event.set()
+    expander = ReplyExpander(FailingContext(), "1", ScrapeJob("REPLIES", stop_event=stop_event))
+    expander.submit("10")
+    assert expander.completed(wait=True) == []
+    assert expander.pending() == ["10"]
+    expander.shutdown()
+
+
+class SlowContext:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def get_iphone_json(self, path, params):
+        self.release.wait(5)
+        return {"child_comments": [], "has_more_tail_child_comments": False}
+
+
+def test_threads_cancelled_by_shutdown_stay_pending():
+    context = SlowContext()
+    expander = ReplyExpander(context, "1", ScrapeJob("REPLIES", stop_event=threading.Event()), workers=1)
+    for parent_id in ("10", "11", "12"):
+        expander.submit(parent_id)
+    threading.Timer(0.2, context.release.set).start()
+    expander.shutdown()
+    assert expander.completed(wait=True) == [("10", [])]
+    assert expander.pending() == ["11", "12"]
@@ -0,0 +1,28 @@
+from checkpoint import Checkpoint
+from conftest import saved_ids
+
+
+def test_stopped_scrape_resumes_without_duplicates(scrape):
+    job = scrape(stop_after_pages=5)
+    assert not job.finished
+    state = Checkpoint.load("RESUME")
+    assert state is not None and state.rows_written == job.comments > 0
+
+    job = scrape()
+    assert job.finished
+    ids = saved_ids(job)
+    assert len(ids) == len(set(ids)) == 300
+    assert Checkpoint.load("RESUME") is None
+
+
+def test_fenced_off_job_stops_without_writing(scrape, monkeypatch):
+    from scrape_job import ScrapeJob
+
+    job = scrape(stop_after_pages=2)
+    before = saved_ids(job)
+    state = Checkpoint.load("RESUME")
+    monkeypatch.setattr(ScrapeJob, "may_write", lambda job: False)
+    job = scrape()
+    assert not job.finished
+    assert saved_ids(job) == before
+    assert Checkpoint.load("RESUME").rows_written == state.rows_written
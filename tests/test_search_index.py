@@ -0,0 +1,49 @@
+from results_view import SearchIndex, words
+
+ROWS = [
+    "alice Great giveaway @bob",
+    "bob count me in",
+    "carol GIVE me the prize",
+    "dave great prize",
+]
+
+
+def build():
+    index = SearchIndex()
+    for row_id, text in enumerate(ROWS):
+        index.add(row_id, words(text))
+    return index
+
+
+def test_empty_query_matches_everything():
+    assert build().search("  ") is None
+
+
+def test_short_and_long_prefixes():
+    index = build()
+    assert index.search("g") == [0, 2, 3]
+    assert index.search("giveaw") == [0]
+    assert index.search("GIVE") == [0, 2]
+    assert index.search("zebra") == []
+
+
+def test_every_query_word_must_match():
+    index = build()
+    assert index.search("great prize") == [3]
+    assert index.search("pri me") == [2]
+
+
+def test_words_added_after_a_search_are_found():
+    index = build()
+    assert index.search("prize") == [2, 3]
+    index.add(4, words("eve prizes galore"))
+    assert index.search("prize") == [2, 3, 4]
+    assert index.search("galo") == [4]
+
+
+def test_matches_agrees_with_search():
+    index = build()
+    for query in ("g", "great prize", "bo", "me in"):
+        expected = index.search(query)
+        assert [row_id for row_id, text in enumerate(ROWS)
+                if SearchIndex.matches(words(query), words(text))] == expected
@@ -0,0 +1,90 @@
+import json
+import sqlite3
+
+import pytest
+
+from checkpoint import Checkpoint
+from conftest import saved_ids
+from seen_index import SeenIndex
+
+COLUMNS = ["Username", "Comment", "Comment ID"]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SeenIndex(SeenIndex.path_for(str(tmp_path / "post.csv")))
+    index.reset(COLUMNS)
+    yield index
+    index.close()
+
+
+def test_claim_records_ids_and_newest(index):
+    with index.claim(["1", "2"], newest=(100, "2")) as taken:
+        assert taken == set()
+    with index.claim(["3"], newest=(50, "3")):
+        pass
+    assert "1" in index and "3" in index and "4" not in index
+    assert len(index) == 3
+    assert index.newest == {"id": "2", "created_at": 100}
+    assert index.columns == COLUMNS
+
+
+def test_claim_reports_ids_saved_by_another_run(index, tmp_path):
+    other = SeenIndex(index.path)
+    with other.claim(["1", "2"]):
+        pass
+    other.close()
+    with index.claim(["2", "3"]) as taken:
+        assert taken == {"2"}
+
+
+def test_failed_batch_is_not_recorded(index):
+    with pytest.raises(OSError):
+        with index.claim(["1"]):
+            raise OSError("disk full")
+    assert "1" not in index
+    assert len(index) == 0
+
+
+def test_add_existing_counts_only_missing_ids(index):
+    with index.claim(["1"]):
+        pass
+    with index.exclusive():
+        assert index.add_existing(["1", "2", "3"]) == 2
+    assert "2" in index and "3" in index
+
+
+def test_index_persists_across_opens(index):
+    with index.claim([str(n) for n in range(1000)]):
+        pass
+    reopened = SeenIndex(index.path)
+    assert len(reopened) == 1000
+    assert "999" in reopened and "1000" not in reopened
+    reopened.close()
+
+
+def test_running_again_only_appends_new_comments(scrape):
+    scrape()
+    job = scrape()
+    assert job.finished
+    assert len(saved_ids(job)) == 300
+
+
+def test_rows_written_after_the_last_index_commit_are_not_written_twice(scrape):
+    job = scrape(stop_after_pages=5)
+    # What a run killed between flushing its last batch and committing it leaves behind
+    lost = saved_ids(job)[-20:]
+    connection = sqlite3.connect(SeenIndex.path_for(job.output_path))
+    connection.executemany("DELETE FROM seen WHERE id = ?", [(comment_id,) for comment_id in lost])
+    connection.commit()
+    connection.close()
+    state = Checkpoint.load("RESUME")
+    with open(state.path, encoding="utf-8") as file:
+        data = json.load(file)
+    data["rows_written"] -= len(lost)
+    data["page_ids"] = [comment_id for comment_id in data["page_ids"] if comment_id not in lost]
+    with open(state.path, "w", encoding="utf-8") as file:
+        json.dump(data, file)
+
+    ids = saved_ids(scrape())
+    assert len(ids) == len(set(ids)) == 300
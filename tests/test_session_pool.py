@@ -0,0 +1,44 @@
+import pytest
+
+from session_pool import NoSessionAvailable, SessionPool
+
+
+class Context:
+    is_logged_in = True
+
+    def __init__(self, name):
+        self.name = name
+
+    def get(self):
+        return self.name
+
+
+class Loader:
+    def __init__(self, name):
+        self.context = Context(name)
+
+
+def pool(*names):
+    # A name of None stands for a session whose login failed
+    return SessionPool.from_records(
+        [{"ds_user_id": name or "broken"} for name in names],
+        login=lambda record, on_429: Loader(record["ds_user_id"]) if record["ds_user_id"] != "broken" else None,
+        check=False, cooldown=0)
+
+
+def test_calls_rotate_across_sessions():
+    context = pool("a", "b").loader().context
+    assert [context.get() for _ in range(4)] == ["a", "b", "a", "b"]
+
+
+def test_attributes_are_read_from_a_healthy_session_without_acquiring(monkeypatch):
+    sessions = pool(None, "b")
+    monkeypatch.setattr(SessionPool, "acquire", lambda self: pytest.fail("acquired for an attribute read"))
+    context = sessions.loader().context
+    assert context.is_logged_in
+    assert context.name == "b"
+
+
+def test_attribute_read_with_no_healthy_session_raises():
+    with pytest.raises(NoSessionAvailable):
+        pool(None).loader().context.is_logged_in
@@ -0,0 +1,56 @@
+"""Mention, hashtag, emoji and spam columns computed per batch.
+
+`enrich(buffer)` fills the `TEXT_COLUMNS` of a `comment_record.CommentBuffer`
+from its Comment column. It works a column at a time: the patterns are
+compiled once and applied with `map()`, so the loop over a batch runs
+inside the regex engine instead of in Python code per row.
+
+Mentions and hashtags are lowercased (Instagram handles are case
+insensitive) and kept once each, in the order they appear. The text hash
+ignores case, spacing and mentions, so copy-pasted comments share one hash
+even when the mentioned friends differ. Comments that are nothing but
+mentions get no hash.
+"""
+import hashlib
+import itertools
+import re
+
+from comment_record import TEXT_SCHEMA
+
+TEXT_COLUMNS = [column for column, _ in TEXT_SCHEMA]
+
+# Handles are 1-30 letters, digits, "_" or "."; an "@" inside a word (e-mail) is not a
+# mention. The patterns start with their literal so the regex engine can skip ahead to it.
+MENTION_RE = re.compile(r"@(?<![\w.@]@)([a-z0-9_](?:[a-z0-9_.]{0,28}[a-z0-9_])?)")
+HASHTAG_RE = re.compile(r"#(?<![\w&#]#)(\w+)")
+EMOJI_RE = re.compile("[\U0001F1E6-\U0001F1FF\U0001F300-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\u3030\u303D\u3297\u3299]")
+# Handles, zero-width characters and variation selectors do not make a comment different
+NORMALIZE_RE = re.compile(r"@[a-z0-9_.]+|[\u200b-\u200f\u2060\ufe0e\ufe0f]")
+
+
+def _text_hash(text):
+    # Comments that are only mentions are the norm on giveaways, not spam
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest() if text else ""
+
+
+def analyze(texts):
+    """Return the `TEXT_COLUMNS` of `texts`, one list per column."""
+    lowered = [text.lower() if text else "" for text in texts]
+    # dict.fromkeys drops repeats and keeps the order
+    mentions = list(map(dict.fromkeys, map(MENTION_RE.findall, lowered)))
+    hashtags = map(dict.fromkeys, map(HASHTAG_RE.findall, lowered))
+    stripped = map(NORMALIZE_RE.sub, itertools.repeat(""), lowered)
+    normalized = map(" ".join, map(str.split, stripped))
+    return [
+        ["@" + " @".join(names) if names else "" for names in mentions],
+        list(map(len, mentions)),
+        ["#" + " #".join(tags) if tags else "" for tags in hashtags],
+        list(map(len, map(EMOJI_RE.findall, lowered))),
+        list(map(_text_hash, normalized)),
+    ]
+
+
+def enrich(buffer):
+    """Fill the text columns of `buffer` from its Comment column."""
+    for column, values in zip(TEXT_COLUMNS, analyze(buffer.column("Comment"))):
+        buffer.set_column(column, values)